@@ -43,8 +43,60 @@ INSTALLED_APPS = [
     'django_crontab'
 ]
 
+# Rows per statement for the set-based bulk mutations
+CRM_BULK_CHUNK_SIZE = 1000
+
+# GraphQL instrumentation (crm.instrumentation): record every operation for
+# /metrics, let staff users (or anyone under DEBUG) opt in per request with
+# the debug header (None to disable), flag SQL shapes repeated more than
+# this many times, and label at most this many operation names in /metrics
+CRM_INSTRUMENTATION_ENABLED = False
+CRM_DEBUG_HEADER = 'X-CRM-Debug'
+CRM_NPLUSONE_THRESHOLD = 10
+CRM_METRICS_MAX_OPERATIONS = 200
+
+# Parsed and validated GraphQL documents kept per process (crm.persisted_queries)
+CRM_DOCUMENT_CACHE_SIZE = 500
+
+# Response cache for query operations (crm.response_cache): off unless
+# enabled; entries live in this CACHES alias for at most this many seconds
+CRM_RESPONSE_CACHE_ENABLED = False
+CRM_RESPONSE_CACHE_ALIAS = 'default'
+CRM_RESPONSE_CACHE_TIMEOUT = 60
+
+# Query cost limits (crm.cost), checked before an operation runs: largest
+# first/last on the connections, assumed size of unpaginated nested lists,
+# and the depth and cost budgets (0 to disable)
+CRM_CONNECTION_MAX_LIMIT = 100
+CRM_QUERY_COST_LIST_FANOUT = 10
+CRM_MAX_QUERY_DEPTH = 10
+CRM_MAX_QUERY_COST = 10000
+
+# Worker threads shared by the async GraphQL view (crm.execution)
+CRM_ASYNC_MAX_THREADS = 16
+
+# Rows fetched per round trip by the streaming exports (crm.exports)
+CRM_EXPORT_CHUNK_SIZE = 2000
+
+# Longest range of days a revenueReport query may cover (crm.rollups)
+CRM_REVENUE_REPORT_MAX_DAYS = 366
+
+# Order reminder pipeline (crm.reminders): days of orders covered by a run
+# and order ids handed to each worker task
+CRM_REMINDER_WINDOW_DAYS = 7
+CRM_REMINDER_CHUNK_SIZE = 5000
+
+# Event-driven restocks (crm.restock): stock added per restock, and the
+# window in which low-stock crossings of a product fold into one task,
+# deduplicated through this CACHES alias (shared with the Celery workers)
+CRM_RESTOCK_INCREMENT = 10
+CRM_RESTOCK_COALESCE_SECONDS = 60
+CRM_RESTOCK_CACHE_ALIAS = 'shared'
+
 CRONJOBS = [
     ('*/5 * * * *', 'crm.cron.log_crm_heartbeat'),
+    # Low stock is also restocked as orders come in (crm.restock); the sweep
+    # catches what that missed, e.g. while the broker was down
     ('0 */12 * * *', 'crm.cron.update_low_stock'),
 ]
 MIDDLEWARE = [
@@ -84,6 +136,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock when a transaction starts so concurrent
+            # checkouts queue up instead of failing with "database is locked"
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -124,8 +182,31 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Seen by the web processes and the Celery workers (crm/settings.py)
+    # alike; short timeouts so an unreachable Redis fails fast
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://localhost:6379/1',
+        'OPTIONS': {'socket_connect_timeout': 1, 'socket_timeout': 1},
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Celery Configuration: the broker of the `celery -A crm` worker
+# (crm/settings.py), so tasks queued here (crm.restock) reach it. The web
+# processes only publish, so no result backend
+CELERY_BROKER_URL = 'redis://localhost:6379/0'
+CELERY_ACCEPT_CONTENT = ['json']
+CELERY_TASK_SERIALIZER = 'json'
+CELERY_TIMEZONE = 'America/New_York'
+# Seconds to wait for the broker when publishing
+CELERY_BROKER_CONNECTION_TIMEOUT = 1
+CELERY_BROKER_TRANSPORT_OPTIONS = {'socket_connect_timeout': 1}
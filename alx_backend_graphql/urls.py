@@ -16,12 +16,16 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from graphene_django.views import GraphQLView
 import alx_backend_graphql.schema
 import crm.schema
+from crm.views import AsyncCRMGraphQLView, CRMGraphQLView, export, metrics
 
 urlpatterns = [
     path('admin/', admin.site.urls),
-    path('graphql/', GraphQLView.as_view(graphiql=True, schema=alx_backend_graphql.schema.schema)),
+    path('graphql/', CRMGraphQLView.as_view(graphiql=True, schema=alx_backend_graphql.schema.schema)),
+    path('graphql/async/', AsyncCRMGraphQLView.as_view(graphiql=True, schema=alx_backend_graphql.schema.schema)),
+    path('metrics', metrics),
+    path('export/orders', export, {'name': 'orders'}),
+    path('export/customers', export, {'name': 'customers'}),
     # path('graphql/', GraphQLView.as_view(graphiql=True, schema=crm.schema.schema)),
 ]
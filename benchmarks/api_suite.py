@@ -0,0 +1,264 @@
+"""
+API benchmark suite: a fixed operation mix in-process and over HTTP, with a JSON baseline.
+
+Seeds a throwaway database with crm.seed, then replays the same seeded
+sequence of operations (filtered allOrders, customer(id:), createOrder
+and bulkCreateCustomers) twice: against alx_backend_graphql.schema.schema
+in-process, and against /graphql/ on a local WSGI server. Each transport
+and operation gets p50/p95/p99 latency, throughput and SQL queries per
+request; in-process the statements are counted with an OperationRecorder,
+over HTTP they are read from the X-CRM-Debug instrumentation extension.
+
+--save writes the results as JSON; --compare diffs a run against such a
+file and exits with status 1 when an operation ran more SQL queries, or
+its p95 grew by more than --tolerance.
+
+    python -m benchmarks.api_suite --requests 400 --save baseline.json
+    python -m benchmarks.api_suite --requests 400 --compare baseline.json
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+from benchmarks.common import serve, setup_django
+
+ALL_ORDERS_QUERY = """
+    query AllOrders($customer: String, $product: String) {
+        allOrders(first: 20, customerName: $customer, productName: $product) {
+            totalCount
+            edges { node { id totalAmount customer { name } items { quantity product { name } } } }
+        }
+    }
+"""
+CUSTOMER_QUERY = """
+    query Customer($id: ID!) {
+        customer(id: $id) { name email phone }
+    }
+"""
+CREATE_ORDER_MUTATION = """
+    mutation CreateOrder($customer: Int!, $items: [OrderItemInput!]) {
+        createOrder(order: {customer: $customer, items: $items}) {
+            order { id totalAmount }
+        }
+    }
+"""
+BULK_CREATE_CUSTOMERS_MUTATION = """
+    mutation BulkCreateCustomers($customers: [CustomerInput]!) {
+        bulkCreateCustomers(customers: $customers) {
+            customers { id }
+            errors
+        }
+    }
+"""
+
+# Operation name -> (document, relative weight in the mix)
+OPERATIONS = {
+    "allOrders": (ALL_ORDERS_QUERY, 4),
+    "customer": (CUSTOMER_QUERY, 4),
+    "createOrder": (CREATE_ORDER_MUTATION, 1),
+    "bulkCreateCustomers": (BULK_CREATE_CUSTOMERS_MUTATION, 1),
+}
+
+
+def build_mix(requests, seed, customer_ids, product_ids, transport):
+    """
+    The seeded list of (operation, variables) both transports replay
+    """
+    rng = random.Random(seed)
+    names = list(OPERATIONS)
+    weights = [OPERATIONS[name][1] for name in names]
+    mix = []
+    for i, name in enumerate(rng.choices(names, weights, k=requests)):
+        if name == "allOrders":
+            variables = {
+                "customer": rng.choice([None, "ada", "turing"]),
+                "product": rng.choice([None, "laptop", "pro"]),
+            }
+        elif name == "customer":
+            variables = {"id": str(rng.choice(customer_ids))}
+        elif name == "createOrder":
+            variables = {
+                "customer": rng.choice(customer_ids),
+                "items": [
+                    {"product": product_id, "quantity": rng.randint(1, 3)}
+                    for product_id in rng.sample(product_ids, rng.randint(1, 3))
+                ],
+            }
+        else:
+            variables = {
+                "customers": [
+                    {"name": f"Bench {i}.{j}", "email": f"bench.{transport}.{i}.{j}@example.com",
+                     "phone": "+12025550123"}
+                    for j in range(10)
+                ]
+            }
+        mix.append((name, variables))
+    return mix
+
+
+def run_inprocess(mix):
+    from crm.inprocess import InProcessContext
+    from crm.instrumentation import OperationRecorder
+
+    from alx_backend_graphql.schema import schema
+
+    samples = []
+    for name, variables in mix:
+        with OperationRecorder(name) as recorder:
+            result = schema.execute(
+                OPERATIONS[name][0], variable_values=variables, context_value=InProcessContext()
+            )
+        samples.append((name, recorder.duration, len(recorder.queries), bool(result.errors)))
+    return samples
+
+
+def run_http(mix, url):
+    import requests
+
+    session = requests.Session()
+    samples = []
+    for name, variables in mix:
+        start = time.perf_counter()
+        response = session.post(
+            url, json={"query": OPERATIONS[name][0], "variables": variables}, headers={"X-CRM-Debug": "1"}
+        )
+        elapsed = time.perf_counter() - start
+        body = response.json()
+        queries = body.get("extensions", {}).get("instrumentation", {}).get("sql", {}).get("count", 0)
+        samples.append((name, elapsed, queries, response.status_code != 200 or bool(body.get("errors"))))
+    return samples
+
+
+def percentile(ordered, fraction):
+    # Nearest rank
+    return ordered[max(0, min(len(ordered) - 1, round(fraction * len(ordered)) - 1))]
+
+
+def summarize(samples):
+    """
+    Per operation latency percentiles (ms), throughput and queries per request
+    """
+    results = {}
+    for name in OPERATIONS:
+        rows = [sample for sample in samples if sample[0] == name]
+        if not rows:
+            continue
+        latencies = sorted(duration for _, duration, _, _ in rows)
+        results[name] = {
+            "requests": len(rows),
+            "errors": sum(1 for *_, failed in rows if failed),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+            "throughput_rps": round(len(rows) / sum(latencies), 1),
+            "queries_per_request": round(sum(queries for _, _, queries, _ in rows) / len(rows), 2),
+        }
+    return results
+
+
+def print_results(transport, results):
+    print(f"\n{transport}")
+    print(f"  {'operation':22}{'reqs':>6}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+          f"{'req/s':>9}{'queries':>9}")
+    for name, row in results.items():
+        print(f"  {name:22}{row['requests']:6}{row['errors']:5}{row['p50_ms']:10.2f}{row['p95_ms']:10.2f}"
+              f"{row['p99_ms']:10.2f}{row['throughput_rps']:9.0f}{row['queries_per_request']:9.2f}")
+
+
+def compare(baseline, current, tolerance):
+    """
+    Print the changes against a baseline; returns the regressions found
+    """
+    regressions = []
+    print(f"\nAgainst baseline ({baseline['meta']['created']}), p95 tolerance {tolerance:.0%}:")
+    for transport, operations in current["results"].items():
+        for name, row in operations.items():
+            before = baseline["results"].get(transport, {}).get(name)
+            if before is None:
+                continue
+            p95_change = row["p95_ms"] / before["p95_ms"] - 1 if before["p95_ms"] else 0
+            line = (f"  {transport:10}{name:22}p95 {before['p95_ms']:8.2f} -> {row['p95_ms']:8.2f}ms "
+                    f"({p95_change:+.0%})  queries {before['queries_per_request']:g} -> "
+                    f"{row['queries_per_request']:g}")
+            if row["queries_per_request"] > before["queries_per_request"]:
+                regressions.append(f"{transport} {name}: more SQL queries per request")
+                line += "  QUERIES"
+            if p95_change > tolerance:
+                regressions.append(f"{transport} {name}: p95 {p95_change:+.0%}")
+                line += "  SLOWER"
+            print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=400, help="operations per transport")
+    parser.add_argument("--customers", type=int, default=5000)
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--orders", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--warmup", type=int, default=20, help="untimed operations per transport")
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="diff the results against this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 growth (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.conf import settings
+    from django.db import connection
+
+    from crm.models import Customer, Product
+    from crm.seed import seed_crm
+
+    seed_crm(customers=args.customers, products=args.products, orders=args.orders, seed=args.seed)
+    # Checkouts in the mix must not run products out of stock
+    Product.objects.update(stock=10_000_000)
+    customer_ids = list(Customer.objects.values_list("pk", flat=True))
+    product_ids = list(Product.objects.values_list("pk", flat=True))
+    # The X-CRM-Debug report is only returned to staff users or under DEBUG
+    settings.DEBUG = True
+    server, url = serve()
+
+    results = {}
+    for transport in ("inprocess", "http"):
+        warmup = build_mix(args.warmup, args.seed + 1, customer_ids, product_ids, f"{transport}-warmup")
+        mix = build_mix(args.requests, args.seed, customer_ids, product_ids, transport)
+        run = run_inprocess if transport == "inprocess" else lambda mix: run_http(mix, url)
+        run(warmup)
+        results[transport] = summarize(run(mix))
+        print_results(transport, results[transport])
+    server.shutdown()
+
+    current = {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "database": f"{connection.vendor} {connection.Database.sqlite_version}"
+            if connection.vendor == "sqlite" else connection.vendor,
+            "arguments": {
+                name: getattr(args, name)
+                for name in ("requests", "customers", "products", "orders", "seed", "warmup")
+            },
+        },
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, "w") as baseline_file:
+            json.dump(current, baseline_file, indent=2, sort_keys=True)
+        print(f"\nSaved to {args.save}")
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(json.load(baseline_file), current, args.tolerance)
+        if regressions:
+            print("\nRegressions:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Load test: sync GraphQL view under WSGI against the async view under ASGI.
+
+Drives both request handlers in-process with --clients concurrent
+clients, each sending --requests-per-client requests in a row: the WSGI
+side through django.test.Client on one thread per client, the ASGI side
+through django.test.AsyncClient tasks on a single event loop. The query
+selects two independent top-level connections, which the async view
+resolves concurrently.
+
+    python -m benchmarks.async_load --clients 200 --requests-per-client 10
+"""
+
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+from decimal import Decimal
+
+from benchmarks.common import setup_django
+
+QUERY = """
+    {
+        allCustomers { totalCount }
+        allOrders(first: 20) { totalCount edges { node { totalAmount customer { name } } } }
+    }
+"""
+
+
+def seed(customers, orders):
+    from crm.models import Customer, Order, Product
+
+    created = Customer.objects.bulk_create(
+        Customer(name=f"Customer {i}", email=f"customer{i}@example.com") for i in range(customers)
+    )
+    product = Product.objects.create(name="Widget", price=Decimal("9.99"), stock=1_000_000)
+    placed = Order.objects.bulk_create(
+        Order(customer=created[i % customers], total_amount=Decimal("9.99")) for i in range(orders)
+    )
+    Order.products.through.objects.bulk_create(
+        Order.products.through(order_id=order.pk, product_id=product.pk, unit_price=product.price)
+        for order in placed
+    )
+
+
+def report(label, latencies, elapsed):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{label}: {len(latencies) / elapsed:7.0f} requests/s  "
+          f"p50 {statistics.median(latencies) * 1000:7.1f}ms  p95 {p95 * 1000:7.1f}ms")
+
+
+def run_wsgi(clients, requests_per_client):
+    from django.test import Client
+
+    latencies = []
+    lock = threading.Lock()
+
+    def client_loop():
+        client = Client()
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            response = client.post("/graphql/", {"query": QUERY}, content_type="application/json")
+            elapsed = time.perf_counter() - start
+            assert response.status_code == 200, response.content
+            with lock:
+                latencies.append(elapsed)
+
+    threads = [threading.Thread(target=client_loop) for _ in range(clients)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, time.perf_counter() - start
+
+
+async def run_asgi(clients, requests_per_client):
+    from django.test import AsyncClient
+
+    latencies = []
+
+    async def client_loop():
+        client = AsyncClient()
+        for _ in range(requests_per_client):
+            start = time.perf_counter()
+            response = await client.post(
+                "/graphql/async/", {"query": QUERY}, content_type="application/json"
+            )
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.content
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(clients)))
+    return latencies, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests-per-client", type=int, default=10)
+    parser.add_argument("--customers", type=int, default=5000)
+    parser.add_argument("--orders", type=int, default=50000)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.conf import settings
+
+    settings.ALLOWED_HOSTS = ["testserver"]
+    seed(args.customers, args.orders)
+
+    report("sync WSGI ", *run_wsgi(args.clients, args.requests_per_client))
+    report("async ASGI", *asyncio.run(run_asgi(args.clients, args.requests_per_client)))
+
+
+if __name__ == "__main__":
+    main()
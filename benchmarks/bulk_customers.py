@@ -0,0 +1,86 @@
+"""
+bulkCreateCustomers benchmark: set-based insert against the per-row loop.
+
+The per-row loop is the get_or_create implementation the mutation used
+before it went set-based, kept here as the baseline.
+
+    python -m benchmarks.bulk_customers --customers 50000 --chunk-size 1000
+"""
+
+import argparse
+import time
+from types import SimpleNamespace
+
+from benchmarks.common import setup_django
+
+
+def legacy_bulk_create(customers):
+    from django.core.exceptions import ValidationError
+
+    from crm.models import Customer, phone_regex
+
+    created_customers = []
+    errors = []
+    for customer_data in customers:
+        try:
+            phone_regex(customer_data.phone)
+            customer, created = Customer.objects.get_or_create(
+                email=customer_data.email,
+                defaults={"name": customer_data.name, "phone": customer_data.phone},
+            )
+            if created:
+                created_customers.append(customer)
+            else:
+                errors.append(
+                    f"Error creating customer with email '{customer_data.email}': Email already exists."
+                )
+        except ValidationError as e:
+            errors.append(f"Error creating customer: {e}")
+    return created_customers, errors
+
+
+def make_batch(prefix, count):
+    # Every 20th row reuses an earlier email and every 50th has a bad phone
+    return [
+        SimpleNamespace(
+            name=f"Contact {i}",
+            email=f"{prefix}{i - i % 20 if i % 20 == 19 else i}@example.com",
+            phone="bad" if i % 50 == 49 else f"+1{5550000000 + i}",
+        )
+        for i in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--customers", type=int, default=50000)
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--legacy-customers", type=int, default=5000,
+                        help="rows to push through the per-row loop for comparison")
+    args = parser.parse_args()
+
+    setup_django()
+
+    from crm.services import bulk_create_customers
+
+    batch = make_batch("bulk", args.customers)
+    start = time.perf_counter()
+    created, errors = bulk_create_customers(batch, chunk_size=args.chunk_size)
+    bulk_elapsed = time.perf_counter() - start
+
+    legacy_batch = make_batch("legacy", args.legacy_customers)
+    start = time.perf_counter()
+    legacy_created, legacy_errors = legacy_bulk_create(legacy_batch)
+    legacy_elapsed = time.perf_counter() - start
+
+    bulk_rate = args.customers / bulk_elapsed
+    legacy_rate = args.legacy_customers / legacy_elapsed
+    print(f"set-based: {args.customers} rows in {bulk_elapsed:.2f}s "
+          f"({bulk_rate:.0f} rows/s, {len(created)} created, {len(errors)} errors)")
+    print(f"per-row:   {args.legacy_customers} rows in {legacy_elapsed:.2f}s "
+          f"({legacy_rate:.0f} rows/s, {len(legacy_created)} created, {len(legacy_errors)} errors)")
+    print(f"speedup: {bulk_rate / legacy_rate:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
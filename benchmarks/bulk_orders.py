@@ -0,0 +1,84 @@
+"""
+Bulk order import benchmark: bulkCreateOrders against a loop of createOrder.
+
+    python -m benchmarks.bulk_orders --orders 10000
+"""
+
+import argparse
+import random
+import time
+from decimal import Decimal
+from types import SimpleNamespace
+
+from benchmarks.common import setup_django
+
+BULK_MUTATION = """
+    mutation ($orders: [OrderInput!]!) {
+        bulkCreateOrders(orders: $orders) { errors }
+    }
+"""
+
+SINGLE_MUTATION = """
+    mutation ($order: OrderInput!) {
+        createOrder(order: $order) { message }
+    }
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--customers", type=int, default=2000)
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--loop-orders", type=int, default=500,
+                        help="orders to place through createOrder for comparison")
+    args = parser.parse_args()
+
+    setup_django()
+
+    from alx_backend_graphql.schema import schema
+    from crm.models import Customer, Order, Product
+
+    customers = Customer.objects.bulk_create(
+        Customer(name=f"Customer {i}", email=f"customer{i}@example.com")
+        for i in range(args.customers)
+    )
+    products = Product.objects.bulk_create(
+        Product(name=f"Product {i}", price=Decimal("4.99"), stock=1_000_000)
+        for i in range(args.products)
+    )
+    rng = random.Random(0)
+    customer_ids = [customer.pk for customer in customers]
+    product_ids = [product.pk for product in products]
+
+    def random_order():
+        return {
+            "customer": rng.choice(customer_ids),
+            "products": rng.sample(product_ids, rng.randint(1, 4)),
+        }
+
+    orders = [random_order() for _ in range(args.orders)]
+    start = time.perf_counter()
+    result = schema.execute(BULK_MUTATION, variables={"orders": orders}, context_value=SimpleNamespace())
+    bulk_elapsed = time.perf_counter() - start
+    assert result.errors is None, result.errors
+    assert not result.data["bulkCreateOrders"]["errors"]
+    assert Order.objects.count() == args.orders
+
+    start = time.perf_counter()
+    for _ in range(args.loop_orders):
+        result = schema.execute(
+            SINGLE_MUTATION, variables={"order": random_order()}, context_value=SimpleNamespace()
+        )
+        assert result.errors is None, result.errors
+    loop_elapsed = time.perf_counter() - start
+
+    bulk_rate = args.orders / bulk_elapsed
+    loop_rate = args.loop_orders / loop_elapsed
+    print(f"bulkCreateOrders: {args.orders} orders in {bulk_elapsed:.2f}s ({bulk_rate:.0f} orders/s)")
+    print(f"createOrder loop: {args.loop_orders} orders in {loop_elapsed:.2f}s ({loop_rate:.0f} orders/s)")
+    print(f"speedup: {bulk_rate / loop_rate:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
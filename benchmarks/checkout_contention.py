@@ -0,0 +1,98 @@
+"""
+Multi-threaded checkout contention benchmark for crm.services.place_order.
+
+A handful of products with little stock are hammered by many threads at
+once. The run reports throughput and verifies that no product was
+oversold: every unit that left stock is accounted for by exactly one
+order line.
+
+    python -m benchmarks.checkout_contention --threads 16 --attempts 200
+"""
+
+import argparse
+import random
+import threading
+import time
+from decimal import Decimal
+
+from benchmarks.common import setup_django
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--attempts", type=int, default=200, help="orders per thread")
+    parser.add_argument("--products", type=int, default=5)
+    parser.add_argument("--stock", type=int, default=500)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.core.exceptions import ValidationError
+    from django.db import connection
+    from django.db.models import Sum
+
+    from crm.models import Customer, Order, OrderItem, Product
+    from crm.services import place_order
+
+    customer = Customer.objects.create(name="Bench", email="bench@example.com")
+    products = Product.objects.bulk_create(
+        Product(name=f"Hot item {i}", price=Decimal("10.00"), stock=args.stock)
+        for i in range(args.products)
+    )
+    product_ids = [product.pk for product in products]
+
+    placed = []
+    rejected = []
+    failed = []
+    lock = threading.Lock()
+
+    def worker(seed):
+        rng = random.Random(seed)
+        ok = out_of_stock = errors = 0
+        try:
+            for _ in range(args.attempts):
+                basket = rng.sample(product_ids, rng.randint(1, len(product_ids)))
+                try:
+                    place_order(customer.pk, basket)
+                    ok += 1
+                except ValidationError:
+                    out_of_stock += 1
+                except Exception as e:
+                    errors += 1
+                    with lock:
+                        failed.append(repr(e))
+        finally:
+            connection.close()
+        with lock:
+            placed.append(ok)
+            rejected.append(out_of_stock)
+
+    threads = [threading.Thread(target=worker, args=(seed,)) for seed in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    total_attempts = args.threads * args.attempts
+    sold = OrderItem.objects.aggregate(units=Sum("quantity"))["units"] or 0
+    remaining = sum(Product.objects.filter(pk__in=product_ids).values_list("stock", flat=True))
+    oversold = Product.objects.filter(pk__in=product_ids, stock__lt=0).count()
+
+    print(f"threads={args.threads} attempts={total_attempts} elapsed={elapsed:.2f}s")
+    print(f"placed={sum(placed)} out_of_stock={sum(rejected)} errors={len(failed)}")
+    print(f"throughput={total_attempts / elapsed:.0f} checkouts/s")
+    print(f"units sold={sold} remaining={remaining} initial={args.stock * args.products}")
+    if failed:
+        print(f"first error: {failed[0]}")
+
+    assert oversold == 0, "stock went negative"
+    assert sold + remaining == args.stock * args.products, "stock and order lines disagree"
+    assert Order.objects.count() == sum(placed), "orders and successful checkouts disagree"
+    print("no overselling detected")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+This file contains the shared setup for the CRM benchmark scripts.
+
+Each benchmark runs against a throwaway SQLite database so it never
+touches db.sqlite3. Run them from the project root, e.g.
+
+    python -m benchmarks.checkout_contention
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+
+def setup_django(db_path=None):
+    """
+    Configure Django against a temporary database and migrate it
+    """
+    sys.path.insert(0, str(PROJECT_ROOT))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "alx_backend_graphql.settings")
+
+    from django.conf import settings
+
+    if db_path is None:
+        db_path = Path(tempfile.mkdtemp(prefix="crm-bench-")) / "bench.sqlite3"
+    settings.DATABASES["default"]["NAME"] = str(db_path)
+
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command("migrate", verbosity=0)
+    return db_path
+
+
+@contextmanager
+def timer(label):
+    """
+    Print how long the wrapped block took
+    """
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+    print(f"{label}: {elapsed:.3f}s")
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve():
+    """
+    Serve the project on a local WSGI server thread, with the CSRF
+    middleware removed as a remote client would need a token otherwise.
+    Returns the server and the GraphQL endpoint URL.
+    """
+    from django.conf import settings
+    from django.core.wsgi import get_wsgi_application
+
+    settings.ALLOWED_HOSTS = ["127.0.0.1", "localhost"]
+    settings.MIDDLEWARE = [m for m in settings.MIDDLEWARE if "Csrf" not in m]
+    server = make_server("127.0.0.1", 0, get_wsgi_application(), handler_class=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}/graphql/"
@@ -0,0 +1,51 @@
+"""
+Streaming export benchmark: peak Python memory against export size.
+
+Seeds --rows orders spread over two years, then consumes the NDJSON
+order export through the view filtered to the last week, the last ten
+weeks and everything, and reports rows/s and the tracemalloc peak of
+each run. The peak should stay flat as the row count grows.
+
+    python -m benchmarks.export_memory --rows 500000
+"""
+
+import argparse
+import datetime
+import time
+import tracemalloc
+
+from benchmarks.common import setup_django, timer
+from benchmarks.filter_indexes import seed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=500_000)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.conf import settings
+    from django.test import Client
+
+    settings.ALLOWED_HOSTS = ["testserver"]
+    with timer(f"seeded {args.rows} orders"):
+        seed(args.rows)
+
+    client = Client()
+    today = datetime.date.today()
+    for days in (7, 70, None):
+        params = {"format": "ndjson"}
+        if days is not None:
+            params["order_date_after"] = (today - datetime.timedelta(days=days)).isoformat()
+        tracemalloc.start()
+        start = time.perf_counter()
+        response = client.get("/export/orders", params)
+        count = sum(chunk.count(b"\n") for chunk in response.streaming_content)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{count:>9} rows  {count / elapsed:9.0f} rows/s  peak {peak / 1024 / 1024:6.1f} MiB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+EXPLAIN QUERY PLAN check for the filters in crm/filters.py.
+
+Seeds a SQLite database with --rows orders (plus a tenth as many
+customers and a hundredth as many products), builds each filter's
+queryset through its FilterSet and prints the plan SQLite picks for it,
+along with the query time. The run fails if a filter does not use the
+index (or search table) meant to serve it.
+
+    python -m benchmarks.filter_indexes --rows 1000000
+"""
+
+import argparse
+import datetime
+import random
+import time
+from decimal import Decimal
+
+from benchmarks.common import setup_django, timer
+
+
+def seed(rows):
+    from django.db import connection, transaction
+
+    from crm.models import Customer, Order, Product
+    from crm.stats import rebuild_customer_stats
+
+    rng = random.Random(0)
+    customers = max(rows // 10, 1)
+    products = max(rows // 100, 1)
+    today = datetime.date.today()
+    now = datetime.datetime.now(datetime.timezone.utc)
+
+    with transaction.atomic():
+        Customer.objects.bulk_create(
+            (
+                Customer(
+                    name=f"Customer {i}",
+                    email=f"customer{i}@example.com",
+                    phone=f"+1{rng.randint(2000000000, 9999999999)}",
+                )
+                for i in range(customers)
+            ),
+            batch_size=5000,
+        )
+        Product.objects.bulk_create(
+            (
+                Product(
+                    name=f"Product {i}",
+                    price=Decimal(rng.randint(100, 50000)) / 100,
+                    stock=rng.randint(0, 500),
+                )
+                for i in range(products)
+            ),
+            batch_size=5000,
+        )
+
+    # auto_now_add would stamp every order with today, so insert order
+    # rows directly to spread them over two years
+    customer_ids = list(Customer.objects.values_list("pk", flat=True))
+    table = Order._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        batch = []
+        for _ in range(rows):
+            batch.append((
+                rng.choice(customer_ids),
+                str(Decimal(rng.randint(100, 200000)) / 100),
+                (today - datetime.timedelta(days=rng.randint(0, 730))).isoformat(),
+                now.isoformat(),
+                now.isoformat(),
+            ))
+            if len(batch) == 10000:
+                cursor.executemany(
+                    f"INSERT INTO {table} (customer_id, total_amount, order_date, created_at, updated_at)"
+                    " VALUES (%s, %s, %s, %s, %s)",
+                    batch,
+                )
+                batch = []
+        if batch:
+            cursor.executemany(
+                f"INSERT INTO {table} (customer_id, total_amount, order_date, created_at, updated_at)"
+                " VALUES (%s, %s, %s, %s, %s)",
+                batch,
+            )
+
+    # The raw inserts bypass the order services, so derive the stats here
+    rebuild_customer_stats()
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+
+def cases():
+    from crm.filters import CustomerFilter, OrderFilter, ProductFilter
+    from crm.models import Customer, Order, Product
+
+    today = datetime.date.today()
+    last_week = (today - datetime.timedelta(days=7)).isoformat()
+    # (label, filterset, model, data, fragment expected in the query plan)
+    return [
+        ("Order.order_date range", OrderFilter, Order,
+         {"order_date_after": last_week, "order_date_before": today.isoformat()}, "crm_order_date_idx"),
+        ("Order.total_amount range", OrderFilter, Order,
+         {"total_amount_min": "1990", "total_amount_max": "2000"}, "crm_order_total_idx"),
+        ("Customer.created_at range", CustomerFilter, Customer,
+         {"created_at_after": today.isoformat()}, "crm_customer_created_idx"),
+        ("Customer.phone_pattern", CustomerFilter, Customer,
+         {"phone_pattern": "+1555"}, "crm_customer_phone_idx"),
+        ("Product.price range", ProductFilter, Product,
+         {"price_min": "100", "price_max": "101"}, "crm_product_price_idx"),
+        ("Product.stock range", ProductFilter, Product,
+         {"stock_min": "490", "stock_max": "500"}, "crm_product_stock_idx"),
+        ("Product.low_stock", ProductFilter, Product,
+         {"low_stock": "5"}, "crm_product_low_stock_idx"),
+        ("Customer.name icontains", CustomerFilter, Customer,
+         {"name": "omer 4242"}, "crm_customer_search VIRTUAL TABLE"),
+        ("Customer.email icontains", CustomerFilter, Customer,
+         {"email": "r4242@"}, "crm_customer_search VIRTUAL TABLE"),
+        ("Customer search", CustomerFilter, Customer,
+         {"search": "customer 4242"}, "crm_customer_search VIRTUAL TABLE"),
+        ("Product.name icontains", ProductFilter, Product,
+         {"name": "duct 42"}, "crm_product_search VIRTUAL TABLE"),
+        ("Customer top by revenue", CustomerFilter, Customer,
+         {"order_by": "-lifetime_value"}, "crm_customer_ltv_idx"),
+        ("Customer.last_order_date", CustomerFilter, Customer,
+         {"last_order_date_before": last_week}, "crm_customer_last_order_idx"),
+        ("Order.customer_name", OrderFilter, Order,
+         {"customer_name": "omer 4242"}, "crm_customer_search VIRTUAL TABLE"),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.db import connection
+
+    with timer(f"seeded {args.rows} orders"):
+        seed(args.rows)
+
+    failures = []
+    for label, filterset_class, model, data, expected in cases():
+        filterset = filterset_class(data=data, queryset=model.objects.all())
+        assert filterset.is_valid(), filterset.errors
+        queryset = filterset.qs[:100]
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            plan = "; ".join(row[-1] for row in cursor.fetchall())
+            start = time.perf_counter()
+            cursor.execute(sql, params)
+            count = len(cursor.fetchall())
+            elapsed = (time.perf_counter() - start) * 1000
+        ok = expected in plan
+        if not ok:
+            failures.append(label)
+        print(f"{'ok ' if ok else 'FAIL'} {label:<28} {elapsed:8.2f}ms {count:>4} rows  {plan}")
+
+    if failures:
+        raise SystemExit(f"filters not using their index: {', '.join(failures)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Persisted query benchmark: requests/s through /graphql/ with and without the document cache.
+
+Posts the same operation repeatedly through the Django test client, first
+with the cache cleared before every request (parse and validate each
+time), then as an APQ hash-only request served from the cache.
+
+    python -m benchmarks.persisted_queries --requests 2000
+"""
+
+import argparse
+import time
+
+from benchmarks.common import setup_django
+
+QUERY = """
+    query Orders($first: Int) {
+        allOrders(first: $first) {
+            edges { node { id totalAmount customer { name email }
+                           products { edges { node { name price } } } } }
+        }
+    }
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from django.conf import settings
+    from django.test import Client
+
+    from crm.persisted_queries import DOCUMENT_CACHE, query_hash
+
+    settings.ALLOWED_HOSTS = ["testserver"]
+    client = Client()
+    variables = {"first": 1}
+
+    def post(body):
+        response = client.post("/graphql/", body, content_type="application/json")
+        assert response.status_code == 200, response.content
+
+    start = time.perf_counter()
+    for _ in range(args.requests):
+        DOCUMENT_CACHE.clear()
+        post({"query": QUERY, "variables": variables})
+    uncached = time.perf_counter() - start
+
+    persisted = {
+        "variables": variables,
+        "extensions": {"persistedQuery": {"version": 1, "sha256Hash": query_hash(QUERY)}},
+    }
+    post({**persisted, "query": QUERY})
+    start = time.perf_counter()
+    for _ in range(args.requests):
+        post(persisted)
+    cached = time.perf_counter() - start
+
+    print(f"parse+validate: {args.requests / uncached:.0f} requests/s")
+    print(f"persisted:      {args.requests / cached:.0f} requests/s")
+    print(f"speedup: {uncached / cached:.2f}x ({DOCUMENT_CACHE.hits} hits, {DOCUMENT_CACHE.misses} misses)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark: a month of revenue from the daily rollups against the orders table.
+
+Seeds --orders orders spread evenly over --days days, builds the rollups
+with rebuild_rollups and compares summing the last 30 days straight off
+crm_order with summing the same days' DailyRevenue rows, and with the
+whole revenueReport query (totals plus the per-day rows).
+
+    python -m benchmarks.revenue_report --orders 200000 --days 365
+"""
+
+import argparse
+import datetime
+from decimal import Decimal
+
+from benchmarks.common import setup_django, timer
+
+REPORT_QUERY = """
+    query ($from: Date!, $to: Date!) {
+        revenueReport(from: $from, to: $to) { orderCount revenue days { date revenue } }
+    }
+"""
+
+
+def seed(orders, days):
+    from crm.models import Customer, Order, Product
+
+    today = datetime.date.today()
+    customers = Customer.objects.bulk_create(
+        Customer(name=f"Customer {i}", email=f"customer{i}@example.com") for i in range(1000)
+    )
+    product = Product.objects.create(name="Widget", price=Decimal("9.99"), stock=1_000_000)
+    placed = Order.objects.bulk_create(
+        (Order(customer=customers[i % len(customers)], total_amount=Decimal("9.99")) for i in range(orders)),
+        batch_size=5000,
+    )
+    Order.products.through.objects.bulk_create(
+        (
+            Order.products.through(order_id=order.pk, product_id=product.pk, unit_price=product.price)
+            for order in placed
+        ),
+        batch_size=5000,
+    )
+    for offset in range(days):
+        Order.objects.filter(pk__gt=offset * orders // days, pk__lte=(offset + 1) * orders // days).update(
+            order_date=today - datetime.timedelta(days=offset)
+        )
+    return today - datetime.timedelta(days=days - 1), today
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--orders", type=int, default=200000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    setup_django()
+
+    from types import SimpleNamespace
+
+    from django.db.models import Count, Sum
+
+    from alx_backend_graphql.schema import schema
+    from crm.models import Order
+    from crm.rollups import rebuild_rollups, rollup_totals
+
+    first, last = seed(args.orders, args.days)
+    with timer(f"rebuild_rollups over {args.days} days"):
+        rebuild_rollups(first, last)
+
+    month = (last - datetime.timedelta(days=29), last)
+    with timer(f"{args.repeat} x orders table, last 30 days"):
+        for _ in range(args.repeat):
+            Order.objects.filter(order_date__range=month).aggregate(
+                orders=Count("pk"), revenue=Sum("total_amount")
+            )
+    with timer(f"{args.repeat} x rollup table, last 30 days"):
+        for _ in range(args.repeat):
+            rollup_totals(*month)
+    variables = {"from": month[0].isoformat(), "to": month[1].isoformat()}
+    with timer(f"{args.repeat} x revenueReport, last 30 days"):
+        for _ in range(args.repeat):
+            result = schema.execute(REPORT_QUERY, variables=variables, context_value=SimpleNamespace())
+            assert result.errors is None, result.errors
+
+
+if __name__ == "__main__":
+    main()
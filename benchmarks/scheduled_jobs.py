@@ -0,0 +1,127 @@
+"""
+Benchmark: scheduled jobs over HTTP against the same jobs run in-process.
+
+Serves the project over a local WSGI server (CSRF middleware removed, as
+a remote job would need a token otherwise) and times each job the old
+way, a fresh gql Client with fetch_schema_from_transport=True (a plain
+requests POST for the report) per run, against the in-process versions
+in crm.cron, crm.tasks and crm.reminders.
+
+    python -m benchmarks.scheduled_jobs --runs 20
+"""
+
+import argparse
+import time
+from decimal import Decimal
+from unittest import mock
+
+from benchmarks.common import serve, setup_django
+
+REPORT_QUERY = "{ allCustomers { totalCount } allOrders { totalCount } }"
+REMINDERS_QUERY = """
+    query ($after: String) {
+        allOrdersKeyset(first: 100, after: $after) {
+            pageInfo { hasNextPage endCursor }
+            edges { node { id customer { email } } }
+        }
+    }
+"""
+
+
+def seed(customers, orders):
+    from crm.models import Customer, Order, Product
+    from crm.rollups import history_bounds, rebuild_rollups
+
+    created = Customer.objects.bulk_create(
+        Customer(name=f"Customer {i}", email=f"customer{i}@example.com") for i in range(customers)
+    )
+    products = Product.objects.bulk_create(
+        Product(name=f"Product {i}", price=Decimal("9.99"), stock=i % 20) for i in range(50)
+    )
+    placed = Order.objects.bulk_create(
+        Order(customer=created[i % customers], total_amount=Decimal("9.99")) for i in range(orders)
+    )
+    Order.products.through.objects.bulk_create(
+        Order.products.through(
+            order_id=order.pk, product_id=products[i % 50].pk, unit_price=products[i % 50].price
+        )
+        for i, order in enumerate(placed)
+    )
+    rebuild_rollups(*history_bounds())
+
+
+def gql_execute(url, query, variables=None):
+    from gql import Client, gql
+    from gql.transport.requests import RequestsHTTPTransport
+
+    client = Client(transport=RequestsHTTPTransport(url=url), fetch_schema_from_transport=True)
+    return client.execute(gql(query), variable_values=variables)
+
+
+def http_jobs(url):
+    import requests
+
+    from crm.cron import HEARTBEAT_QUERY, LOW_STOCK_MUTATION
+
+    def report():
+        response = requests.post(url, json={"query": REPORT_QUERY})
+        response.raise_for_status()
+
+    def reminders():
+        after = None
+        while True:
+            page = gql_execute(url, REMINDERS_QUERY, {"after": after})["allOrdersKeyset"]
+            if not page["pageInfo"]["hasNextPage"]:
+                return
+            after = page["pageInfo"]["endCursor"]
+
+    return {
+        "generate_crm_report": report,
+        "log_crm_heartbeat": lambda: gql_execute(url, HEARTBEAT_QUERY),
+        "update_low_stock": lambda: gql_execute(url, LOW_STOCK_MUTATION),
+        "send_order_reminders": reminders,
+    }
+
+
+def local_jobs():
+    from crm import cron, reminders, tasks
+
+    return {
+        "generate_crm_report": tasks.generate_crm_report,
+        "log_crm_heartbeat": cron.log_crm_heartbeat,
+        "update_low_stock": cron.update_low_stock,
+        "send_order_reminders": reminders.send_order_reminders,
+    }
+
+
+def timed(job, runs):
+    start = time.perf_counter()
+    for _ in range(runs):
+        job()
+    return (time.perf_counter() - start) / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--orders", type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+    seed(args.customers, args.orders)
+    server, url = serve()
+
+    http, local = http_jobs(url), local_jobs()
+    # Keep the jobs' log files and prints out of the measurement
+    with mock.patch("builtins.open", mock.mock_open()), mock.patch("builtins.print"):
+        results = [(name, timed(http[name], args.runs), timed(local[name], args.runs)) for name in http]
+    server.shutdown()
+
+    for name, over_http, in_process in results:
+        print(f"{name:22} HTTP {over_http * 1000:8.1f}ms  in-process {in_process * 1000:8.1f}ms  "
+              f"{over_http / in_process:6.1f}x faster")
+
+
+if __name__ == "__main__":
+    main()
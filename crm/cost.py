@@ -0,0 +1,178 @@
+"""
+This file contains the static cost analysis run before a GraphQL operation.
+
+The analyzer walks the validated document with the request's coerced
+variables and estimates how many objects the operation can produce:
+
+* every object-typed field costs 1, scalars and introspection cost 0;
+* a connection multiplies the cost of its selection by its page size,
+  ``first``/``last`` when given, otherwise ``CRM_CONNECTION_MAX_LIMIT``
+  at the top level and ``CRM_QUERY_COST_LIST_FANOUT`` when nested;
+* any other list multiplies its selection by ``CRM_QUERY_COST_LIST_FANOUT``.
+
+Operations deeper than ``CRM_MAX_QUERY_DEPTH``, costlier than
+``CRM_MAX_QUERY_COST`` or asking a connection for more than
+``CRM_CONNECTION_MAX_LIMIT`` rows are rejected without being executed.
+"""
+
+from django.conf import settings
+from graphql import (
+    FieldNode,
+    FragmentDefinitionNode,
+    FragmentSpreadNode,
+    GraphQLInt,
+    GraphQLList,
+    InlineFragmentNode,
+    get_named_type,
+    get_nullable_type,
+    get_operation_ast,
+    is_leaf_type,
+    value_from_ast,
+)
+from graphql.error import GraphQLError
+
+
+def connection_max_limit():
+    return getattr(settings, "CRM_CONNECTION_MAX_LIMIT", 100)
+
+
+def list_fanout():
+    return getattr(settings, "CRM_QUERY_COST_LIST_FANOUT", 10)
+
+
+class QueryCostError(GraphQLError):
+    """
+    An operation rejected by the cost analysis, with its code in extensions
+    """
+
+    def __init__(self, message, code, nodes=None):
+        super().__init__(message, nodes, extensions={"code": code})
+
+
+def is_connection_type(type_):
+    fields = getattr(type_, "fields", None) or {}
+    return "edges" in fields and "pageInfo" in fields
+
+
+class CostAnalysis:
+    """
+    The estimated cost and depth of one operation of a document
+    """
+
+    def __init__(self, schema, document, operation_name=None, variables=None):
+        self.schema = schema
+        self.variables = variables or {}
+        self.fragments = {
+            definition.name.value: definition
+            for definition in document.definitions
+            if isinstance(definition, FragmentDefinitionNode)
+        }
+        self.errors = []
+        self.depth = 0
+        self.cost = 0
+        operation = get_operation_ast(document, operation_name)
+        if operation is not None:
+            root = schema.get_root_type(operation.operation)
+            self.cost = self.selection_cost(root, operation.selection_set, 1, nested=False)
+
+    def fields(self, parent_type, selection_set, visited=None):
+        """
+        Yield (parent type, field node) for selection_set, through fragments
+        """
+        visited = visited if visited is not None else set()
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                yield parent_type, selection
+            elif isinstance(selection, InlineFragmentNode):
+                fragment_type = parent_type
+                if selection.type_condition is not None:
+                    fragment_type = self.schema.get_type(selection.type_condition.name.value)
+                yield from self.fields(fragment_type, selection.selection_set, visited)
+            elif isinstance(selection, FragmentSpreadNode):
+                name = selection.name.value
+                fragment = self.fragments.get(name)
+                if fragment is None or name in visited:
+                    continue
+                visited.add(name)
+                fragment_type = self.schema.get_type(fragment.type_condition.name.value)
+                yield from self.fields(fragment_type, fragment.selection_set, visited)
+
+    def argument(self, field_node, name):
+        for argument in field_node.arguments or ():
+            if argument.name.value == name:
+                return value_from_ast(argument.value, GraphQLInt, self.variables)
+        return None
+
+    def page_size(self, field_node, nested):
+        size = None
+        limit = connection_max_limit()
+        for name in ("first", "last"):
+            value = self.argument(field_node, name)
+            if not isinstance(value, int) or isinstance(value, bool):
+                continue
+            if limit and value > limit:
+                self.errors.append(QueryCostError(
+                    f"Requesting {value} records on the `{field_node.name.value}` connection "
+                    f"exceeds the `{name}` limit of {limit} records.",
+                    "CONNECTION_LIMIT_EXCEEDED",
+                    [field_node],
+                ))
+            size = max(size or 0, value)
+        if size is not None:
+            return size
+        return list_fanout() if nested else limit
+
+    def selection_cost(self, parent_type, selection_set, depth, nested, in_connection=False):
+        cost = 0
+        for field_parent, field_node in self.fields(parent_type, selection_set):
+            name = field_node.name.value
+            field = getattr(field_parent, "fields", {}).get(name)
+            if name.startswith("__") or field is None:
+                continue
+            self.depth = max(self.depth, depth)
+            return_type = get_named_type(field.type)
+            if is_leaf_type(return_type) or field_node.selection_set is None:
+                continue
+
+            if is_connection_type(return_type):
+                multiplier = self.page_size(field_node, nested)
+                child_nested, child_in_connection = True, True
+            elif isinstance(get_nullable_type(field.type), GraphQLList):
+                # A connection's edges are already counted by its page size
+                multiplier = 1 if in_connection else list_fanout()
+                child_nested, child_in_connection = True, False
+            else:
+                multiplier = 1
+                child_nested, child_in_connection = nested, False
+
+            cost += 1 + multiplier * self.selection_cost(
+                return_type, field_node.selection_set, depth + 1, child_nested, child_in_connection
+            )
+        return cost
+
+    def validate(self):
+        """
+        The errors rejecting this operation, if any
+        """
+        errors = list(self.errors)
+        max_depth = getattr(settings, "CRM_MAX_QUERY_DEPTH", 10)
+        if max_depth and self.depth > max_depth:
+            errors.append(QueryCostError(
+                f"Query depth {self.depth} exceeds the maximum depth of {max_depth}.",
+                "QUERY_TOO_DEEP",
+            ))
+        max_cost = getattr(settings, "CRM_MAX_QUERY_COST", 10000)
+        if max_cost and self.cost > max_cost:
+            errors.append(QueryCostError(
+                f"Query cost {self.cost} exceeds the maximum cost of {max_cost}.",
+                "QUERY_TOO_COMPLEX",
+            ))
+        return errors
+
+    def as_extensions(self):
+        return {
+            "requested": self.cost,
+            "maximum": getattr(settings, "CRM_MAX_QUERY_COST", 10000),
+            "depth": self.depth,
+            "maxDepth": getattr(settings, "CRM_MAX_QUERY_DEPTH", 10),
+        }
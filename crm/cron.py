@@ -1,16 +1,29 @@
 import datetime
-import os
-from gql import gql, Client
-from gql.transport.requests import RequestsHTTPTransport
+
+from crm.inprocess import execute_graphql
+
+HEARTBEAT_QUERY = "query Heartbeat { __typename }"
+
+LOW_STOCK_MUTATION = """
+    mutation UpdateLowStock {
+      updateLowStockProducts {
+        updatedProducts {
+          name
+          stock
+        }
+        message
+      }
+    }
+"""
 
 
 def log_crm_heartbeat():
     """
-    Log a heartbeat to file and queries the GraphQL endpoint
+    Log a heartbeat to file and check the GraphQL schema answers
     """
 
     timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    log_message = f"[$TIMESTAMP] CRM is alive\n"
+    log_message = f"[{timestamp}] CRM is alive\n"
 
     # append the hearbeat message to log file
     log_file_path = "/tmp/crm_heartbeat_log.txt"
@@ -18,61 +31,35 @@ def log_crm_heartbeat():
     with open(log_file_path, "a") as log_file:
         log_file.write(log_message)
 
-    # verify the GraphQL endpoint is reachable
-    graphql_endpoint = "http://localhost:8000/graphql"
-    query = "{ hello }"
-
+    # run a query in-process rather than through the web server
     try:
-        transport = RequestsHTTPTransport(url=graphql_endpoint)
-        client = Client(transport=transport, fetch_schema_from_transport=True)
-        response = client.execute(graphql_endpoint, json={"query": query})
-        response.raise_for_status()  # raise http error for bad requests
-        data = response.json().get("data", {})
-        print("GraphQL endpoint is reachable and healthy")
+        execute_graphql(HEARTBEAT_QUERY)
+        print("GraphQL schema is reachable and healthy")
     except Exception as e:
-        print(f"Error querying GraphQL endpoint failed: {e}")
+        print(f"Error querying GraphQL schema: {e}")
 
 
 def update_low_stock():
     """
-    Executes a GraphQL mutation to update low-stock products.
+    Executes the updateLowStockProducts mutation in-process and logs the
+    restocked products.
     """
-    graphql_endpoint = "http://localhost:8000/graphql"
-    mutation_query = """
-        mutation {
-          updateLowStockProducts {
-            updatedProducts {
-              name
-              stock
-            }
-            message
-          }
-        }
-    """
-
     try:
-        transport = RequestsHTTPTransport(url=graphql_endpoint)
-        client = Client(transport=transport, fetch_schema_from_transport=True)
-        response = client.execute(graphql_endpoint, json={"query": mutation_query})
-        response.raise_for_status()
-        data = response.json().get("data", {})
-
-        if "updateLowStockProducts" in data:
-            result = data["updateLowStockProducts"]
-            updated_products = result.get("updatedProducts", [])
-            message = result.get("message", "No message received.")
+        result = execute_graphql(LOW_STOCK_MUTATION)["updateLowStockProducts"]
+    except Exception as e:
+        print(f"Failed to update low-stock products: {e}")
+        return
 
-            log_file_path = "/tmp/low_stock_updates_log.txt"
-            with open(log_file_path, "a") as f:
-                f.write(f"\n--- Stock Update at {datetime.datetime.now()} ---\n")
-                f.write(f"{message}\n")
-                for product in updated_products:
-                    f.write(
-                        f"Updated product: {product['name']}, New stock: {product['stock']}\n"
-                    )
+    updated_products = result.get("updatedProducts", [])
+    message = result.get("message", "No message received.")
 
-        print(f"Low stock update processed. Message: {message}")
+    log_file_path = "/tmp/low_stock_updates_log.txt"
+    with open(log_file_path, "a") as f:
+        f.write(f"\n--- Stock Update at {datetime.datetime.now()} ---\n")
+        f.write(f"{message}\n")
+        for product in updated_products:
+            f.write(
+                f"Updated product: {product['name']}, New stock: {product['stock']}\n"
+            )
 
-    except Exception as e:
-        print(f"Failed to connect to GraphQL endpoint: {e}")
-        print(f"An unexpected error occurred: {e}")
+    print(f"Low stock update processed. Message: {message}")
@@ -1,22 +1,14 @@
 #!/bin/bash
 
 # navigate to project root
-cd ../..
+cd "$(dirname "$0")/../.."
 
 # set timestamp
-TIMESTAMP=$(date + "%Y-%m-%d %H:%M:%S")
+TIMESTAMP=$(date +"%Y-%m-%d %H:%M:%S")
 
-DELETED_COUNT=$(./manage.py shell -c "
-from django.utils import timezone 
-from datetime import timedelta
-from crm.models import Customer, Order
-
-one_year_ago = timezone.now() - timedelta(days=365)
-inactive_customers = Customer.objects.exclude(order__order__date__gte=one_year_ago).distinct()
-deleted_count, _ = inactive_customers.delete()
-
-print(f"Successfully deleted {deleted_count} inactive customers.")
-")
+# deletes in batches of 1000 customers, one transaction each, and prints
+# a JSON summary (add --dry-run to only count them)
+SUMMARY=$(python3 manage.py clean_inactive_customers --days 365 --batch-size 1000 2>&1)
 
 #log result 
-echo "[$TIMESTAMP] total deleted $DELETED_COUNT accounts" >> /tmp/customer_cleanup_log.txt
\ No newline at end of file
+echo "[$TIMESTAMP] $SUMMARY" >> /tmp/customer_cleanup_log.txt
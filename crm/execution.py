@@ -0,0 +1,64 @@
+"""
+This file contains the GraphQL execution helpers for the async view.
+
+The resolvers and loaders are synchronous and use the ORM directly, so the
+async path keeps them and moves whole top-level fields onto a bounded pool
+of worker threads instead: each root field, with everything nested under
+it, is resolved and completed on one thread, and independent root fields
+of a query run concurrently.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from graphql.execution import ExecutionContext
+
+_executor = None
+
+
+def get_executor():
+    """
+    The shared worker pool, sized by CRM_ASYNC_MAX_THREADS
+    """
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, "CRM_ASYNC_MAX_THREADS", 16),
+            thread_name_prefix="crm-graphql",
+        )
+    return _executor
+
+
+def run_with_connection(fn, *args):
+    """
+    Run fn on a worker thread, keeping the thread's connections open.
+
+    The pool is bounded, so its threads hold at most CRM_ASYNC_MAX_THREADS
+    connections between requests instead of reconnecting for every field;
+    a connection is only dropped once it errored and is no longer usable.
+    """
+    try:
+        return fn(*args)
+    finally:
+        for conn in connections.all(initialized_only=True):
+            if conn.connection is not None and conn.errors_occurred:
+                if conn.is_usable():
+                    conn.errors_occurred = False
+                else:
+                    conn.close()
+
+
+class ThreadedExecutionContext(ExecutionContext):
+    """
+    Resolve each top-level field on a worker thread, returning awaitables
+    that graphql-core gathers for queries and awaits in order for mutations
+    """
+
+    def execute_field(self, parent_type, source, field_nodes, path):
+        if path.prev is not None:
+            return super().execute_field(parent_type, source, field_nodes, path)
+        return sync_to_async(run_with_connection, thread_sensitive=False, executor=get_executor())(
+            super().execute_field, parent_type, source, field_nodes, path
+        )
@@ -0,0 +1,147 @@
+"""
+This file contains the streaming order and customer exports.
+
+Rows are read with ``QuerySet.iterator(chunk_size=...)`` (a server-side
+cursor on PostgreSQL) and written out one at a time, so memory use does
+not grow with the size of the export. Order product IDs are fetched with
+one query per chunk of orders.
+"""
+
+import csv
+import json
+from itertools import islice
+
+from django.conf import settings
+from graphene.utils.str_converters import to_snake_case
+
+from .filters import CustomerFilter, OrderFilter
+from .models import Customer, Order
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def export_chunk_size():
+    return getattr(settings, "CRM_EXPORT_CHUNK_SIZE", 2000)
+
+
+def filter_data(params):
+    """
+    Filter arguments from the query string, accepting both the FilterSet
+    names (order_date_after) and their GraphQL spelling (orderDateAfter)
+    """
+    return {to_snake_case(key): value for key, value in params.items() if key != "format"}
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def ordered(queryset):
+    # Keep an explicit ordering (search rank); otherwise export by id
+    return queryset if queryset.query.order_by else queryset.order_by("pk")
+
+
+def order_rows(queryset, chunk_size=None):
+    """
+    Yield one dict per order with its customer email, product IDs and the
+    quantity of each
+    """
+    chunk_size = chunk_size or export_chunk_size()
+    rows = ordered(queryset).values_list("pk", "customer__email", "total_amount", "order_date")
+    through = Order.products.through.objects
+    for chunk in chunked(rows.iterator(chunk_size=chunk_size), chunk_size):
+        product_ids = {}
+        quantities = {}
+        links = (
+            through.filter(order_id__in=[row[0] for row in chunk])
+            .order_by("order_id", "product_id")
+            .values_list("order_id", "product_id", "quantity")
+        )
+        for order_id, product_id, quantity in links:
+            product_ids.setdefault(order_id, []).append(product_id)
+            quantities.setdefault(order_id, []).append(quantity)
+        for pk, email, total_amount, order_date in chunk:
+            yield {
+                "id": pk,
+                "customer_email": email,
+                "total_amount": str(total_amount),
+                "order_date": order_date.isoformat(),
+                "product_ids": product_ids.get(pk, []),
+                "quantities": quantities.get(pk, []),
+            }
+
+
+def customer_rows(queryset, chunk_size=None):
+    """
+    Yield one dict per customer
+    """
+    chunk_size = chunk_size or export_chunk_size()
+    rows = ordered(queryset).values_list("pk", "name", "email", "phone", "created_at")
+    for pk, name, email, phone, created_at in rows.iterator(chunk_size=chunk_size):
+        yield {
+            "id": pk,
+            "name": name,
+            "email": email,
+            "phone": phone,
+            "created_at": created_at.isoformat(),
+        }
+
+
+class Echo:
+    """
+    A file-like object that hands back what csv.writer writes to it
+    """
+
+    def write(self, value):
+        return value
+
+
+def render_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row) + "\n"
+
+
+def render_csv(rows, columns):
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(
+            " ".join(str(item) for item in value) if isinstance(value, list) else value
+            for value in (row[column] for column in columns)
+        )
+
+
+ORDER_COLUMNS = ["id", "customer_email", "total_amount", "order_date", "product_ids", "quantities"]
+CUSTOMER_COLUMNS = ["id", "name", "email", "phone", "created_at"]
+
+EXPORTS = {
+    "orders": (OrderFilter, Order, order_rows, ORDER_COLUMNS),
+    "customers": (CustomerFilter, Customer, customer_rows, CUSTOMER_COLUMNS),
+}
+
+
+def render_export(name, fmt, params):
+    """
+    Filter and render an export; returns (chunks, None) or (None, errors)
+    """
+    filterset_class, model, rows_fn, columns = EXPORTS[name]
+    data = filter_data(params)
+    filterset = filterset_class(data=data, queryset=model.objects.all())
+    if not filterset.is_valid():
+        return None, filterset.errors
+    queryset = filterset.qs
+    if data.get("product_name"):
+        # The products join repeats an order once per matching product
+        queryset = queryset.distinct()
+    rows = rows_fn(queryset)
+    if fmt == "csv":
+        return render_csv(rows, columns), None
+    return render_ndjson(rows), None
@@ -0,0 +1,223 @@
+"""
+This file contains the custom connection fields for the CRM API.
+"""
+
+import base64
+import json
+from functools import partial
+
+import graphene
+from django.db.models import Q
+from django_filters import OrderingFilter
+from graphene.relay import PageInfo
+from graphene_django.filter import DjangoFilterConnectionField
+from graphene_django.utils import maybe_queryset
+
+from .optimizer import optimize_queryset
+
+
+class CountableConnection(graphene.relay.Connection):
+    """
+    A connection with a totalCount that is only computed when selected
+    """
+
+    class Meta:
+        abstract = True
+
+    total_count = graphene.Int()
+
+    def resolve_total_count(self, info):
+        if getattr(self, "length", None) is None:
+            self.length = self.iterable.count()
+        return self.length
+
+
+class BatchedFilterConnectionField(DjangoFilterConnectionField):
+    """
+    A filter connection field that feeds its page into the request loaders.
+
+    Once a page has been sliced, the node type's ``enqueue_loaders`` hook
+    (if any) is called with the nodes so that their related objects are
+    fetched in one batch instead of once per edge. Before slicing, the
+    filtered queryset is narrowed to the joins and columns the selection
+    set asks for. Resolvers may also return a list that has already been
+    batched, in which case filtering is skipped.
+    """
+
+    @classmethod
+    def resolve_queryset(
+        cls, connection, iterable, info, args, filtering_args, filterset_class
+    ):
+        if isinstance(iterable, list):
+            return iterable
+        queryset = super().resolve_queryset(
+            connection, iterable, info, args, filtering_args, filterset_class
+        )
+        return optimize_queryset(queryset, info)
+
+    @classmethod
+    def connection_resolver(cls, resolver, connection, default_manager,
+                            queryset_resolver, max_limit, enforce_first_or_last,
+                            root, info, **args):
+        result = super().connection_resolver(
+            resolver, connection, default_manager, queryset_resolver,
+            max_limit, enforce_first_or_last, root, info, **args
+        )
+        cls.enqueue_page(connection, info, result)
+        return result
+
+    @staticmethod
+    def enqueue_page(connection, info, result):
+        enqueue_loaders = getattr(connection._meta.node, "enqueue_loaders", None)
+        if enqueue_loaders is not None:
+            enqueue_loaders(info, [edge.node for edge in result.edges])
+
+
+def encode_keyset_cursor(values):
+    """
+    Encode the sort key of a row as an opaque cursor
+    """
+    payload = json.dumps([str(value) for value in values])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_keyset_cursor(cursor, fields):
+    """
+    Decode a cursor back into sort key values of the right python types
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        assert len(values) == len(fields)
+        return [field.to_python(value) for field, value in zip(fields, values)]
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+
+class KeysetFilterConnectionField(BatchedFilterConnectionField):
+    """
+    A filter connection paginated by a unique sort key instead of an offset.
+
+    Rows are ordered by ``keyset`` (which must end in a unique column) and
+    cursors carry the sort key of the row they point at, so ``after`` and
+    ``before`` become ``WHERE (a, b) > (x, y)`` range conditions. Every
+    page costs the same regardless of depth, and no ``COUNT(*)`` is run
+    unless the client selects ``totalCount``.
+
+    The keyset is also the only order: the filterset's ordering filters
+    are not offered as arguments, and the other filters (``search``
+    included) restrict the rows without reordering them.
+    """
+
+    def __init__(self, type_, keyset=("id",), *args, **kwargs):
+        self.keyset = tuple(keyset)
+        kwargs.setdefault(
+            "description",
+            f"Ordered by {', '.join(self.keyset)}; filters such as search restrict "
+            "the results without reordering them.",
+        )
+        super().__init__(type_, *args, **kwargs)
+        # offset has no meaning without offset-based cursors
+        self._base_args.pop("offset", None)
+
+    @property
+    def filtering_args(self):
+        filters = self.filterset_class.base_filters
+        return {
+            name: argument for name, argument in super().filtering_args.items()
+            if not isinstance(filters.get(name), OrderingFilter)
+        }
+
+    def wrap_resolve(self, parent_resolver):
+        return partial(
+            self.keyset_connection_resolver,
+            self.resolver or parent_resolver,
+            self.connection_type,
+            self.get_manager(),
+            self.get_queryset_resolver(),
+            self.max_limit,
+            self.keyset,
+        )
+
+    @staticmethod
+    def keyset_condition(keyset, values, lookup):
+        """
+        Build (k1, k2, ...) > (v1, v2, ...) (or <) from single-column lookups
+        """
+        condition = Q()
+        for index, name in enumerate(keyset):
+            equal = dict(zip(keyset[:index], values[:index]))
+            condition |= Q(**equal, **{f"{name}__{lookup}": values[index]})
+        return condition
+
+    @classmethod
+    def keyset_connection_resolver(cls, resolver, connection, default_manager,
+                                   queryset_resolver, max_limit, keyset,
+                                   root, info, **args):
+        first = args.get("first")
+        last = args.get("last")
+        after = args.get("after")
+        before = args.get("before")
+
+        for name, value in (("first", first), ("last", last)):
+            # Same error as the offset connections; a negative slice would fail in the ORM
+            if value is not None and value < 0:
+                raise ValueError(f"Argument '{name}' must be a non-negative integer.")
+            if value is not None and max_limit:
+                assert value <= max_limit, (
+                    "Requesting {} records on the `{}` connection exceeds the `{}` limit of {} records."
+                ).format(value, info.field_name, name, max_limit)
+        if first is None and last is None:
+            first = max_limit or 100
+
+        iterable = resolver(root, info, **args)
+        if iterable is None:
+            iterable = default_manager
+        queryset = maybe_queryset(queryset_resolver(connection, iterable, info, args))
+
+        # Make sure the sort key is loaded even when the optimizer pruned columns
+        loaded, deferred = queryset.query.deferred_loading
+        if loaded and not deferred:
+            queryset = queryset.only(*loaded, *keyset)
+
+        model = queryset.model
+        fields = [model._meta.get_field(name) for name in keyset]
+        attnames = [field.attname for field in fields]
+        page = queryset
+        if after:
+            page = page.filter(cls.keyset_condition(keyset, decode_keyset_cursor(after, fields), "gt"))
+        if before:
+            page = page.filter(cls.keyset_condition(keyset, decode_keyset_cursor(before, fields), "lt"))
+
+        if last is not None and first is None:
+            rows = list(page.order_by(*(f"-{name}" for name in keyset))[:last + 1])
+            has_more = len(rows) > last
+            nodes = rows[:last][::-1]
+            has_next_page, has_previous_page = bool(before), has_more
+        else:
+            rows = list(page.order_by(*keyset)[:first + 1])
+            has_more = len(rows) > first
+            nodes = rows[:first]
+            if last is not None:
+                nodes = nodes[-last:]
+            has_next_page, has_previous_page = has_more, bool(after)
+
+        edges = [
+            connection.Edge(
+                node=node,
+                cursor=encode_keyset_cursor(getattr(node, attname) for attname in attnames),
+            )
+            for node in nodes
+        ]
+        result = connection(
+            edges=edges,
+            page_info=PageInfo(
+                start_cursor=edges[0].cursor if edges else None,
+                end_cursor=edges[-1].cursor if edges else None,
+                has_previous_page=has_previous_page,
+                has_next_page=has_next_page,
+            ),
+        )
+        result.iterable = queryset
+        result.length = None
+        cls.enqueue_page(connection, info, result)
+        return result
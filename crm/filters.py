@@ -1,32 +1,130 @@
 import django_filters
-from .models import Customer, Product, Order
+from django_filters.constants import EMPTY_VALUES
+from django.db import connection
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+
+from .models import Customer, Product, Order, LOW_STOCK_THRESHOLD
+from .search import contains_q, search_queryset
+
+
+class ContainsFilter(django_filters.CharFilter):
+    """
+    Case-insensitive substring filter served by the search index
+    """
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        qs = qs.filter(contains_q(qs.model, self.field_name, value))
+        return qs.distinct() if self.distinct else qs
+
+
+class StableOrderingFilter(django_filters.OrderingFilter):
+    """
+    OrderingFilter that breaks ties on id in the direction of the last key,
+    so the ordering is total and matches the (column, id) indexes
+    """
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        ordering = [self.get_ordering_value(param) for param in value]
+        tiebreak = '-id' if ordering[-1].startswith('-') else 'id'
+        return qs.order_by(*ordering, tiebreak)
+
 
 class CustomerFilter(django_filters.FilterSet):
-    name = django_filters.CharFilter(lookup_expr='icontains')
-    email = django_filters.CharFilter(lookup_expr='icontains')
+    name = ContainsFilter()
+    email = ContainsFilter()
     phone = django_filters.CharFilter(lookup_expr='icontains')
 
     created_at = django_filters.DateFromToRangeFilter()
-    phone_pattern = django_filters.CharFilter(field_name='phone', lookup_expr='startswith')
+    phone_pattern = django_filters.CharFilter(field_name='phone', method='filter_phone_prefix')
+    search = django_filters.CharFilter(method='filter_search')
+
+    # Order statistics, as separate bounds so each is a GraphQL argument
+    # (orderCountMin, lifetimeValueMax, lastOrderDateBefore, ...)
+    order_count_min = django_filters.NumberFilter(field_name='order_count', lookup_expr='gte')
+    order_count_max = django_filters.NumberFilter(field_name='order_count', lookup_expr='lte')
+    lifetime_value_min = django_filters.NumberFilter(field_name='lifetime_value', lookup_expr='gte')
+    lifetime_value_max = django_filters.NumberFilter(field_name='lifetime_value', lookup_expr='lte')
+    last_order_date_after = django_filters.DateFilter(field_name='last_order_date', lookup_expr='gte')
+    last_order_date_before = django_filters.DateFilter(field_name='last_order_date', lookup_expr='lte')
+    order_by = StableOrderingFilter(
+        fields=('lifetime_value', 'order_count', 'last_order_date', 'created_at', 'name')
+    )
 
     class Meta:
         model = Customer
-        fields = ['name', 'email', 'phone', 'phone_pattern', 'created_at']
+        fields = [
+            'name', 'email', 'phone', 'phone_pattern', 'created_at', 'search',
+            'order_count_min', 'order_count_max', 'lifetime_value_min',
+            'lifetime_value_max', 'last_order_date_after', 'last_order_date_before',
+        ]
+
+    def filter_search(self, queryset, name, value):
+        """
+        Match every word against name and email, best matches first
+        """
+        return search_queryset(queryset, value)
+
+    def filter_phone_prefix(self, queryset, name, value):
+        """
+        startswith, plus an equivalent range so the phone index can be used
+        (LIKE 'x%' cannot use a plain index on SQLite)
+        """
+        if not value:
+            return queryset
+        upper = value[:-1] + chr(ord(value[-1]) + 1)
+        return queryset.filter(
+            **{f'{name}__gte': value, f'{name}__lt': upper, f'{name}__startswith': value}
+        )
 
 class ProductFilter(django_filters.FilterSet):
-    name = django_filters.CharFilter(lookup_expr='icontains')
+    name = ContainsFilter()
     price = django_filters.RangeFilter()
     stock = django_filters.RangeFilter()
 
-    low_stock = django_filters.NumberFilter(field_name='stock', lookup_expr='lt')
+    low_stock = django_filters.NumberFilter(field_name='stock', method='filter_low_stock')
+    search = django_filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Product
-        fields = ['name', 'price', 'stock', 'low_stock']
+        fields = ['name', 'price', 'stock', 'low_stock', 'search']
+
+    def filter_search(self, queryset, name, value):
+        """
+        Match every word against the product name, best matches first
+        """
+        return search_queryset(queryset, value)
+
+    def filter_low_stock(self, queryset, name, value):
+        """
+        stock < value. When value is within the partial index predicate, the
+        predicate is repeated as a literal so the planner can prove the
+        partial index applies (it cannot from a bound parameter).
+        """
+        queryset = queryset.filter(**{f'{name}__lt': value})
+        if value <= LOW_STOCK_THRESHOLD:
+            queryset = queryset.filter(low_stock_predicate())
+        return queryset
+
+
+def low_stock_predicate():
+    """
+    The literal WHERE clause of crm_product_low_stock_idx
+    """
+    qn = connection.ops.quote_name
+    return RawSQL(
+        f'{qn(Product._meta.db_table)}.{qn("stock")} < {int(LOW_STOCK_THRESHOLD)}',
+        (),
+        output_field=BooleanField(),
+    )
 
 class OrderFilter(django_filters.FilterSet):
-    customer_name = django_filters.CharFilter(field_name='customer__name', lookup_expr='icontains')
-    product_name = django_filters.CharFilter(field_name='products__name', lookup_expr='icontains')
+    customer_name = ContainsFilter(field_name='customer__name')
+    product_name = ContainsFilter(field_name='products__name')
 
     order_date = django_filters.DateFromToRangeFilter()
     total_amount = django_filters.RangeFilter()
@@ -0,0 +1,242 @@
+"""
+This file contains the per-operation resolver and SQL instrumentation.
+
+When instrumentation is active for a request, ``InstrumentationMiddleware``
+times every resolver by schema field (``Type.field``) and an
+``OperationRecorder`` installed as a database execute wrapper records
+every SQL statement. The totals are folded into a process-wide
+``MetricsRegistry`` (served as Prometheus text at ``/metrics``) and, when
+a staff user (or anyone under ``DEBUG``) sent the debug header, returned
+in the response's ``extensions``.
+
+Metric labels never carry client-chosen text as is: resolvers are
+labelled by schema field, not by the aliased path, and operation names
+by the first ``CRM_METRICS_MAX_OPERATIONS`` distinct ones seen, anything
+else counting as ``other``.
+
+Nothing is installed for requests that are not instrumented, so the cost
+when disabled is one settings lookup per request.
+"""
+
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection
+
+# Literals collapsed when grouping statements by shape
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\bIN \((?:\s*(?:%s|\?|\$\d+)\s*,?)+\)", re.IGNORECASE)
+# A GraphQL name of reasonable length
+_OPERATION_NAME = re.compile(r"[_A-Za-z][_0-9A-Za-z]{0,63}")
+
+
+def sql_shape(sql):
+    """
+    Reduce a statement to its shape by dropping literals and IN list lengths
+    """
+    sql = _STRING_LITERAL.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    return _IN_LIST.sub("IN (...)", sql)
+
+
+def debug_header_requested(request):
+    """
+    Whether the request asked for the debug report and may have it: staff
+    only, unless DEBUG is on
+    """
+    header = getattr(settings, "CRM_DEBUG_HEADER", "X-CRM-Debug")
+    if not (header and request is not None and request.headers.get(header)):
+        return False
+    if settings.DEBUG:
+        return True
+    user = getattr(request, "user", None)
+    return bool(user is not None and user.is_active and user.is_staff)
+
+
+def instrumentation_requested(request):
+    """
+    Whether the current request should be instrumented
+    """
+    return (
+        getattr(settings, "CRM_INSTRUMENTATION_ENABLED", False)
+        or debug_header_requested(request)
+    )
+
+
+def resolver_field(info):
+    # The schema coordinate, not the path: aliases are chosen by the client
+    return f"{info.parent_type.name}.{info.field_name}"
+
+
+class InstrumentationMiddleware:
+    """
+    Graphene middleware timing each resolver by its schema field
+    """
+
+    def __init__(self, recorder):
+        self.recorder = recorder
+
+    def resolve(self, next, root, info, **args):
+        if self.recorder.operation_name is None and info.operation.name is not None:
+            self.recorder.operation_name = info.operation.name.value
+        start = time.perf_counter()
+        try:
+            return next(root, info, **args)
+        finally:
+            self.recorder.record_resolver(resolver_field(info), time.perf_counter() - start)
+
+
+class OperationRecorder:
+    """
+    Collect resolver timings and SQL statements for a single operation
+    """
+
+    def __init__(self, operation_name=None):
+        self.operation_name = operation_name
+        self.resolvers = defaultdict(lambda: [0, 0.0])
+        self.queries = []
+        self.started = None
+        self.duration = 0.0
+        self._wrapper = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+        self.duration = time.perf_counter() - self.started
+        METRICS.observe(self)
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - start))
+
+    @property
+    def operation_label(self):
+        return self.operation_name or "anonymous"
+
+    def record_resolver(self, field, duration):
+        entry = self.resolvers[field]
+        entry[0] += 1
+        entry[1] += duration
+
+    def middleware(self):
+        return InstrumentationMiddleware(self)
+
+    @property
+    def sql_time(self):
+        return sum(duration for _, duration in self.queries)
+
+    def repeated_shapes(self):
+        """
+        SQL shapes run more than CRM_NPLUSONE_THRESHOLD times: likely N+1s
+        """
+        threshold = getattr(settings, "CRM_NPLUSONE_THRESHOLD", 10)
+        shapes = Counter(sql_shape(sql) for sql, _ in self.queries)
+        return [(shape, count) for shape, count in shapes.most_common() if count > threshold]
+
+    def as_extensions(self):
+        return {
+            "operation": self.operation_label,
+            "durationMs": round(self.duration * 1000, 3),
+            "sql": {
+                "count": len(self.queries),
+                "durationMs": round(self.sql_time * 1000, 3),
+            },
+            "resolvers": {
+                field: {"calls": calls, "durationMs": round(duration * 1000, 3)}
+                for field, (calls, duration) in sorted(self.resolvers.items())
+            },
+            "nPlusOne": [
+                {"shape": shape, "count": count} for shape, count in self.repeated_shapes()
+            ],
+        }
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """
+    Process-wide counters rendered in the Prometheus text format
+    """
+
+    HELP = {
+        "crm_graphql_operations_total": ("counter", "GraphQL operations executed"),
+        "crm_graphql_operation_seconds_total": ("counter", "Wall time spent executing operations"),
+        "crm_graphql_sql_queries_total": ("counter", "SQL statements run by operations"),
+        "crm_graphql_sql_seconds_total": ("counter", "Time spent in SQL by operations"),
+        "crm_graphql_nplusone_total": ("counter", "Operations with a repeated SQL shape"),
+        "crm_graphql_resolver_calls_total": ("counter", "Resolver calls by schema field"),
+        "crm_graphql_resolver_seconds_total": ("counter", "Resolver wall time by schema field"),
+        "crm_graphql_document_cache_total": ("counter", "Parsed document cache lookups by result"),
+        "crm_graphql_response_cache_total": ("counter", "Response cache lookups by result"),
+    }
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = defaultdict(float)
+        self._operations = set()
+
+    def _operation_label(self, name):
+        # Called with the lock held
+        if name in self._operations:
+            return name
+        limit = getattr(settings, "CRM_METRICS_MAX_OPERATIONS", 200)
+        if _OPERATION_NAME.fullmatch(name) is None or len(self._operations) >= limit:
+            return "other"
+        self._operations.add(name)
+        return name
+
+    def _add(self, name, labels, value):
+        self._values[(name, tuple(sorted(labels.items())))] += value
+
+    def increment(self, name, labels, value=1):
+        with self._lock:
+            self._add(name, labels, value)
+
+    def observe(self, recorder):
+        with self._lock:
+            operation = {"operation": self._operation_label(recorder.operation_label)}
+            self._add("crm_graphql_operations_total", operation, 1)
+            self._add("crm_graphql_operation_seconds_total", operation, recorder.duration)
+            self._add("crm_graphql_sql_queries_total", operation, len(recorder.queries))
+            self._add("crm_graphql_sql_seconds_total", operation, recorder.sql_time)
+            if recorder.repeated_shapes():
+                self._add("crm_graphql_nplusone_total", operation, 1)
+            for field, (calls, duration) in recorder.resolvers.items():
+                self._add("crm_graphql_resolver_calls_total", {"field": field}, calls)
+                self._add("crm_graphql_resolver_seconds_total", {"field": field}, duration)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+            self._operations.clear()
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = []
+        for name, (kind, description) in self.HELP.items():
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (metric, labels), value in values:
+                if metric != name:
+                    continue
+                label_text = ",".join(f'{key}="{_escape_label(val)}"' for key, val in labels)
+                lines.append(f"{name}{{{label_text}}} {value!r}")
+        return "\n".join(lines) + "\n"
+
+
+METRICS = MetricsRegistry()
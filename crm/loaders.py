@@ -0,0 +1,148 @@
+"""
+This file contains the request-scoped data loaders for the CRM API.
+"""
+
+import threading
+
+from .models import Customer, Order, OrderItem
+
+
+class DataLoader:
+    """
+    Batch and cache lookups by key for the lifetime of one request.
+
+    Keys can be queued ahead of time with ``enqueue``; the first ``load``
+    that misses the cache resolves every queued key with a single call
+    to ``batch_load_fn``, which must return a mapping of key to value.
+    """
+
+    def __init__(self, batch_load_fn, default=None):
+        self.batch_load_fn = batch_load_fn
+        self.default = default
+        self._cache = {}
+        self._queue = set()
+
+    def enqueue(self, keys):
+        """
+        Queue keys to be fetched by the next dispatch
+        """
+        self._queue.update(key for key in keys if key not in self._cache)
+
+    def load(self, key):
+        """
+        Return the value for key, dispatching the queue on a cache miss
+        """
+        if key not in self._cache:
+            self._queue.add(key)
+            self.dispatch()
+        return self._cache[key]
+
+    def load_many(self, keys):
+        """
+        Return the values for keys, in order
+        """
+        keys = list(keys)
+        self.enqueue(keys)
+        return [self.load(key) for key in keys]
+
+    def prime(self, key, value):
+        """
+        Store a value that is already known without hitting the database
+        """
+        self._cache.setdefault(key, value)
+        self._queue.discard(key)
+
+    def clear(self, key):
+        """
+        Drop a cached value so the next load fetches it again
+        """
+        self._cache.pop(key, None)
+
+    def dispatch(self):
+        """
+        Resolve every queued key with one batch call
+        """
+        if not self._queue:
+            return
+        keys = list(self._queue)
+        self._queue.clear()
+        results = self.batch_load_fn(keys)
+        for key in keys:
+            value = results.get(key)
+            if value is None:
+                value = self.default() if callable(self.default) else self.default
+            self._cache[key] = value
+
+
+def load_customers(customer_ids):
+    """
+    Fetch customers by id
+    """
+    return Customer.objects.in_bulk(customer_ids)
+
+
+def load_products_by_order(order_ids):
+    """
+    Fetch the products of each order with one query on the through table
+    """
+    products = {order_id: [] for order_id in order_ids}
+    links = (
+        Order.products.through.objects
+        .filter(order_id__in=order_ids)
+        .select_related("product")
+        .order_by("order_id", "product_id")
+    )
+    for link in links:
+        products[link.order_id].append(link.product)
+    return products
+
+
+def load_items_by_order(order_ids):
+    """
+    Fetch the lines of each order, with their products, in one query
+    """
+    items = {order_id: [] for order_id in order_ids}
+    lines = (
+        OrderItem.objects.filter(order_id__in=order_ids)
+        .select_related("product")
+        .order_by("order_id", "product_id")
+    )
+    for line in lines:
+        items[line.order_id].append(line)
+    return items
+
+
+class Loaders:
+    """
+    The set of loaders attached to a single request
+    """
+
+    def __init__(self):
+        self.customer = DataLoader(load_customers)
+        self.products_by_order = DataLoader(load_products_by_order, default=list)
+        self.items_by_order = DataLoader(load_items_by_order, default=list)
+
+
+class ThreadLocalLoaders(threading.local, Loaders):
+    """
+    Loaders with a separate set per thread, for executions that resolve
+    fields on several threads at once
+    """
+
+
+def get_loaders(info):
+    """
+    Return the loaders for the current request, creating them on first use
+    """
+    context = info.context
+    if context is None:
+        return Loaders()
+    if isinstance(context, dict):
+        if "loaders" not in context:
+            context["loaders"] = Loaders()
+        return context["loaders"]
+    loaders = getattr(context, "loaders", None)
+    if loaders is None:
+        loaders = Loaders()
+        context.loaders = loaders
+    return loaders
@@ -0,0 +1,36 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from crm.services import delete_inactive_customers
+
+
+class Command(BaseCommand):
+    help = "Delete customers without an order in the last N days, in batches, and print a JSON summary"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=365,
+            help="customers with no order in this many days are inactive (default 365)",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, default=None,
+            help="customers deleted per transaction (default CRM_BULK_CHUNK_SIZE)",
+        )
+        parser.add_argument(
+            "--pause", type=float, default=0.1,
+            help="seconds to sleep between batches (default 0.1)",
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true",
+            help="only count the inactive customers and their orders",
+        )
+
+    def handle(self, *args, **options):
+        summary = delete_inactive_customers(
+            days=options["days"],
+            batch_size=options["batch_size"],
+            pause=options["pause"],
+            dry_run=options["dry_run"],
+        )
+        self.stdout.write(json.dumps(summary, sort_keys=True))
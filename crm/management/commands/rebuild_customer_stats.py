@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from crm.stats import rebuild_customer_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute every customer's order count, lifetime value and last order date"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=None,
+            help="customers updated per statement (default CRM_BULK_CHUNK_SIZE)",
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        updated = rebuild_customer_stats(batch_size=options["batch_size"])
+        self.stdout.write(
+            f"Rebuilt order statistics for {updated} customers in {time.perf_counter() - start:.2f}s"
+        )
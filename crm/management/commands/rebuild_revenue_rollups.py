@@ -0,0 +1,38 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand
+
+from crm.rollups import history_bounds, rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the daily revenue rollups from the orders and customers tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--from", dest="date_from", type=datetime.date.fromisoformat, default=None,
+            help="first day to rebuild, YYYY-MM-DD (default the first day with data)",
+        )
+        parser.add_argument(
+            "--to", dest="date_to", type=datetime.date.fromisoformat, default=None,
+            help="last day to rebuild, YYYY-MM-DD (default the last day with data)",
+        )
+        parser.add_argument(
+            "--close", action="store_true",
+            help="mark every rebuilt day as closed",
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        bounds = history_bounds()
+        if bounds is None and not (options["date_from"] and options["date_to"]):
+            self.stdout.write("No orders or customers to roll up")
+            return
+        date_from = options["date_from"] or bounds[0]
+        date_to = options["date_to"] or bounds[1]
+        days = rebuild_rollups(date_from, date_to, close=options["close"])
+        self.stdout.write(
+            f"Rebuilt {days} revenue days from {date_from} to {date_to} "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from crm.seed import seed_crm
+
+
+class Command(BaseCommand):
+    help = "Generate synthetic customers, products and orders with bulk inserts"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--customers", type=int, default=1000)
+        parser.add_argument("--products", type=int, default=100)
+        parser.add_argument("--orders", type=int, default=10000)
+        parser.add_argument(
+            "--days", type=int, default=90, help="spread customers and orders over this many days"
+        )
+        parser.add_argument("--seed", type=int, default=0, help="random seed, for repeatable data")
+        parser.add_argument(
+            "--batch-size", type=int, default=None,
+            help="rows per insert (default CRM_BULK_CHUNK_SIZE)",
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        counts = seed_crm(
+            customers=options["customers"],
+            products=options["products"],
+            orders=options["orders"],
+            days=options["days"],
+            seed=options["seed"],
+            chunk_size=options["batch_size"],
+        )
+        created = ", ".join(f"{count} {name.replace('_', ' ')}" for name, count in counts.items())
+        self.stdout.write(f"Created {created} in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,30 @@
+from django.db import migrations
+
+from crm.search import create_search_index, drop_search_index
+
+# Frozen copy of crm.search.SEARCH_FIELDS at the time of this migration
+SEARCH_INDEXES = [
+    ("crm_customer", ("name", "email")),
+    ("crm_product", ("name",)),
+]
+
+
+def create_search_indexes(apps, schema_editor):
+    for table, columns in SEARCH_INDEXES:
+        create_search_index(schema_editor, table, columns)
+
+
+def drop_search_indexes(apps, schema_editor):
+    for table, columns in SEARCH_INDEXES:
+        drop_search_index(schema_editor, table, columns)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0003_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
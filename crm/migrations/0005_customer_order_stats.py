@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:26
+
+import decimal
+
+from django.db import migrations, models
+
+from crm.search import create_search_index, drop_search_index
+from crm.stats import rebuild_customer_stats
+
+# SQLite rebuilds crm_customer to add the NOT NULL columns, which drops the
+# search triggers, so the customer search index is recreated around it
+CUSTOMER_SEARCH = ("crm_customer", ("name", "email"))
+
+
+def drop_customer_search(apps, schema_editor):
+    drop_search_index(schema_editor, *CUSTOMER_SEARCH)
+
+
+def create_customer_search(apps, schema_editor):
+    create_search_index(schema_editor, *CUSTOMER_SEARCH)
+
+
+def backfill_stats(apps, schema_editor):
+    rebuild_customer_stats(
+        customer_model=apps.get_model("crm", "Customer"),
+        order_model=apps.get_model("crm", "Order"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0004_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_customer_search, create_customer_search),
+        migrations.AddField(
+            model_name='customer',
+            name='last_order_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='lifetime_value',
+            field=models.DecimalField(decimal_places=2, default=decimal.Decimal('0'), max_digits=12),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='order_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['lifetime_value', 'id'], name='crm_customer_ltv_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['order_count', 'id'], name='crm_customer_orders_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['last_order_date', 'id'], name='crm_customer_last_order_idx'),
+        ),
+        migrations.RunPython(create_customer_search, drop_customer_search),
+        migrations.RunPython(backfill_stats, migrations.RunPython.noop),
+    ]
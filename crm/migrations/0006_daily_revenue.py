@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:31
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from crm.rollups import history_bounds, rebuild_rollups
+
+
+def backfill_rollups(apps, schema_editor):
+    Order = apps.get_model("crm", "Order")
+    Customer = apps.get_model("crm", "Customer")
+    bounds = history_bounds(order_model=Order, customer_model=Customer)
+    if bounds is not None:
+        rebuild_rollups(
+            *bounds,
+            order_model=Order,
+            customer_model=Customer,
+            revenue_model=apps.get_model("crm", "DailyRevenue"),
+            sales_model=apps.get_model("crm", "DailyProductSales"),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0005_customer_order_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRevenue',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('order_count', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('new_customers', models.PositiveIntegerField(default=0)),
+                ('closed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='crm.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('date', 'product'), name='crm_product_sales_day_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
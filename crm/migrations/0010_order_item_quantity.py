@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:01
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+# Lines filled per UPDATE; the migration is not atomic, so each batch
+# commits on its own and a rerun skips the lines already filled
+BATCH_SIZE = 5000
+
+
+def fill_lines(apps, schema_editor):
+    """
+    Give every existing line one unit and, where no snapshot was taken,
+    the product's current price
+    """
+    OrderItem = apps.get_model("crm", "OrderItem")
+    Product = apps.get_model("crm", "Product")
+    price = Subquery(Product.objects.filter(pk=OuterRef("product_id")).values("price")[:1])
+    ids = OrderItem.objects.order_by("pk").values_list("pk", flat=True)
+    last = 0
+    while True:
+        batch = list(ids.filter(pk__gt=last)[:BATCH_SIZE])
+        if not batch:
+            break
+        lines = OrderItem.objects.filter(pk__range=(batch[0], batch[-1]))
+        lines.filter(quantity__isnull=True).update(quantity=1)
+        lines.filter(unit_price__isnull=True).update(unit_price=price)
+        last = batch[-1]
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('crm', '0009_order_item_price_snapshot'),
+    ]
+
+    operations = [
+        # Nullable first: a plain ADD COLUMN, filled below
+        migrations.AddField(
+            model_name='orderitem',
+            name='quantity',
+            field=models.PositiveIntegerField(null=True),
+        ),
+        migrations.RunPython(fill_lines, migrations.RunPython.noop),
+    ]
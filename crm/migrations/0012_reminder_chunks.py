@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0011_order_item_constraints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReminderChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_order_id', models.BigIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='crm.reminderrun')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('run', 'first_order_id'), name='crm_reminder_chunk_uniq')],
+            },
+        ),
+    ]
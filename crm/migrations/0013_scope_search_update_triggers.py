@@ -0,0 +1,36 @@
+from django.db import migrations
+
+from crm.search import create_update_trigger, search_table
+
+# Frozen copy of crm.search.SEARCH_FIELDS at the time of this migration
+SEARCH_INDEXES = [
+    ("crm_customer", ("name", "email")),
+    ("crm_product", ("name",)),
+]
+
+
+def scope_update_triggers(apps, schema_editor):
+    """
+    Recreate the search update triggers as AFTER UPDATE OF the indexed columns
+    """
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    qn = schema_editor.connection.ops.quote_name
+    tables = set(schema_editor.connection.introspection.table_names())
+    for table, columns in SEARCH_INDEXES:
+        # Not created where SQLite lacks the trigram tokenizer
+        if search_table(table) not in tables:
+            continue
+        schema_editor.execute(f"DROP TRIGGER IF EXISTS {qn(search_table(table) + '_au')}")
+        create_update_trigger(schema_editor, table, columns)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crm', '0012_reminder_chunks'),
+    ]
+
+    operations = [
+        migrations.RunPython(scope_update_triggers, migrations.RunPython.noop),
+    ]
@@ -1,3 +1,5 @@
+from decimal import Decimal
+
 from django.db import models
 from django.core.validators import RegexValidator
 
@@ -6,6 +8,10 @@ phone_regex = RegexValidator(
     regex=r'^\+?1?\d{9,15}$', 
     message="Phone number must be entered in the format: '+999999999'. Up to 15 digits allowed."
 )
+
+# Products below this stock level are restocked and covered by a partial index
+LOW_STOCK_THRESHOLD = 10
+
 class Customer(models.Model):
     name = models.CharField(max_length=100, null=False, blank=False)
     email = models.EmailField(unique=True, null=False, blank=False)
@@ -13,6 +19,28 @@ class Customer(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # Order aggregates, kept up to date by the order services (crm.stats)
+    order_count = models.PositiveIntegerField(default=0)
+    # A Decimal, not 0: an unsaved default is returned as is by createCustomer
+    lifetime_value = models.DecimalField(max_digits=12, decimal_places=2, default=Decimal("0"))
+    last_order_date = models.DateField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # created_at date ranges, paginated by id
+            models.Index(fields=["created_at", "id"], name="crm_customer_created_idx"),
+            # Top customers and inactivity sweeps, see CustomerFilter.order_by
+            models.Index(fields=["lifetime_value", "id"], name="crm_customer_ltv_idx"),
+            models.Index(fields=["order_count", "id"], name="crm_customer_orders_idx"),
+            models.Index(fields=["last_order_date", "id"], name="crm_customer_last_order_idx"),
+            # phone prefix lookups (phone_pattern), see CustomerFilter
+            models.Index(
+                fields=["phone"],
+                name="crm_customer_phone_idx",
+                opclasses=["varchar_pattern_ops"],
+            ),
+        ]
+
     def __str__(self):
         return self.name
     
@@ -23,17 +51,157 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["price", "id"], name="crm_product_price_idx"),
+            models.Index(fields=["stock", "id"], name="crm_product_stock_idx"),
+            # The restock sweep only ever looks at low-stock rows
+            models.Index(
+                fields=["stock"],
+                name="crm_product_low_stock_idx",
+                condition=models.Q(stock__lt=LOW_STOCK_THRESHOLD),
+            ),
+        ]
+
     def __str__(self):
         return self.name
     
 class Order(models.Model):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, null=False, blank=False)
-    products = models.ManyToManyField(Product)
+    products = models.ManyToManyField(Product, through="OrderItem")
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, null=False, blank=False)
     order_date = models.DateField(auto_now_add=True, null=False, blank=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # order_date ranges, paginated by id
+            models.Index(fields=["order_date", "id"], name="crm_order_date_idx"),
+            # Per-customer recency, e.g. the NOT EXISTS of inactive_customers
+            models.Index(fields=["customer", "order_date"], name="crm_order_customer_date_idx"),
+            models.Index(fields=["total_amount", "id"], name="crm_order_total_idx"),
+        ]
+
     def __str__(self):
         return f"{self.customer.name} - {self.created_at}"
-    
\ No newline at end of file
+
+
+class OrderItem(models.Model):
+    """
+    One product line of an order: how many units, at what price each
+    """
+
+    # The composite indexes below lead with each column, so the foreign
+    # keys need none of their own
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="items", db_index=False)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, db_index=False)
+    quantity = models.PositiveIntegerField(default=1)
+    # Price snapshot taken at checkout, so later price changes leave the
+    # order's lines as they were
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        # The table of the ManyToManyField this model replaced
+        db_table = "crm_order_products"
+        # Also the (order_id, product_id) index
+        unique_together = [("order", "product")]
+        indexes = [
+            models.Index(fields=["product", "order"], name="crm_orderitem_product_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.order_id} - {self.quantity} x {self.product_id} @ {self.unit_price}"
+    
+
+class DailyRevenue(models.Model):
+    """
+    Orders, revenue and new customers of one day (crm.rollups)
+    """
+
+    date = models.DateField(unique=True)
+    order_count = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    new_customers = models.PositiveIntegerField(default=0)
+    # Set once the day has been recomputed from the source tables
+    closed_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.date}: {self.order_count} orders, {self.revenue} revenue"
+
+
+class DailyProductSales(models.Model):
+    """
+    Units of one product sold on one day (crm.rollups)
+    """
+
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="daily_sales")
+    units = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            # Also serves date range scans
+            models.UniqueConstraint(fields=["date", "product"], name="crm_product_sales_day_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.date}: {self.units} x {self.product_id}"
+
+
+class ReminderRun(models.Model):
+    """
+    One day's run of the order reminder pipeline (crm.reminders)
+    """
+
+    run_date = models.DateField(unique=True)
+    window_start = models.DateField()
+    # Producer checkpoint: orders up to this id have been handed to workers
+    last_order_id = models.BigIntegerField(default=0)
+    chunks_dispatched = models.PositiveIntegerField(default=0)
+    chunks_done = models.PositiveIntegerField(default=0)
+    dispatch_complete = models.BooleanField(default=False)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Reminders {self.run_date}"
+
+
+class OrderReminder(models.Model):
+    """
+    The reminder sent to one email in a run, for its first order seen
+    """
+
+    run = models.ForeignKey(ReminderRun, on_delete=models.CASCADE, related_name="reminders")
+    email = models.EmailField()
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="+")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # One reminder per email and run, whichever chunk gets there first
+            models.UniqueConstraint(fields=["run", "email"], name="crm_reminder_run_email_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.email} ({self.run.run_date})"
+
+
+class ReminderChunk(models.Model):
+    """
+    A chunk of a run's orders whose reminders were sent and logged
+    """
+
+    run = models.ForeignKey(ReminderRun, on_delete=models.CASCADE, related_name="chunks")
+    first_order_id = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # Counted once towards ReminderRun.chunks_done, however often delivered
+            models.UniqueConstraint(fields=["run", "first_order_id"], name="crm_reminder_chunk_uniq"),
+        ]
+
+    def __str__(self):
+        return f"Chunk from order {self.first_order_id} ({self.run.run_date})"
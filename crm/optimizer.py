@@ -0,0 +1,140 @@
+"""
+This file contains the queryset optimizer for the CRM connection fields.
+
+It walks the GraphQL selection set of a connection and applies
+``select_related``, ``prefetch_related`` and ``only`` so that a page
+pulls exactly the rows and columns the client asked for.
+"""
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from graphene.utils.str_converters import to_snake_case
+from graphql.language import FieldNode, FragmentSpreadNode, InlineFragmentNode
+
+# Arguments that only page a nested connection and do not filter it
+PAGINATION_ARGUMENTS = {"first", "last", "before", "after", "offset"}
+
+
+def collect_selections(info, field_nodes):
+    """
+    Merge the sub-selections of field_nodes into a dict of name -> FieldNodes,
+    expanding fragments along the way
+    """
+    selections = {}
+
+    def collect(selection_set):
+        if selection_set is None:
+            return
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                selections.setdefault(selection.name.value, []).append(selection)
+            elif isinstance(selection, FragmentSpreadNode):
+                collect(info.fragments[selection.name.value].selection_set)
+            elif isinstance(selection, InlineFragmentNode):
+                collect(selection.selection_set)
+
+    for field_node in field_nodes:
+        collect(field_node.selection_set)
+    return selections
+
+
+def node_selections(info, field_nodes):
+    """
+    Return the selections made on the node of a connection field
+    """
+    edges = collect_selections(info, field_nodes).get("edges", [])
+    return collect_selections(info, collect_selections(info, edges).get("node", []))
+
+
+def is_connection(info, field_nodes):
+    return "edges" in collect_selections(info, field_nodes)
+
+
+def has_filter_arguments(field_nodes):
+    return any(
+        argument.name.value not in PAGINATION_ARGUMENTS
+        for field_node in field_nodes
+        for argument in field_node.arguments or ()
+    )
+
+
+def plan(info, model, selections, prefix=""):
+    """
+    Work out the only/select_related/prefetch_related arguments for a model.
+
+    Returns a tuple of (only, select_related, prefetch_related). ``only`` is
+    None when a selected field does not map onto a model field, because the
+    resolver behind it may need any column.
+    """
+    only = {prefix + model._meta.pk.attname}
+    select_related = []
+    prefetch_related = []
+
+    for name, field_nodes in selections.items():
+        if name.startswith("__"):
+            continue
+        try:
+            field = model._meta.get_field(to_snake_case(name))
+        except FieldDoesNotExist:
+            if name != "id":
+                only = None
+            continue
+
+        if field.many_to_many or field.one_to_many:
+            if has_filter_arguments(field_nodes):
+                continue
+            if is_connection(info, field_nodes):
+                nested = node_selections(info, field_nodes)
+            else:
+                nested = collect_selections(info, field_nodes)
+            related_only, related_select, related_prefetch = plan(
+                info, field.related_model, nested
+            )
+            if related_only is not None and field.one_to_many:
+                related_only.add(field.field.attname)
+            queryset = field.related_model._default_manager.all()
+            if related_only is not None:
+                queryset = queryset.only(*related_only)
+            if related_select:
+                queryset = queryset.select_related(*related_select)
+            if related_prefetch:
+                queryset = queryset.prefetch_related(*related_prefetch)
+            lookup = field.name if field.concrete else field.get_accessor_name()
+            prefetch_related.append(Prefetch(prefix + lookup, queryset=queryset))
+        elif field.is_relation and field.concrete:
+            if only is not None:
+                only.add(prefix + field.attname)
+            nested = collect_selections(info, field_nodes)
+            related_only, related_select, related_prefetch = plan(
+                info, field.related_model, nested, prefix=f"{prefix}{field.name}__"
+            )
+            select_related.append(prefix + field.name)
+            select_related.extend(related_select)
+            prefetch_related.extend(related_prefetch)
+            if only is not None and related_only is not None:
+                only.update(related_only)
+            else:
+                only = None
+        elif field.is_relation:
+            only = None
+        elif only is not None:
+            only.add(prefix + field.attname)
+
+    return only, select_related, prefetch_related
+
+
+def optimize_queryset(queryset, info):
+    """
+    Apply joins, prefetches and column pruning for the connection being resolved
+    """
+    selections = node_selections(info, info.field_nodes)
+    if not selections:
+        return queryset
+    only, select_related, prefetch_related = plan(info, queryset.model, selections)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+    if only is not None:
+        queryset = queryset.only(*only)
+    return queryset
@@ -0,0 +1,113 @@
+"""
+This file contains the persisted-query support for the GraphQL view.
+
+Documents are cached parsed and validated, keyed by the SHA-256 of their
+text, so a repeated operation skips both steps. Clients speaking Apollo's
+automatic persisted queries (APQ) protocol send only the hash in
+``extensions.persistedQuery``; on a miss they get ``PersistedQueryNotFound``
+and retry with the query text, which registers it.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from graphql.error import GraphQLError
+
+from .instrumentation import METRICS
+
+APQ_VERSION = 1
+
+
+def query_hash(query):
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+
+class PersistedQueryError(GraphQLError):
+    """
+    An APQ protocol error, reported with its code in the error's extensions
+    """
+
+    def __init__(self, message, code):
+        super().__init__(message, extensions={"code": code})
+
+
+def persisted_query_not_found():
+    return PersistedQueryError("PersistedQueryNotFound", "PERSISTED_QUERY_NOT_FOUND")
+
+
+def get_persisted_query(request, data):
+    """
+    The ``persistedQuery`` extension of a request, or None if it has none
+    """
+    extensions = request.GET.get("extensions") or data.get("extensions")
+    if isinstance(extensions, str):
+        try:
+            extensions = json.loads(extensions)
+        except ValueError:
+            raise PersistedQueryError("Extensions are invalid JSON.", "BAD_REQUEST")
+    if not isinstance(extensions, dict):
+        return None
+    persisted = extensions.get("persistedQuery")
+    if persisted is None:
+        return None
+    if not isinstance(persisted, dict) or persisted.get("version") != APQ_VERSION:
+        raise PersistedQueryError(
+            "Unsupported persisted query version.", "PERSISTED_QUERY_NOT_SUPPORTED"
+        )
+    if not isinstance(persisted.get("sha256Hash"), str):
+        raise PersistedQueryError("Persisted query is missing sha256Hash.", "BAD_REQUEST")
+    return persisted
+
+
+class DocumentCache:
+    """
+    Thread-safe LRU of parsed and validated documents keyed by query hash
+    """
+
+    def __init__(self, maxsize=None):
+        self._maxsize = maxsize
+        self._lock = threading.Lock()
+        self._documents = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def maxsize(self):
+        if self._maxsize is not None:
+            return self._maxsize
+        return getattr(settings, "CRM_DOCUMENT_CACHE_SIZE", 500)
+
+    def __len__(self):
+        return len(self._documents)
+
+    def get(self, key):
+        with self._lock:
+            document = self._documents.get(key)
+            if document is None:
+                self.misses += 1
+            else:
+                self._documents.move_to_end(key)
+                self.hits += 1
+        METRICS.increment(
+            "crm_graphql_document_cache_total", {"result": "miss" if document is None else "hit"}
+        )
+        return document
+
+    def put(self, key, document):
+        with self._lock:
+            self._documents[key] = document
+            self._documents.move_to_end(key)
+            while len(self._documents) > self.maxsize:
+                self._documents.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+DOCUMENT_CACHE = DocumentCache()
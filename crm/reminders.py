@@ -0,0 +1,169 @@
+"""
+This file contains the order reminder pipeline.
+
+A run covers the orders of the last ``CRM_REMINDER_WINDOW_DAYS`` days and
+is recorded as a ``ReminderRun``, one per day. The producer
+(``dispatch_reminders``) pages through the window's orders by primary key,
+``CRM_REMINDER_CHUNK_SIZE`` ids at a time, and hands each id range to a
+worker (``send_reminder_chunk``), checkpointing the last dispatched id on
+the run after every chunk, so a producer that dies resumes where it
+stopped. Workers send one reminder per customer email: the run's
+``OrderReminder`` rows are unique on (run, email), so an email claimed by
+another chunk is skipped. Each chunk inserts its reminders with one bulk
+insert and appends them to the log with one write.
+
+Delivery is at least once: a chunk redelivered before it completed (a
+worker died after the insert, before or during the log write) logs the
+reminders it claimed again. Completion is recorded as a ``ReminderChunk``
+row unique on (run, first order id), so a chunk counts once towards the
+run's ``chunks_done`` however often it is delivered, and a completed
+chunk delivered again is a no-op.
+"""
+
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from graphene.relay import Node
+
+from .models import Order, OrderReminder, ReminderChunk, ReminderRun
+
+REMINDERS_LOG = "/tmp/order_reminders_log.txt"
+
+
+def reminder_chunk_size():
+    return getattr(settings, "CRM_REMINDER_CHUNK_SIZE", 5000)
+
+
+def reminder_window_days():
+    return getattr(settings, "CRM_REMINDER_WINDOW_DAYS", 7)
+
+
+def write_log(lines, log_path=REMINDERS_LOG):
+    with open(log_path, "a") as log_file:
+        log_file.write("".join(line + "\n" for line in lines))
+
+
+def start_run(today=None, log_path=REMINDERS_LOG):
+    """
+    Today's run, created on first use
+    """
+    today = today or timezone.localdate()
+    run, created = ReminderRun.objects.get_or_create(
+        run_date=today,
+        defaults={"window_start": today - timedelta(days=reminder_window_days())},
+    )
+    if created:
+        write_log(["", f"--- Reminders Processed at {datetime.now()} ---"], log_path)
+    return run
+
+
+def window_orders(run):
+    return Order.objects.filter(order_date__range=(run.window_start, run.run_date))
+
+
+def finish_if_done(run_id):
+    """
+    Mark a run finished once every dispatched chunk is done; only one
+    caller's UPDATE can match
+    """
+    return ReminderRun.objects.filter(
+        pk=run_id,
+        finished_at__isnull=True,
+        dispatch_complete=True,
+        chunks_done__gte=F("chunks_dispatched"),
+    ).update(finished_at=timezone.now())
+
+
+def dispatch_reminders(dispatch, today=None, chunk_size=None, log_path=REMINDERS_LOG):
+    """
+    Hand today's run to workers as (run id, first order id, last order id)
+    chunks through dispatch, resuming from the run's checkpoint.
+    Returns the run.
+    """
+    chunk_size = chunk_size or reminder_chunk_size()
+    run = start_run(today, log_path)
+    if run.dispatch_complete:
+        return run
+
+    dispatched = run.chunks_dispatched
+    ids = window_orders(run).order_by("pk").values_list("pk", flat=True)
+    while True:
+        chunk = list(ids.filter(pk__gt=run.last_order_id)[:chunk_size])
+        if not chunk:
+            break
+        dispatch(run.pk, chunk[0], chunk[-1])
+        # Checkpoint after handing the chunk over: a crash in between
+        # dispatches it again, which the workers treat as a no-op
+        ReminderRun.objects.filter(pk=run.pk).update(
+            last_order_id=chunk[-1], chunks_dispatched=F("chunks_dispatched") + 1
+        )
+        run.last_order_id = chunk[-1]
+        dispatched += 1
+
+    ReminderRun.objects.filter(pk=run.pk).update(dispatch_complete=True)
+    if not dispatched:
+        write_log(["No recent orders found to process"], log_path)
+    finish_if_done(run.pk)
+    run.refresh_from_db()
+    return run
+
+
+def send_reminder_chunk(run_id, first_order_id, last_order_id, log_path=REMINDERS_LOG):
+    """
+    Send the reminders of one chunk of orders: one per email not yet
+    reminded in this run. Returns how many were sent.
+    """
+    run = ReminderRun.objects.get(pk=run_id)
+    if ReminderChunk.objects.filter(run=run, first_order_id=first_order_id).exists():
+        return 0
+    rows = (
+        window_orders(run)
+        .filter(pk__range=(first_order_id, last_order_id))
+        .order_by("pk")
+        .values_list("pk", "customer__email")
+    )
+    # The earliest order of each email within the chunk
+    first_orders = {}
+    for pk, email in rows:
+        first_orders.setdefault(email, pk)
+
+    reminded = set(
+        OrderReminder.objects.filter(run=run, email__in=list(first_orders))
+        .values_list("email", flat=True)
+    )
+    pending = [
+        OrderReminder(run=run, email=email, order_id=pk)
+        for email, pk in first_orders.items()
+        if email not in reminded
+    ]
+    OrderReminder.objects.bulk_create(
+        pending, ignore_conflicts=True, batch_size=getattr(settings, "CRM_BULK_CHUNK_SIZE", 1000)
+    )
+    # The rows carrying this chunk's order ids are its reminders: the ones
+    # just inserted and, on a redelivery, the ones inserted before a
+    # failure; a concurrent chunk may have claimed the others. Looked up
+    # by (run, email), the unique index
+    claimed = OrderReminder.objects.filter(
+        run=run, email__in=list(first_orders)
+    ).values_list("email", "order_id")
+    sent = sorted(
+        (order_id, email) for email, order_id in claimed if first_orders[email] == order_id
+    )
+    if sent:
+        write_log(
+            [
+                f"Order ID: {Node.to_global_id('OrderType', order_id)} for customer email {email}"
+                for order_id, email in sent
+            ],
+            log_path,
+        )
+
+    with transaction.atomic():
+        _, created = ReminderChunk.objects.get_or_create(run=run, first_order_id=first_order_id)
+        if created:
+            ReminderRun.objects.filter(pk=run_id).update(chunks_done=F("chunks_done") + 1)
+    finish_if_done(run_id)
+    return len(sent)
@@ -0,0 +1,153 @@
+"""
+This file contains the response cache for read-only GraphQL operations.
+
+A cached entry is keyed on the normalized document, the operation name,
+the variables and the caller's auth scope, and is stored through Django's
+cache framework (``CRM_RESPONSE_CACHE_ALIAS``). Each entry is tagged with
+the models whose tables the operation read, together with the version of
+each tag at the time; invalidating a model bumps its tag version, so every
+entry that read it stops matching without the cache having to be scanned.
+
+Model signals (``crm.signals``) invalidate on ``save``/``delete``/``m2m``
+changes. ``bulk_create`` and ``QuerySet.update`` send no signals, so the
+service functions that use them call ``invalidate`` themselves.
+"""
+
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from graphql import print_ast
+
+from .instrumentation import METRICS
+from .models import Customer, DailyProductSales, DailyRevenue, Order, Product
+
+# Models whose changes invalidate cached responses
+TAGGED_MODELS = (Customer, Product, Order, DailyRevenue, DailyProductSales)
+
+KEY_PREFIX = "crm:graphql:response:"
+TAG_PREFIX = "crm:graphql:tag:"
+
+
+def response_cache_enabled():
+    return getattr(settings, "CRM_RESPONSE_CACHE_ENABLED", False)
+
+
+def get_cache():
+    return caches[getattr(settings, "CRM_RESPONSE_CACHE_ALIAS", "default")]
+
+
+def model_tag(model):
+    return model._meta.label_lower
+
+
+def table_tags():
+    """
+    Quoted table name -> tag, including the tables of the models' m2m fields
+    """
+    tables = {}
+    for model in TAGGED_MODELS:
+        tag = model_tag(model)
+        tables[connection.ops.quote_name(model._meta.db_table)] = tag
+        for field in model._meta.local_many_to_many:
+            tables[connection.ops.quote_name(field.remote_field.through._meta.db_table)] = tag
+    return tables
+
+
+def auth_scope(request):
+    user = getattr(request, "user", None)
+    if user is not None and user.is_authenticated:
+        return f"user:{user.pk}"
+    return "anonymous"
+
+
+def cache_key(request, document, operation_name, variables):
+    payload = json.dumps(
+        [print_ast(document), operation_name, variables or {}, auth_scope(request)],
+        sort_keys=True,
+        default=str,
+    )
+    return KEY_PREFIX + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def tag_versions(cache, tags):
+    keys = {TAG_PREFIX + tag: tag for tag in tags}
+    found = cache.get_many(list(keys))
+    return {tag: found.get(key, 0) for key, tag in keys.items()}
+
+
+class TableRecorder:
+    """
+    Execute wrapper recording which tagged tables an operation read
+    """
+
+    def __init__(self):
+        self.tables = table_tags()
+        self.tags = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        for table, tag in self.tables.items():
+            if table in sql:
+                self.tags.add(tag)
+        return execute(sql, params, many, context)
+
+
+def get_cached(key):
+    """
+    The cached data for key, or None if missing or any of its tags moved on
+    """
+    cache = get_cache()
+    entry = cache.get(key)
+    if entry is not None and tag_versions(cache, entry["tags"]) != entry["tags"]:
+        entry = None
+    METRICS.increment(
+        "crm_graphql_response_cache_total", {"result": "miss" if entry is None else "hit"}
+    )
+    return None if entry is None else entry["data"]
+
+
+def current_versions():
+    """
+    Every tag's version, taken before executing an operation so a write
+    that lands while it runs leaves the entry already stale
+    """
+    return tag_versions(get_cache(), [model_tag(model) for model in TAGGED_MODELS])
+
+
+def set_cached(key, data, versions, tags):
+    entry = {"data": data, "tags": {tag: versions[tag] for tag in tags}}
+    get_cache().set(key, entry, getattr(settings, "CRM_RESPONSE_CACHE_TIMEOUT", 60))
+
+
+def bump_version(cache, key):
+    """
+    Increment the version counter at key, starting it if missing
+    """
+    # add() is a no-op when the key exists, so incr() always has a value
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def _bump(tags):
+    cache = get_cache()
+    for tag in tags:
+        bump_version(cache, TAG_PREFIX + tag)
+
+
+def invalidate(*models):
+    """
+    Evict every cached response that read any of models.
+
+    Runs now and again on commit, so a response cached from data read
+    before the transaction committed cannot outlive it.
+    """
+    if not response_cache_enabled():
+        return
+    tags = {model_tag(model) for model in models}
+    _bump(tags)
+    transaction.on_commit(lambda: _bump(tags))
@@ -0,0 +1,117 @@
+"""
+This file contains the event-driven low-stock replenishment.
+
+Wherever stock goes down (order placement, product saves) the products
+left below ``LOW_STOCK_THRESHOLD`` are passed to ``request_restock``. Once
+the transaction commits, each product gets at most one pending
+``restock_product`` task: a cache key added with ``cache.add`` claims the
+product for ``CRM_RESTOCK_COALESCE_SECONDS``, and the task is queued with
+that countdown, so every crossing within the window is folded into the one
+restock. The cache (``CRM_RESTOCK_CACHE_ALIAS``) must be shared between
+processes for the deduplication to hold across them.
+
+The tasks are published from a single background thread, not from the
+request that committed: a slow or unreachable broker delays the restock,
+never the order. A restock that cannot be claimed or published is left to
+the sweep.
+
+The ``update_low_stock`` cron sweep remains as a daily consistency check.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import LOW_STOCK_THRESHOLD, Product
+from .response_cache import invalidate
+
+logger = logging.getLogger(__name__)
+
+PENDING_PREFIX = "crm:restock:pending:"
+
+_publisher = None
+
+
+def coalesce_seconds():
+    return getattr(settings, "CRM_RESTOCK_COALESCE_SECONDS", 60)
+
+
+def restock_increment():
+    return getattr(settings, "CRM_RESTOCK_INCREMENT", 10)
+
+
+def get_cache():
+    return caches[getattr(settings, "CRM_RESTOCK_CACHE_ALIAS", "default")]
+
+
+def get_publisher():
+    """
+    The thread restock tasks are published from, in order
+    """
+    global _publisher
+    if _publisher is None:
+        _publisher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="crm-restock")
+    return _publisher
+
+
+def _publish(product_id, key, countdown):
+    # Imported late: crm.tasks imports this module
+    from .tasks import restock_product
+
+    try:
+        # No publish retries: the sweep catches what is not queued
+        restock_product.apply_async((product_id,), countdown=countdown, retry=False)
+    except Exception as e:
+        logger.warning("Could not queue a restock of product %s: %s", product_id, e)
+        try:
+            get_cache().delete(key)
+        except Exception:
+            # Expires on its own
+            pass
+
+
+def _enqueue(product_ids):
+    cache = get_cache()
+    window = coalesce_seconds()
+    for product_id in product_ids:
+        # The key outlives the countdown a little so a slow worker start
+        # does not let a second task in
+        key = PENDING_PREFIX + str(product_id)
+        try:
+            claimed = cache.add(key, 1, window * 2 + 60)
+        except Exception as e:
+            # The order is already committed; leave this one to the sweep
+            logger.warning("Could not claim a restock of product %s: %s", product_id, e)
+            continue
+        if claimed:
+            get_publisher().submit(_publish, product_id, key, window)
+
+
+def request_restock(product_ids):
+    """
+    Queue a coalesced restock for each of product_ids once the current
+    transaction commits
+    """
+    product_ids = sorted(set(product_ids))
+    if product_ids:
+        transaction.on_commit(lambda: _enqueue(product_ids))
+
+
+def restock_product(product_id, increment=None):
+    """
+    Add increment to the product's stock if it is still low, releasing its
+    pending claim first so a later crossing queues a new restock. Returns
+    whether the product was restocked.
+    """
+    get_cache().delete(PENDING_PREFIX + str(product_id))
+    updated = Product.objects.filter(pk=product_id, stock__lt=LOW_STOCK_THRESHOLD).update(
+        stock=F("stock") + (increment or restock_increment()), updated_at=timezone.now()
+    )
+    if updated:
+        invalidate(Product)
+    return bool(updated)
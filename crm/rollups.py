@@ -0,0 +1,222 @@
+"""
+This file contains the upkeep of the daily revenue rollups.
+
+``DailyRevenue`` holds one row per day (orders, revenue, new customers)
+and ``DailyProductSales`` one row per product and day (units sold). The
+order services and the customer signals bump them as rows are written
+(``add_order_rollups``, ``add_new_customers``); the ``close_revenue_day``
+task then recomputes each finished day from the source tables
+(``rebuild_rollups``), which also picks up deletes and any other change
+made behind the services' back.
+"""
+
+import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, Max, Min, Sum, Value
+from django.db.models.expressions import Case, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Customer, DailyProductSales, DailyRevenue, Order
+from .response_cache import invalidate
+
+CENTS = Decimal("0.01")
+
+
+def _ensure_days(days):
+    # INSERT OR IGNORE / ON CONFLICT DO NOTHING, so concurrent writers
+    # both end up incrementing the same row
+    DailyRevenue.objects.bulk_create([DailyRevenue(date=day) for day in days], ignore_conflicts=True)
+
+
+def add_order_rollups(orders, chunk_size=None):
+    """
+    Add newly placed orders, given as (order, {product id: quantity})
+    pairs, to the daily rollups with one UPDATE per day and per chunk of
+    products
+    """
+    chunk_size = chunk_size or getattr(settings, "CRM_BULK_CHUNK_SIZE", 1000)
+    days = {}
+    units = {}
+    for order, lines in orders:
+        entry = days.setdefault(order.order_date, [0, Decimal("0")])
+        entry[0] += 1
+        entry[1] += order.total_amount
+        sold = units.setdefault(order.order_date, {})
+        for product_id, quantity in lines.items():
+            sold[product_id] = sold.get(product_id, 0) + quantity
+    if not days:
+        return
+
+    _ensure_days(days)
+    for day, (count, revenue) in days.items():
+        DailyRevenue.objects.filter(date=day).update(
+            order_count=F("order_count") + count, revenue=F("revenue") + revenue
+        )
+
+    DailyProductSales.objects.bulk_create(
+        [
+            DailyProductSales(date=day, product_id=product_id)
+            for day, sold in units.items()
+            for product_id in sold
+        ],
+        ignore_conflicts=True,
+    )
+    for day, sold in units.items():
+        product_ids = sorted(sold)
+        for start in range(0, len(product_ids), chunk_size):
+            chunk = product_ids[start:start + chunk_size]
+            DailyProductSales.objects.filter(date=day, product_id__in=chunk).update(
+                units=F("units") + Case(
+                    *[When(product_id=product_id, then=Value(sold[product_id])) for product_id in chunk],
+                    default=Value(0),
+                    output_field=IntegerField(),
+                )
+            )
+    invalidate(DailyRevenue, DailyProductSales)
+
+
+def add_new_customers(customers):
+    """
+    Count newly created customers in the daily rollups
+    """
+    days = {}
+    for customer in customers:
+        day = timezone.localdate(customer.created_at)
+        days[day] = days.get(day, 0) + 1
+    if not days:
+        return
+
+    _ensure_days(days)
+    for day, count in days.items():
+        DailyRevenue.objects.filter(date=day).update(new_customers=F("new_customers") + count)
+    invalidate(DailyRevenue)
+
+
+def day_bounds(start, end):
+    """
+    The aware datetimes [start 00:00, day after end 00:00) in the current time zone
+    """
+    tz = timezone.get_current_timezone()
+    return (
+        datetime.datetime.combine(start, datetime.time.min, tzinfo=tz),
+        datetime.datetime.combine(end + datetime.timedelta(days=1), datetime.time.min, tzinfo=tz),
+    )
+
+
+def history_bounds(order_model=Order, customer_model=Customer):
+    """
+    The first and last day with an order or a new customer, or None
+    """
+    orders = order_model.objects.aggregate(first=Min("order_date"), last=Max("order_date"))
+    customers = customer_model.objects.aggregate(first=Min("created_at"), last=Max("created_at"))
+    days = [day for day in orders.values() if day is not None]
+    days += [timezone.localdate(value) for value in customers.values() if value is not None]
+    return (min(days), max(days)) if days else None
+
+
+def rebuild_rollups(
+    start,
+    end,
+    close=False,
+    order_model=Order,
+    customer_model=Customer,
+    revenue_model=DailyRevenue,
+    sales_model=DailyProductSales,
+):
+    """
+    Recompute the rollups of the days start..end from the source tables.
+
+    Each source table is read with one GROUP BY query over the date range
+    and the days' rows are replaced in one transaction. With close=True
+    every day in the range gets a row marked closed, even a day without
+    activity. The models can be swapped for historical ones in
+    migrations. Returns the number of day rows written.
+    """
+    orders = (
+        order_model.objects.filter(order_date__range=(start, end))
+        .order_by()
+        .values("order_date")
+        .annotate(n=Count("pk"), revenue=Sum("total_amount"))
+    )
+    created_from, created_to = day_bounds(start, end)
+    customers = (
+        customer_model.objects.filter(created_at__gte=created_from, created_at__lt=created_to)
+        .order_by()
+        .values(day=TruncDate("created_at"))
+        .annotate(n=Count("pk"))
+    )
+    through = order_model._meta.get_field("products").remote_field.through
+    # Lines carry a quantity from migration 0010 on; before that each
+    # link was one unit
+    has_quantity = any(field.name == "quantity" for field in through._meta.fields)
+    units = (
+        through.objects.filter(order__order_date__range=(start, end))
+        .order_by()
+        .values("order__order_date", "product_id")
+        .annotate(units=Sum("quantity") if has_quantity else Count("pk"))
+    )
+
+    closed_at = timezone.now() if close else None
+    rows = {}
+
+    def row(day):
+        if day not in rows:
+            rows[day] = revenue_model(date=day, closed_at=closed_at)
+        return rows[day]
+
+    for entry in orders:
+        day = row(entry["order_date"])
+        day.order_count = entry["n"]
+        day.revenue = entry["revenue"] or Decimal("0")
+    for entry in customers:
+        row(entry["day"]).new_customers = entry["n"]
+    if close:
+        day = start
+        while day <= end:
+            row(day)
+            day += datetime.timedelta(days=1)
+    sales = [
+        sales_model(date=entry["order__order_date"], product_id=entry["product_id"], units=entry["units"])
+        for entry in units
+    ]
+
+    chunk_size = getattr(settings, "CRM_BULK_CHUNK_SIZE", 1000)
+    with transaction.atomic():
+        revenue_model.objects.filter(date__range=(start, end)).delete()
+        sales_model.objects.filter(date__range=(start, end)).delete()
+        revenue_model.objects.bulk_create(rows.values(), batch_size=chunk_size)
+        sales_model.objects.bulk_create(sales, batch_size=chunk_size)
+        invalidate(DailyRevenue, DailyProductSales)
+    return len(rows)
+
+
+def close_day(day):
+    """
+    Recompute one finished day and mark it closed
+    """
+    return rebuild_rollups(day, day, close=True)
+
+
+def rollup_totals(start=None, end=None):
+    """
+    Summed orders, revenue and new customers over the rollup rows of
+    start..end (all days when omitted)
+    """
+    rows = DailyRevenue.objects.all()
+    if start is not None:
+        rows = rows.filter(date__gte=start)
+    if end is not None:
+        rows = rows.filter(date__lte=end)
+    totals = rows.aggregate(
+        order_count=Sum("order_count"), revenue=Sum("revenue"), new_customers=Sum("new_customers")
+    )
+    return {
+        "order_count": totals["order_count"] or 0,
+        # SQLite hands back sums of decimals unquantized
+        "revenue": (totals["revenue"] or Decimal("0")).quantize(CENTS),
+        "new_customers": totals["new_customers"] or 0,
+    }
@@ -4,17 +4,27 @@ This file contains the schema for the CRM API.
 
 import graphene
 from graphene_django import DjangoObjectType
-from graphene_django.filter import DjangoFilterConnectionField
 from django_filters.rest_framework import DjangoFilterBackend
 
+from .fields import BatchedFilterConnectionField, CountableConnection, KeysetFilterConnectionField
 from .filters import CustomerFilter, ProductFilter, OrderFilter
-from .models import Customer, Order
+from .loaders import get_loaders
+from .services import (
+    bulk_create_customers,
+    bulk_place_orders,
+    order_lines,
+    place_order,
+    restock_low_stock_products,
+)
+from .models import Customer, DailyRevenue, Order, OrderItem
+from .rollups import rollup_totals
+from django.conf import settings
 from django.db import IntegrityError
+from django.db.models import Sum
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
 from crm.models import Product
 
-from .mutations import CreateCustomer, BulkCreateCustomers, CreateProduct, CreateOrder
 
 # Use standard DjangoObjectType with Relay Node interface
 
@@ -32,9 +42,13 @@ class CustomerType(DjangoObjectType):
 
     class Meta:
         model = Customer
-        fields = ("id", "name", "email", "phone")
+        fields = (
+            "id", "name", "email", "phone",
+            "order_count", "lifetime_value", "last_order_date",
+        )
         filterset_class = CustomerFilter
         interfaces = (graphene.relay.Node,)
+        connection_class = CountableConnection
 
 class ProductType(DjangoObjectType):
     """
@@ -46,18 +60,127 @@ class ProductType(DjangoObjectType):
         fields = ("id", "name", "price", "stock")
         filterset_class = ProductFilter
         interfaces = (graphene.relay.Node,)
+        connection_class = CountableConnection
+
+
+class OrderItemType(DjangoObjectType):
+    """
+    Define OrderItem fields
+    """
+
+    class Meta:
+        model = OrderItem
+        fields = ("product", "quantity", "unit_price")
 
 
 class OrderType(DjangoObjectType):
     """
     Define Order fields
     """
+
+    products = BatchedFilterConnectionField(
+        ProductType, filterset_class=ProductFilter, required=True
+    )
     
     class Meta:
         model = Order
-        fields = ("id", "customer", "products", "total_amount")
+        fields = ("id", "customer", "products", "items", "total_amount")
         filterset_class = OrderFilter
         interfaces = (graphene.relay.Node,)
+        connection_class = CountableConnection
+
+    @classmethod
+    def enqueue_loaders(cls, info, orders):
+        """
+        Queue the related objects of a page of orders for batch loading
+        """
+        loaders = get_loaders(info)
+        for order in orders:
+            if Order.customer.is_cached(order):
+                loaders.customer.prime(order.customer_id, order.customer)
+            elif "customer_id" not in order.get_deferred_fields():
+                # Deferred by the optimizer when customer is not selected;
+                # reading it would cost a query per order
+                loaders.customer.enqueue([order.customer_id])
+            if "products" in getattr(order, "_prefetched_objects_cache", {}):
+                loaders.products_by_order.prime(order.pk, list(order.products.all()))
+            else:
+                loaders.products_by_order.enqueue([order.pk])
+            if "items" in getattr(order, "_prefetched_objects_cache", {}):
+                loaders.items_by_order.prime(order.pk, list(order.items.all()))
+            else:
+                loaders.items_by_order.enqueue([order.pk])
+
+    def resolve_customer(self, info):
+        """
+        Get the order's customer through the request loader
+        """
+        return get_loaders(info).customer.load(self.customer_id)
+
+    def resolve_products(self, info, **kwargs):
+        """
+        Get the order's products through the request loader.
+        Filtered lookups fall back to a per-order queryset.
+        """
+        if any(kwargs.get(name) is not None for name in ProductFilter.base_filters):
+            return self.products.all()
+        return get_loaders(info).products_by_order.load(self.pk)
+
+    def resolve_items(self, info):
+        """
+        Get the order's lines through the request loader
+        """
+        return get_loaders(info).items_by_order.load(self.pk)
+
+class DailyRevenueType(DjangoObjectType):
+    """
+    Define DailyRevenue fields
+    """
+
+    class Meta:
+        model = DailyRevenue
+        fields = ("date", "order_count", "revenue", "new_customers", "closed_at")
+
+
+class ProductSalesType(graphene.ObjectType):
+    """
+    Units of one product sold over a report's days
+    """
+
+    product = graphene.Field(ProductType)
+    units = graphene.Int()
+
+
+class RevenueReportType(graphene.ObjectType):
+    """
+    Orders, revenue and new customers over a range of days, read from the
+    daily rollups
+    """
+
+    date_from = graphene.Date(name="from")
+    date_to = graphene.Date(name="to")
+    order_count = graphene.Int()
+    revenue = graphene.Decimal()
+    new_customers = graphene.Int()
+    days = graphene.List(graphene.NonNull(DailyRevenueType))
+    products = graphene.List(graphene.NonNull(ProductSalesType), first=graphene.Int())
+
+    def resolve_days(self, info):
+        return DailyRevenue.objects.filter(date__range=(self.date_from, self.date_to)).order_by("date")
+
+    def resolve_products(self, info, first=None):
+        """
+        Best sellers of the range, most units first
+        """
+        sales = (
+            Product.objects.filter(daily_sales__date__range=(self.date_from, self.date_to))
+            .annotate(units=Sum("daily_sales__units"))
+            .order_by("-units", "pk")
+        )
+        if first is not None:
+            sales = sales[:first]
+        return [ProductSalesType(product=product, units=product.units) for product in sales]
+
 
 class CustomerInput(graphene.InputObjectType):
     """
@@ -68,13 +191,24 @@ class CustomerInput(graphene.InputObjectType):
     email = graphene.String(required=True)
     phone = graphene.String(required=True)
 
+class OrderItemInput(graphene.InputObjectType):
+    """
+    Define OrderItem input fields
+    """
+
+    product = graphene.Int(required=True)
+    quantity = graphene.Int(default_value=1)
+
+
 class OrderInput(graphene.InputObjectType):
     """
-    Define Order input fields
+    Define Order input fields: products are ordered one unit each, items
+    with a quantity
     """
 
     customer = graphene.Int(required=True)
-    products = graphene.List(graphene.Int, required=True)
+    products = graphene.List(graphene.Int)
+    items = graphene.List(graphene.NonNull(OrderItemInput))
 class BulkCreateCustomersInput(graphene.InputObjectType):
     """
     Define BulkCreateCustomers input fields
@@ -187,26 +321,12 @@ class CreateOrder(graphene.Mutation):
         """
         Create a new order
         """
-        customer = Customer.objects.filter(pk=order.customer)
-        products = Product.objects.filter(pk__in=order.products)
-
-        if not customer.exists():
-            raise ValidationError("Customer not found")
-        
-        if not products.exists():
-            raise ValidationError("Products not found")
-        total_amount = sum(product.price for product in products)
-        
+        # ValidationError (unknown customer/products, no stock) is surfaced
+        # as a GraphQL error, as before
         try:
-            order=Order.objects.create(
-                customer=customer.first(),
-                total_amount=total_amount,
-            )
-            order.products.set(products)
-        except ValidationError as e:
-            return CreateOrder(
-                order=None, message=str(e)
-            )
+            order = place_order(order.customer, order_lines(order.products, order.items))
+        except ValidationError:
+            raise
         except Exception as e:
             return CreateOrder(
                 order=None, message=str(e)
@@ -216,6 +336,26 @@ class CreateOrder(graphene.Mutation):
         )
 
 
+class BulkCreateOrders(graphene.Mutation):
+    """
+    Create multiple orders
+    """
+
+    orders = graphene.List(OrderType)
+    errors = graphene.List(graphene.String)
+
+    class Arguments:
+        orders = graphene.List(graphene.NonNull(OrderInput), required=True)
+
+    def mutate(self, info, orders):
+        """
+        Create the valid orders in bulk and report the rest per item
+        """
+        created_orders, errors = bulk_place_orders(orders)
+        OrderType.enqueue_loaders(info, created_orders)
+        return BulkCreateOrders(orders=created_orders, errors=errors)
+
+
 class BulkCreateCustomers(graphene.Mutation):
     """
     Create multiple customers
@@ -226,34 +366,10 @@ class BulkCreateCustomers(graphene.Mutation):
 
     class Arguments:
         customers = graphene.List(CustomerInput, required=True)
+        chunk_size = graphene.Int()
 
-    def mutate(self, info, customers):
-        created_customers = []
-        errors = []
-
-        for customer_data in customers:
-            try:
-                validated_phone = CreateCustomer.validate_phone(customer_data.phone)
-                # get_or_create to handle unique email validation. 
-                # IntegrityError will be raised if the email exists.
-                customer, created = Customer.objects.get_or_create(
-                    email=customer_data.email,
-                    defaults={
-                        'name': customer_data.name,
-                        'phone': validated_phone
-                    }
-                )
-                if created:
-                    created_customers.append(customer)
-                else:
-                    errors.append(f"Error creating customer with email '{customer_data.email}': Email already exists.")  
-            except ValidationError as e:
-                errors.append(f"Error creating customer: {e}")
-            except IntegrityError:
-                errors.append("Error creating customer with email '{customer_data.email}': Email already exists.")
-            except Exception as e:
-                errors.append(f"Error creating customer: {e}")
-        
+    def mutate(self, info, customers, chunk_size=None):
+        created_customers, errors = bulk_create_customers(customers, chunk_size=chunk_size)
         return BulkCreateCustomers(customers=created_customers, errors=errors)
 
 
@@ -314,20 +430,63 @@ class CreateProduct(graphene.Mutation):
         return price
 
 
+# Most rows a client may ask a top-level connection for with first/last
+CONNECTION_MAX_LIMIT = getattr(settings, "CRM_CONNECTION_MAX_LIMIT", 100)
+
+
 class Query(graphene.ObjectType):
     """
     Define Query fields
     """
 
-    all_customers = DjangoFilterConnectionField(CustomerType, filterset_class=CustomerFilter)
-    all_products = DjangoFilterConnectionField(ProductType, filterset_class=ProductFilter)
-    all_orders = DjangoFilterConnectionField(OrderType, filterset_class=OrderFilter)
+    all_customers = BatchedFilterConnectionField(
+        CustomerType, filterset_class=CustomerFilter, max_limit=CONNECTION_MAX_LIMIT
+    )
+    all_products = BatchedFilterConnectionField(
+        ProductType, filterset_class=ProductFilter, max_limit=CONNECTION_MAX_LIMIT
+    )
+    all_orders = BatchedFilterConnectionField(
+        OrderType, filterset_class=OrderFilter, max_limit=CONNECTION_MAX_LIMIT
+    )
+
+    # Keyset-paginated variants: cursors carry the sort key, so deep pages
+    # cost the same as the first one
+    all_customers_keyset = KeysetFilterConnectionField(
+        CustomerType, filterset_class=CustomerFilter, keyset=("created_at", "id"),
+        max_limit=CONNECTION_MAX_LIMIT,
+    )
+    all_products_keyset = KeysetFilterConnectionField(
+        ProductType, filterset_class=ProductFilter, keyset=("id",),
+        max_limit=CONNECTION_MAX_LIMIT,
+    )
+    all_orders_keyset = KeysetFilterConnectionField(
+        OrderType, filterset_class=OrderFilter, keyset=("order_date", "id"),
+        max_limit=CONNECTION_MAX_LIMIT,
+    )
 
     customer = graphene.Field(CustomerType, id=graphene.ID(required=True))
     product = graphene.Field(ProductType, id=graphene.ID(required=True))
     order = graphene.Field(OrderType, id=graphene.ID(required=True))
 
-    
+    revenue_report = graphene.Field(
+        RevenueReportType,
+        date_from=graphene.Date(required=True, name="from"),
+        date_to=graphene.Date(required=True, name="to"),
+    )
+
+    def resolve_revenue_report(self, info, date_from, date_to):
+        """
+        Report the days date_from..date_to from the daily rollups
+        """
+        if date_from > date_to:
+            raise ValidationError("`from` must not be after `to`")
+        max_days = getattr(settings, "CRM_REVENUE_REPORT_MAX_DAYS", 366)
+        if max_days and (date_to - date_from).days + 1 > max_days:
+            raise ValidationError(f"Revenue reports cover at most {max_days} days")
+        return RevenueReportType(
+            date_from=date_from, date_to=date_to, **rollup_totals(date_from, date_to)
+        )
+
     def resolve_customer(self, info, id):
         """
         Get a customer by id
@@ -361,18 +520,19 @@ class UpdateLowStockProducts(graphene.Mutation):
     updated_products = graphene.List(ProductType)
     message = graphene.String()
 
+    class Arguments:
+        threshold = graphene.Int(default_value=10)
+        increment = graphene.Int(default_value=10)
+
     @staticmethod
-    def mutate(root, info):
-        # Find all products with stock less than 10
-        low_stock_products = Product.objects.filter(stock__lt=10)
-        
-        updated_products_list = []
-        for product in low_stock_products:
-            # Increment stock by 10
-            product.stock += 10
-            product.save()
-            updated_products_list.append(product)
-            
+    def mutate(root, info, threshold=10, increment=10):
+        # Restock every product below the threshold in one UPDATE
+        if increment <= 0:
+            raise ValidationError("Increment must be greater than 0")
+        updated_products_list = restock_low_stock_products(
+            threshold=threshold, increment=increment
+        )
+
         message = f"Successfully updated stock for {len(updated_products_list)} products."
         
         return UpdateLowStockProducts(updated_products=updated_products_list, message=message)
@@ -387,6 +547,7 @@ class Mutation(graphene.ObjectType):
     bulk_create_customers = BulkCreateCustomers.Field()
     create_product = CreateProduct.Field()
     create_order = CreateOrder.Field()  
+    bulk_create_orders = BulkCreateOrders.Field()
 
     update_low_stock_products = UpdateLowStockProducts.Field()
 schema = graphene.Schema(query=Query, mutation=Mutation)
@@ -0,0 +1,219 @@
+"""
+This file contains the substring search backend for the CRM filters.
+
+``icontains`` compiles to ``LIKE '%x%'``, which no B-tree index can serve.
+On SQLite each searchable table gets an FTS5 shadow table with the
+trigram tokenizer, kept in sync by triggers; on PostgreSQL the columns
+get ``pg_trgm`` GIN indexes. Filters go through ``contains_q`` and
+``search_queryset`` instead of ``icontains`` so they can use them.
+
+The trigram tokenizer needs SQLite 3.34; on older versions no index is
+created and the filters keep using ``icontains``. They check for the FTS5
+table itself rather than the running SQLite version, so a database
+migrated on an older SQLite keeps working after an upgrade.
+"""
+
+from django.db import connection
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Greatest
+
+from .models import Customer, Product
+
+# model -> columns covered by its search index
+SEARCH_FIELDS = {
+    Customer: ("name", "email"),
+    Product: ("name",),
+}
+
+# The trigram tokenizer cannot match anything shorter than one trigram
+MIN_SEARCH_LENGTH = 3
+
+# connection alias -> FTS5 tables in its database, looked up once per
+# connection (crm.signals forgets them when a new one is opened)
+_search_tables = {}
+
+
+def search_table(table):
+    return f"{table}_search"
+
+
+def trigram_available(conn=connection):
+    """
+    Whether conn is SQLite with the FTS5 trigram tokenizer (3.34+)
+    """
+    return conn.vendor == "sqlite" and conn.Database.sqlite_version_info >= (3, 34)
+
+
+def forget_search_tables(conn):
+    _search_tables.pop(conn.alias, None)
+
+
+def has_search_index(model, conn=connection):
+    """
+    Whether model's FTS5 table exists in conn's database
+    """
+    tables = _search_tables.get(conn.alias)
+    if tables is None:
+        tables = {name for name in conn.introspection.table_names() if name.endswith("_search")}
+        _search_tables[conn.alias] = tables
+    return search_table(model._meta.db_table) in tables
+
+
+def create_update_trigger(schema_editor, table, columns):
+    """
+    Re-index a row of table in its FTS5 table when one of columns changes
+    """
+    qn = schema_editor.connection.ops.quote_name
+    fts = search_table(table)
+    cols = ", ".join(qn(column) for column in columns)
+    new_values = ", ".join(f"new.{qn(column)}" for column in columns)
+    old_values = ", ".join(f"old.{qn(column)}" for column in columns)
+    # Scoped to the indexed columns: stock and statistics updates skip it
+    schema_editor.execute(
+        f"CREATE TRIGGER {qn(fts + '_au')} AFTER UPDATE OF {cols} ON {qn(table)} BEGIN "
+        f"INSERT INTO {qn(fts)}({qn(fts)}, rowid, {cols}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {qn(fts)}(rowid, {cols}) VALUES (new.id, {new_values}); END"
+    )
+
+
+def create_search_index(schema_editor, table, columns):
+    """
+    Create the search index for table (used by the migrations)
+    """
+    qn = schema_editor.connection.ops.quote_name
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        if not trigram_available(schema_editor.connection):
+            return
+        fts = search_table(table)
+        cols = ", ".join(qn(column) for column in columns)
+        new_values = ", ".join(f"new.{qn(column)}" for column in columns)
+        old_values = ", ".join(f"old.{qn(column)}" for column in columns)
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE {qn(fts)} USING fts5({cols}, "
+            f"content={qn(table)}, content_rowid='id', tokenize='trigram')"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {qn(fts + '_ai')} AFTER INSERT ON {qn(table)} BEGIN "
+            f"INSERT INTO {qn(fts)}(rowid, {cols}) VALUES (new.id, {new_values}); END"
+        )
+        schema_editor.execute(
+            f"CREATE TRIGGER {qn(fts + '_ad')} AFTER DELETE ON {qn(table)} BEGIN "
+            f"INSERT INTO {qn(fts)}({qn(fts)}, rowid, {cols}) VALUES ('delete', old.id, {old_values}); END"
+        )
+        create_update_trigger(schema_editor, table, columns)
+        schema_editor.execute(f"INSERT INTO {qn(fts)}({qn(fts)}) VALUES ('rebuild')")
+    elif vendor == "postgresql":
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for column in columns:
+            # Matches the UPPER(col) LIKE UPPER(%s) that icontains compiles to
+            schema_editor.execute(
+                f"CREATE INDEX IF NOT EXISTS {qn(f'{table}_{column}_trgm')} "
+                f"ON {qn(table)} USING gin (UPPER({qn(column)}) gin_trgm_ops)"
+            )
+
+
+def drop_search_index(schema_editor, table, columns):
+    """
+    Drop the search index for table (used by the migrations)
+    """
+    qn = schema_editor.connection.ops.quote_name
+    vendor = schema_editor.connection.vendor
+    if vendor == "sqlite":
+        fts = search_table(table)
+        for suffix in ("_ai", "_ad", "_au"):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {qn(fts + suffix)}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {qn(fts)}")
+    elif vendor == "postgresql":
+        for column in columns:
+            schema_editor.execute(f"DROP INDEX IF EXISTS {qn(f'{table}_{column}_trgm')}")
+
+
+def match_expression(value, columns=None):
+    """
+    Build an FTS5 query matching value as a substring of columns
+    """
+    phrase = '"{}"'.format(value.replace('"', '""'))
+    if columns:
+        return "{%s} : %s" % (" ".join(columns), phrase)
+    return phrase
+
+
+def uses_fts(model, value):
+    return (
+        connection.vendor == "sqlite"
+        and model in SEARCH_FIELDS
+        and len(value) >= MIN_SEARCH_LENGTH
+        and has_search_index(model)
+    )
+
+
+def matching_ids(model, match):
+    fts = connection.ops.quote_name(search_table(model._meta.db_table))
+    return RawSQL(f"SELECT rowid FROM {fts} WHERE {fts} MATCH %s", (match,))
+
+
+def contains_q(model, field_path, value):
+    """
+    A Q equivalent to ``field_path__icontains=value`` that uses the search index.
+
+    field_path may cross relations (``customer__name``); the lookup is then
+    rewritten to an ``IN`` on the related model's matching ids.
+    """
+    *relations, column = field_path.split("__")
+    target = model
+    for name in relations:
+        target = target._meta.get_field(name).related_model
+
+    if column not in SEARCH_FIELDS.get(target, ()) or not uses_fts(target, value):
+        return Q(**{f"{field_path}__icontains": value})
+
+    prefix = "".join(f"{name}__" for name in relations)
+    return Q(**{f"{prefix}pk__in": matching_ids(target, match_expression(value, [column]))})
+
+
+def search_queryset(queryset, value):
+    """
+    Restrict queryset to rows matching every word of value in any indexed
+    column, best matches first
+    """
+    model = queryset.model
+    columns = SEARCH_FIELDS[model]
+    words = value.split()
+    if not words:
+        return queryset
+
+    if connection.vendor == "postgresql":
+        # Needs psycopg, so only import it on PostgreSQL
+        from django.contrib.postgres.search import TrigramSimilarity
+
+        similarities = [TrigramSimilarity(column, value) for column in columns]
+        rank = Greatest(*similarities) if len(similarities) > 1 else similarities[0]
+        for word in words:
+            queryset = queryset.filter(
+                Q(*[Q(**{f"{column}__icontains": word}) for column in columns], _connector=Q.OR)
+            )
+        return queryset.annotate(search_rank=rank).order_by("-search_rank", "pk")
+
+    if all(uses_fts(model, word) for word in words):
+        match = " ".join(match_expression(word) for word in words)
+        fts = connection.ops.quote_name(search_table(model._meta.db_table))
+        table = connection.ops.quote_name(model._meta.db_table)
+        rank = RawSQL(
+            f"SELECT bm25({fts}) FROM {fts} WHERE {fts} MATCH %s AND {fts}.rowid = {table}.id",
+            (match,),
+            output_field=FloatField(),
+        )
+        return (
+            queryset.filter(pk__in=matching_ids(model, match))
+            .annotate(search_rank=rank)
+            .order_by("search_rank", "pk")
+        )
+
+    # Words too short for trigrams: plain substring match, no ranking
+    for word in words:
+        queryset = queryset.filter(
+            Q(*[Q(**{f"{column}__icontains": word}) for column in columns], _connector=Q.OR)
+        )
+    return queryset
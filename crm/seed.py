@@ -0,0 +1,163 @@
+"""
+This file contains the synthetic data generator behind ``manage.py seed_crm``.
+
+Rows are built in memory from a seeded ``random.Random`` and written with
+``bulk_create`` in chunks of ``CRM_BULK_CHUNK_SIZE``. ``auto_now_add``
+dates cannot be set through ``bulk_create``, so customers and orders are
+generated day by day, oldest first, and each day's id range gets its
+date with one UPDATE. The customer statistics and the daily rollups are
+then rebuilt from the new rows.
+"""
+
+import datetime
+import random
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Customer, Order, OrderItem, Product
+from .response_cache import invalidate
+from .rollups import history_bounds, rebuild_rollups
+from .services import order_total
+from .stats import rebuild_customer_stats
+
+FIRST_NAMES = [
+    "Ada", "Alan", "Grace", "Edsger", "Barbara", "Donald", "Frances", "John", "Margaret",
+    "Ken", "Radia", "Dennis", "Shafi", "Niklaus", "Hedy", "Tim", "Sophie", "Linus",
+]
+LAST_NAMES = [
+    "Lovelace", "Turing", "Hopper", "Dijkstra", "Liskov", "Knuth", "Allen", "McCarthy",
+    "Hamilton", "Thompson", "Perlman", "Ritchie", "Goldwasser", "Wirth", "Lamarr", "Wilson",
+]
+PRODUCT_KINDS = [
+    "Laptop", "Monitor", "Keyboard", "Mouse", "Headset", "Webcam", "Dock", "Cable",
+    "Charger", "Tablet", "Phone", "Speaker", "Router", "Printer", "Drive", "Chair",
+]
+PRODUCT_GRADES = ["Basic", "Plus", "Pro", "Max", "Mini", "Air", "Ultra", "Lite"]
+
+
+def _spread(count, days):
+    """
+    How many of count rows fall on each of days days, oldest first
+    """
+    per_day = [count // days] * days
+    for day in range(count % days):
+        per_day[day] += 1
+    return per_day
+
+
+def _date_by_day(model, field, created, per_day, first_day):
+    # created is in insertion order, so every day is one contiguous id range
+    start = 0
+    for offset, count in enumerate(per_day):
+        if not count:
+            continue
+        day = first_day + datetime.timedelta(days=offset)
+        value = day if field == "order_date" else datetime.datetime.combine(
+            day, datetime.time(12), tzinfo=timezone.get_current_timezone()
+        )
+        model.objects.filter(pk__range=(created[start].pk, created[start + count - 1].pk)).update(
+            **{field: value}
+        )
+        start += count
+
+
+def seed_crm(customers=1000, products=100, orders=10000, days=90, seed=0, chunk_size=None):
+    """
+    Generate customers, products and orders spread over the last days days,
+    each order with one to four lines of one to three units. Returns the
+    number of rows created per model.
+    """
+    chunk_size = chunk_size or getattr(settings, "CRM_BULK_CHUNK_SIZE", 1000)
+    rng = random.Random(seed)
+    today = timezone.localdate()
+    first_day = today - datetime.timedelta(days=days - 1)
+    # Unique across repeated runs on the same database
+    run = f"{seed}-{Customer.objects.count()}"
+    counts = {"customers": 0, "products": 0, "orders": 0, "order_items": 0}
+
+    with transaction.atomic():
+        new_products = Product.objects.bulk_create(
+            (
+                Product(
+                    name=f"{rng.choice(PRODUCT_KINDS)} {rng.choice(PRODUCT_GRADES)} {i}",
+                    price=Decimal(rng.randrange(199, 250000)) / 100,
+                    stock=rng.randrange(0, 500),
+                )
+                for i in range(products)
+            ),
+            batch_size=chunk_size,
+        )
+        counts["products"] = len(new_products)
+        # With --products 0 the orders draw on the products already there
+        if new_products:
+            prices = {product.pk: product.price for product in new_products}
+        else:
+            prices = dict(Product.objects.values_list("pk", "price"))
+        product_ids = list(prices)
+
+        customer_days = _spread(customers, days)
+        new_customers = Customer.objects.bulk_create(
+            (
+                Customer(
+                    name=f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                    email=f"customer{i}.{run}@example.com",
+                    phone=f"+1{rng.randrange(10 ** 9, 10 ** 10)}",
+                )
+                for i in range(customers)
+            ),
+            batch_size=chunk_size,
+        )
+        _date_by_day(Customer, "created_at", new_customers, customer_days, first_day)
+        counts["customers"] = len(new_customers)
+        if new_customers:
+            customer_ids = [customer.pk for customer in new_customers]
+            # Orders of a day go to customers who existed by then
+            joined, known = [], 0
+            for count in customer_days:
+                known += count
+                joined.append(max(known, 1))
+        else:
+            customer_ids = list(Customer.objects.values_list("pk", flat=True))
+            joined = [len(customer_ids)] * days
+
+        if customer_ids and product_ids:
+            order_days = _spread(orders, days)
+            lines = []
+            placed = []
+            for offset, count in enumerate(order_days):
+                for _ in range(count):
+                    chosen = rng.sample(product_ids, min(rng.randint(1, 4), len(product_ids)))
+                    order_lines = {product_id: rng.randint(1, 3) for product_id in chosen}
+                    total_amount = order_total(
+                        prices[product_id] * quantity for product_id, quantity in order_lines.items()
+                    )
+                    customer_id = customer_ids[rng.randrange(joined[offset])]
+                    lines.append(order_lines)
+                    placed.append(Order(customer_id=customer_id, total_amount=total_amount))
+            new_orders = Order.objects.bulk_create(placed, batch_size=chunk_size)
+            _date_by_day(Order, "order_date", new_orders, order_days, first_day)
+            items = OrderItem.objects.bulk_create(
+                (
+                    OrderItem(
+                        order_id=order.pk,
+                        product_id=product_id,
+                        quantity=quantity,
+                        unit_price=prices[product_id],
+                    )
+                    for order, order_lines in zip(new_orders, lines)
+                    for product_id, quantity in order_lines.items()
+                ),
+                batch_size=chunk_size,
+            )
+            counts["orders"] = len(new_orders)
+            counts["order_items"] = len(items)
+
+        rebuild_customer_stats()
+        bounds = history_bounds()
+        if bounds:
+            rebuild_rollups(*bounds)
+        invalidate(Customer, Product, Order)
+    return counts
@@ -0,0 +1,397 @@
+"""
+This file contains the order placement logic shared by the CRM mutations.
+"""
+
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Exists, F, IntegerField, OuterRef, Value
+from django.db.models.expressions import Case, When
+from django.utils import timezone
+
+from .models import LOW_STOCK_THRESHOLD, Customer, Order, OrderItem, Product, phone_regex
+from .response_cache import invalidate
+from .restock import request_restock
+from .rollups import add_new_customers, add_order_rollups
+from .stats import add_order_stats, order_totals
+
+
+def order_total(prices):
+    """
+    Exact Decimal sum of prices, to the cent
+    """
+    return sum(prices, Decimal("0")).quantize(Decimal("0.01"))
+
+
+def order_lines(products=None, items=None):
+    """
+    Units per product id of an order input: one of each id in products
+    (repeats ignored, as before quantities existed) plus each item's
+    quantity
+    """
+    lines = dict.fromkeys(products or (), 1)
+    for item in items or ():
+        quantity = 1 if item.quantity is None else item.quantity
+        if quantity < 1:
+            raise ValidationError(f"Quantity of product {item.product} must be at least 1")
+        lines[item.product] = lines.get(item.product, 0) + quantity
+    return dict(sorted(lines.items()))
+
+
+def place_order(customer_id, products):
+    """
+    Create an order, decrementing stock. products is either a list of
+    product ids, one unit each, or a {product id: quantity} mapping.
+
+    Everything runs in a single transaction: the product rows are locked,
+    stock is decremented with one guarded UPDATE so concurrent checkouts
+    can never oversell, the total is summed exactly
+    in Decimal from the prices read under the lock, the order's
+    lines are inserted with their quantity and unit price with one bulk
+    insert and the customer's order statistics and the daily rollups are
+    bumped. Products left below the low-stock threshold get a restock
+    queued on commit.
+    """
+    lines = products if isinstance(products, dict) else order_lines(products)
+    product_ids = sorted(lines)
+
+    with transaction.atomic():
+        # The lock is taken anyway, so the prices come with it: never stale
+        # and no extra query
+        prices = dict(
+            Product.objects.select_for_update()
+            .filter(pk__in=product_ids)
+            .order_by("pk")
+            .values_list("pk", "price")
+        )
+        if not prices:
+            raise ValidationError("Products not found")
+        missing = set(product_ids) - set(prices)
+        if missing:
+            raise ValidationError(f"Products not found: {sorted(missing)}")
+
+        if not Customer.objects.filter(pk=customer_id).exists():
+            raise ValidationError("Customer not found")
+
+        # Each product's quantity as a CASE, so one statement decrements
+        # every line and skips the products short of theirs
+        quantity = Case(
+            *[When(pk=product_id, then=Value(units)) for product_id, units in lines.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        updated = Product.objects.filter(pk__in=product_ids, stock__gte=quantity).update(
+            stock=F("stock") - quantity
+        )
+        if updated != len(product_ids):
+            # Rolls back the decrements already applied in this block
+            raise ValidationError("One or more products are out of stock")
+
+        total_amount = order_total(
+            prices[product_id] * quantity for product_id, quantity in lines.items()
+        )
+
+        order = Order.objects.create(customer_id=customer_id, total_amount=total_amount)
+        OrderItem.objects.bulk_create(
+            OrderItem(
+                order_id=order.pk,
+                product_id=product_id,
+                quantity=quantity,
+                unit_price=prices[product_id],
+            )
+            for product_id, quantity in lines.items()
+        )
+        add_order_stats(order_totals([order]))
+        add_order_rollups([(order, lines)])
+        request_restock(
+            Product.objects.filter(pk__in=product_ids, stock__lt=LOW_STOCK_THRESHOLD)
+            .values_list("pk", flat=True)
+        )
+        # The stock and stats UPDATEs and line inserts send no model signals
+        invalidate(Product, Order, Customer)
+    return order
+
+
+def bulk_place_orders(orders):
+    """
+    Create many orders at once from inputs with a customer id, product ids
+    (one unit each) and optionally items with a quantity.
+
+    Customers and products are resolved with two IN queries, totals and
+    stock are checked in memory, and orders and their lines, with the
+    quantity and unit price, are written with one bulk insert each,
+    customer statistics with one UPDATE per chunk of customers and the
+    daily rollups with one UPDATE per day. Products that drop below the
+    low-stock threshold get a restock queued on commit. Invalid orders are
+    skipped and reported by their position in the input.
+
+    Returns a tuple of (created orders, error messages).
+    """
+    errors = []
+    parsed = []
+    for index, order in enumerate(orders):
+        try:
+            lines = order_lines(order.products, getattr(order, "items", None))
+        except ValidationError as e:
+            errors.append((index, f"Error creating order {index}: {e.messages[0]}"))
+            continue
+        parsed.append((index, order.customer, lines))
+
+    with transaction.atomic():
+        customers = Customer.objects.only("pk").in_bulk(
+            {customer_id for _, customer_id, _ in parsed}
+        )
+        products = Product.objects.select_for_update().only("pk", "price", "stock").in_bulk(
+            {product_id for _, _, lines in parsed for product_id in lines}
+        )
+
+        stock = {product.pk: product.stock or 0 for product in products.values()}
+        accepted = []
+        for index, customer_id, lines in parsed:
+            missing = [product_id for product_id in lines if product_id not in products]
+            if customer_id not in customers:
+                errors.append((index, f"Error creating order {index}: Customer not found"))
+            elif not lines or missing:
+                errors.append((index, f"Error creating order {index}: Products not found: {missing}"))
+            elif any(stock[product_id] < quantity for product_id, quantity in lines.items()):
+                errors.append(
+                    (index, f"Error creating order {index}: One or more products are out of stock")
+                )
+            else:
+                for product_id, quantity in lines.items():
+                    stock[product_id] -= quantity
+                total_amount = order_total(
+                    products[product_id].price * quantity for product_id, quantity in lines.items()
+                )
+                accepted.append((Order(customer_id=customer_id, total_amount=total_amount), lines))
+
+        created = Order.objects.bulk_create(order for order, _ in accepted)
+        OrderItem.objects.bulk_create(
+            OrderItem(
+                order_id=order.pk,
+                product_id=product_id,
+                quantity=quantity,
+                unit_price=products[product_id].price,
+            )
+            for order, lines in accepted
+            for product_id, quantity in lines.items()
+        )
+
+        # One UPDATE per distinct decrement rather than one per product
+        decrements = {}
+        for product_id, product in products.items():
+            sold = (product.stock or 0) - stock[product_id]
+            if sold:
+                decrements.setdefault(sold, []).append(product_id)
+        for sold, product_ids in decrements.items():
+            Product.objects.filter(pk__in=product_ids).update(stock=F("stock") - sold)
+        request_restock(
+            product_id
+            for product_id, product in products.items()
+            if stock[product_id] < LOW_STOCK_THRESHOLD and stock[product_id] != (product.stock or 0)
+        )
+        add_order_stats(order_totals(created))
+        add_order_rollups(accepted)
+        if created:
+            invalidate(Product, Order, Customer)
+
+    return created, [message for _, message in sorted(errors)]
+
+
+def bulk_create_customers(customers, chunk_size=None):
+    """
+    Create many customers with set-based inserts.
+
+    Phones are validated up front, existing emails are fetched with one
+    ``email__in`` query per chunk, duplicates inside the batch are dropped
+    and the remaining rows are inserted with ``bulk_create``. Errors are
+    reported per row, in input order.
+
+    Returns a tuple of (created customers, error messages).
+    """
+    chunk_size = chunk_size or getattr(settings, "CRM_BULK_CHUNK_SIZE", 1000)
+    errors = [None] * len(customers)
+    candidates = []
+    for index, customer in enumerate(customers):
+        try:
+            phone_regex(customer.phone)
+        except Exception as e:
+            errors[index] = f"Error creating customer: {e}"
+        else:
+            candidates.append(index)
+
+    emails = list({customers[index].email for index in candidates})
+    existing = set()
+    for start in range(0, len(emails), chunk_size):
+        existing.update(
+            Customer.objects.filter(email__in=emails[start:start + chunk_size])
+            .values_list("email", flat=True)
+        )
+
+    pending = []
+    for index in candidates:
+        email = customers[index].email
+        if email in existing:
+            errors[index] = f"Error creating customer with email '{email}': Email already exists."
+        else:
+            existing.add(email)
+            pending.append(index)
+
+    created = []
+    for start in range(0, len(pending), chunk_size):
+        chunk = pending[start:start + chunk_size]
+        rows = [
+            Customer(
+                name=customers[index].name,
+                email=customers[index].email,
+                phone=customers[index].phone,
+            )
+            for index in chunk
+        ]
+        try:
+            with transaction.atomic():
+                created.extend(Customer.objects.bulk_create(rows))
+        except IntegrityError:
+            # Another request inserted some of these emails since we looked
+            chunk_emails = [row.email for row in rows]
+            taken = set(
+                Customer.objects.filter(email__in=chunk_emails).values_list("email", flat=True)
+            )
+            Customer.objects.bulk_create(
+                (row for row in rows if row.email not in taken), ignore_conflicts=True
+            )
+            inserted = Customer.objects.in_bulk(
+                [email for email in chunk_emails if email not in taken], field_name="email"
+            )
+            for index, row in zip(chunk, rows):
+                if row.email in inserted:
+                    created.append(inserted[row.email])
+                else:
+                    errors[index] = (
+                        f"Error creating customer with email '{row.email}': Email already exists."
+                    )
+
+    if created:
+        add_new_customers(created)
+        invalidate(Customer)
+    return created, [error for error in errors if error is not None]
+
+
+def update_returning_supported():
+    """
+    Whether UPDATE ... RETURNING is available: PostgreSQL, and SQLite from
+    3.35 (MariaDB only returns from INSERT and DELETE)
+    """
+    if connection.vendor == "postgresql":
+        return True
+    return connection.vendor == "sqlite" and connection.Database.sqlite_version_info >= (3, 35)
+
+
+def restock_low_stock_products(threshold=10, increment=10):
+    """
+    Add increment to the stock of every product below threshold.
+
+    The restock is a single ``UPDATE ... SET stock = stock + N``. Where the
+    backend supports ``UPDATE ... RETURNING`` the updated rows come back
+    from that same statement; otherwise they are locked, updated and
+    re-read inside one transaction.
+
+    Returns the list of updated products.
+    """
+    now = timezone.now()
+    if update_returning_supported():
+        table = Product._meta.db_table
+        columns = [field.column for field in Product._meta.concrete_fields]
+        qn = connection.ops.quote_name
+        where = f"{qn('stock')} < %s"
+        if threshold <= LOW_STOCK_THRESHOLD:
+            # Literal copy of the partial index predicate, so it can be used
+            where += f" AND {qn('stock')} < {int(LOW_STOCK_THRESHOLD)}"
+        sql = (
+            f"UPDATE {qn(table)} SET {qn('stock')} = {qn('stock')} + %s, {qn('updated_at')} = %s "
+            f"WHERE {where} RETURNING {', '.join(qn(column) for column in columns)}"
+        )
+        params = [increment, connection.ops.adapt_datetimefield_value(now), threshold]
+        with transaction.atomic():
+            products = list(Product.objects.raw(sql, params))
+            if products:
+                invalidate(Product)
+            return products
+
+    with transaction.atomic():
+        ids = list(
+            Product.objects.select_for_update()
+            .filter(stock__lt=threshold)
+            .values_list("pk", flat=True)
+        )
+        Product.objects.filter(pk__in=ids).update(stock=F("stock") + increment, updated_at=now)
+        if ids:
+            invalidate(Product)
+        return list(Product.objects.filter(pk__in=ids))
+
+
+def inactive_customers(cutoff):
+    """
+    Customers created before cutoff (a date) without an order since, as a
+    NOT EXISTS over the (customer, order_date) index
+    """
+    recent_orders = Order.objects.filter(customer=OuterRef("pk"), order_date__gte=cutoff)
+    created_before = datetime.combine(cutoff, datetime.min.time(), tzinfo=timezone.get_current_timezone())
+    return Customer.objects.filter(created_at__lt=created_before).filter(~Exists(recent_orders))
+
+
+def delete_inactive_customers(days=365, batch_size=None, pause=0, dry_run=False):
+    """
+    Delete customers without an order in the last ``days`` days, with
+    their orders.
+
+    Customers are deleted in batches of batch_size ids, taken in id order
+    from where the previous batch stopped. Each batch re-checks inactivity
+    and deletes in its own transaction, so locks are held for one batch
+    only, with pause seconds between batches. With dry_run nothing is
+    deleted and only the counts are reported.
+
+    Returns a summary dict.
+    """
+    batch_size = batch_size or getattr(settings, "CRM_BULK_CHUNK_SIZE", 1000)
+    cutoff = timezone.localdate() - timedelta(days=days)
+    inactive = inactive_customers(cutoff)
+    summary = {
+        "cutoff": cutoff.isoformat(),
+        "dry_run": dry_run,
+        "batch_size": batch_size,
+        "inactive_customers": 0,
+        "batches": 0,
+        "deleted": {},
+    }
+    start = time.perf_counter()
+
+    if dry_run:
+        summary["inactive_customers"] = inactive.count()
+        summary["orders"] = Order.objects.filter(customer__in=inactive.values("pk")).count()
+        summary["elapsed_seconds"] = round(time.perf_counter() - start, 3)
+        return summary
+
+    ids = inactive.order_by("pk").values_list("pk", flat=True)
+    last_pk = 0
+    while True:
+        batch = list(ids.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            break
+        if summary["batches"] and pause:
+            time.sleep(pause)
+        with transaction.atomic():
+            # An order placed since the batch was read keeps its customer
+            deleted, per_model = inactive.filter(pk__in=batch).delete()
+        summary["batches"] += 1
+        summary["inactive_customers"] += per_model.get(Customer._meta.label, 0)
+        for label, count in per_model.items():
+            summary["deleted"][label] = summary["deleted"].get(label, 0) + count
+        last_pk = batch[-1]
+
+    summary["elapsed_seconds"] = round(time.perf_counter() - start, 3)
+    return summary
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 
+from celery.schedules import crontab
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -46,6 +48,8 @@ INSTALLED_APPS = [
 
 CRONJOBS = [
     ('*/5 * * * *', 'crm.cron.log_crm_heartbeat'),
+    # Low stock is also restocked as orders come in (crm.restock); the sweep
+    # catches what that missed, e.g. while the broker was down
     ('0 */12 * * *', 'crm.cron.update_low_stock'),
 ]
 
@@ -55,6 +59,16 @@ CELERY_BEAT_SCHEDULE = {
         'schedule': crontab(day_of_week='mon', hour=6, minute=0),
         
     },
+    # Recompute yesterday's revenue rollup once the day is over
+    'close-revenue-day': {
+        'task': 'crm.tasks.close_revenue_day',
+        'schedule': crontab(hour=0, minute=15),
+    },
+    # Runs are per day, so a second trigger (e.g. the cron script) is a no-op
+    'send-order-reminders': {
+        'task': 'crm.tasks.send_order_reminders',
+        'schedule': crontab(hour=8, minute=0),
+    },
 }
 
 MIDDLEWARE = [
@@ -94,6 +108,12 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock when a transaction starts so concurrent
+            # checkouts queue up instead of failing with "database is locked"
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -134,6 +154,20 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # The web processes' shared cache (alx_backend_graphql/settings.py):
+    # restock_product releases the claims they made there
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://localhost:6379/1',
+        'OPTIONS': {'socket_connect_timeout': 1, 'socket_timeout': 1},
+    },
+}
+CRM_RESTOCK_CACHE_ALIAS = 'shared'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
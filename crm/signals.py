@@ -0,0 +1,50 @@
+"""
+This file contains the model signal receivers for the CRM app.
+"""
+
+from django.db.backends.signals import connection_created
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .models import LOW_STOCK_THRESHOLD, Customer, Order, Product
+from .response_cache import invalidate
+from .restock import request_restock
+from .rollups import add_new_customers
+from .search import forget_search_tables
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Customer)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Order)
+def invalidate_cached_responses(sender, **kwargs):
+    invalidate(sender)
+
+
+@receiver(m2m_changed, sender=Order.products.through)
+def invalidate_order_products(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        invalidate(Order)
+
+
+@receiver(post_save, sender=Customer)
+def count_new_customer(sender, instance, created, raw=False, **kwargs):
+    # bulk_create_customers counts its own rows, as bulk_create sends no signals
+    if created and not raw:
+        add_new_customers([instance])
+
+
+@receiver(post_save, sender=Product)
+def restock_low_stock_product(sender, instance, raw=False, **kwargs):
+    # Stock set directly (createProduct, the admin); order placement
+    # queues its own restocks
+    if not raw and instance.stock is not None and instance.stock < LOW_STOCK_THRESHOLD:
+        request_restock([instance.pk])
+
+
+@receiver(connection_created)
+def forget_search_index_tables(sender, connection, **kwargs):
+    # A new connection may see a database migrated since the last lookup
+    forget_search_tables(connection)
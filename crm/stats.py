@@ -0,0 +1,115 @@
+"""
+This file contains the upkeep of the denormalized customer order statistics.
+
+``Customer.order_count``, ``lifetime_value`` and ``last_order_date`` are
+bumped by the order services as orders are placed (``add_order_stats``)
+and can be recomputed from the orders table at any time
+(``rebuild_customer_stats``, also run by the ``rebuild_customer_stats``
+management command).
+"""
+
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import (
+    Count,
+    DecimalField,
+    F,
+    IntegerField,
+    Max,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+)
+from django.db.models.expressions import Case, When
+from django.db.models.functions import Coalesce
+
+from .models import Customer, Order
+
+
+def order_totals(orders):
+    """
+    Per-customer [order count, order value, last order date] of orders
+    """
+    totals = {}
+    for order in orders:
+        entry = totals.setdefault(order.customer_id, [0, Decimal("0"), order.order_date])
+        entry[0] += 1
+        entry[1] += order.total_amount
+        entry[2] = max(entry[2], order.order_date)
+    return totals
+
+
+def add_order_stats(totals, chunk_size=None):
+    """
+    Add per-customer order totals (see order_totals) to the customers'
+    statistics, with one UPDATE per chunk of customers
+    """
+    chunk_size = chunk_size or getattr(settings, "CRM_BULK_CHUNK_SIZE", 1000)
+    customer_ids = sorted(totals)
+    for start in range(0, len(customer_ids), chunk_size):
+        chunk = customer_ids[start:start + chunk_size]
+        count = Case(
+            *[When(pk=pk, then=Value(totals[pk][0])) for pk in chunk],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        value = Case(
+            *[When(pk=pk, then=Value(totals[pk][1])) for pk in chunk],
+            default=Value(Decimal("0")),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )
+        last_order_date = Case(
+            *[
+                When(
+                    Q(pk=pk) & (Q(last_order_date__isnull=True) | Q(last_order_date__lt=totals[pk][2])),
+                    then=Value(totals[pk][2]),
+                )
+                for pk in chunk
+            ],
+            default=F("last_order_date"),
+        )
+        Customer.objects.filter(pk__in=chunk).update(
+            order_count=F("order_count") + count,
+            lifetime_value=F("lifetime_value") + value,
+            last_order_date=last_order_date,
+        )
+
+
+def rebuild_customer_stats(batch_size=None, customer_model=Customer, order_model=Order):
+    """
+    Recompute every customer's statistics from the orders table.
+
+    Each batch of customers (by id range) is one UPDATE with correlated
+    subqueries, so no per-customer rows are loaded into Python. The models
+    can be swapped for historical ones in migrations. Returns the number
+    of customers updated.
+    """
+    batch_size = batch_size or getattr(settings, "CRM_BULK_CHUNK_SIZE", 1000)
+    orders = order_model.objects.filter(customer=OuterRef("pk")).order_by().values("customer")
+    money = DecimalField(max_digits=12, decimal_places=2)
+    stats = {
+        "order_count": Coalesce(
+            Subquery(orders.annotate(n=Count("pk")).values("n"), output_field=IntegerField()),
+            Value(0),
+        ),
+        "lifetime_value": Coalesce(
+            Subquery(orders.annotate(v=Sum("total_amount")).values("v"), output_field=money),
+            Value(Decimal("0")),
+            output_field=money,
+        ),
+        "last_order_date": Subquery(orders.annotate(d=Max("order_date")).values("d")),
+    }
+
+    updated = 0
+    last_pk = None
+    customers = customer_model.objects.order_by("pk").values_list("pk", flat=True)
+    while True:
+        batch = customers if last_pk is None else customers.filter(pk__gt=last_pk)
+        ids = list(batch[:batch_size])
+        if not ids:
+            return updated
+        updated += customer_model.objects.filter(pk__gte=ids[0], pk__lte=ids[-1]).update(**stats)
+        last_pk = ids[-1]
@@ -1,34 +1,67 @@
-import requests
 from celery import shared_task
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from django.utils import timezone
+
+from .models import Customer
+from . import reminders, restock
+from .rollups import close_day, rollup_totals
+
+
 @shared_task
 def generate_crm_report():
-    graphql_endpoint = "http://localhost:8000/graphql"
-    query = """
-        query {
-          allCustomers { totalCount }
-          allOrders { totalCount }
-        }
+    # Orders and revenue come from the daily rollups (one row per day)
+    # rather than from a scan of the orders table; the customer count is
+    # live, since deleted customers are not subtracted from the rollups
+    totals = rollup_totals()
+    customer_count = Customer.objects.count()
+    order_count = totals["order_count"]
+    total_revenue = totals["revenue"]
+
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    report_log = f"{timestamp} - Report: {customer_count} customers, {order_count} orders, {total_revenue} revenue."
+
+    with open('/tmp/crm_report_log.txt', 'a') as f:
+        f.write(report_log + '\n')
+
+    return f"Report generated: {report_log}"
+
+
+@shared_task
+def close_revenue_day(day=None):
     """
+    Recompute and close the revenue rollup of day (an ISO date, yesterday
+    by default) from the orders and customers tables
+    """
+    if day is None:
+        day = timezone.localdate() - timedelta(days=1)
+    else:
+        day = date.fromisoformat(day)
+    close_day(day)
+    return f"Closed revenue day {day.isoformat()}"
+
 
-    try:
-        response = requests.post(graphql_endpoint, json={"query": query})
-        response.raise_for_status()
-        data = response.json().get("data", {})
+@shared_task
+def send_order_reminders():
+    """
+    Fan today's order reminders out to send_reminder_chunk workers,
+    resuming today's run if it was interrupted (crm.reminders)
+    """
+    run = reminders.dispatch_reminders(send_reminder_chunk.delay)
+    return f"Dispatched {run.chunks_dispatched} reminder chunks for {run.run_date.isoformat()}"
 
-        customer_count = data.get('allCustomers', {}).get('totalCount', 0)
-        order_count = data.get('allOrders', {}).get('totalCount', 0)
-        
-        total_revenue = "N/A"
 
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        report_log = f"{timestamp} - Report: {customer_count} customers, {order_count} orders, {total_revenue} revenue."
+# Acknowledged only once done, so a chunk whose worker dies is redelivered
+@shared_task(acks_late=True, reject_on_worker_lost=True)
+def send_reminder_chunk(run_id, first_order_id, last_order_id):
+    sent = reminders.send_reminder_chunk(run_id, first_order_id, last_order_id)
+    return f"Sent {sent} order reminders"
 
-        with open('/tmp/crm_report_log.txt', 'a') as f:
-            f.write(report_log + '\n')
-        
-        return f"Report generated: {report_log}"
 
-    except requests.exceptions.RequestException as e:
-        print(f"Failed to connect to GraphQL endpoint: {e}")
-        return f"Failed to generate report: {e}"
\ No newline at end of file
+@shared_task
+def restock_product(product_id):
+    """
+    Restock one low-stock product, queued by crm.restock.request_restock
+    """
+    if restock.restock_product(product_id):
+        return f"Restocked product {product_id}"
+    return f"Product {product_id} no longer needs restocking"
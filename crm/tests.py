@@ -1,3 +1,1758 @@
-from django.test import TestCase
+from decimal import Decimal
+import asyncio
+import datetime
+import csv
+import io
+import json
+import threading
+from collections import Counter
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+import graphene
+from graphql import get_named_type, is_leaf_type, is_required_argument
+from django.db import connection, transaction
+from django.db.backends.signals import connection_created
+from django.db.models import F
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from .execution import ThreadedExecutionContext
+from .inprocess import InProcessContext, InProcessGraphQLError, execute_graphql
+from .fields import BatchedFilterConnectionField
+from . import cron
+from .filters import CustomerFilter, OrderFilter, ProductFilter
+from .models import (
+    Customer,
+    DailyProductSales,
+    DailyRevenue,
+    Order,
+    OrderItem,
+    OrderReminder,
+    Product,
+    ReminderRun,
+)
+from .instrumentation import METRICS, sql_shape
+from .persisted_queries import DOCUMENT_CACHE, query_hash
+from . import celery_app, reminders, restock, search
+from .rollups import rollup_totals
+from .schema import Mutation, OrderType, Query
+from .seed import seed_crm
+from .services import (
+    bulk_create_customers,
+    bulk_place_orders,
+    place_order,
+    update_returning_supported,
+)
+from .tasks import close_revenue_day, generate_crm_report, restock_product, send_order_reminders
+
+
+ORDERS_PAGE_QUERY = """
+    query ($first: Int) {
+        allOrders(first: $first) {
+            edges {
+                node {
+                    id
+                    totalAmount
+                    customer { email }
+                    products { edges { node { name } } }
+                }
+            }
+        }
+    }
+"""
+
+
+class WideQuery(Query):
+    all_orders = BatchedFilterConnectionField(
+        OrderType, filterset_class=OrderFilter, max_limit=500
+    )
+
+
+wide_schema = graphene.Schema(query=WideQuery, mutation=Mutation)
+
+
+def create_orders(count):
+    customers = Customer.objects.bulk_create(
+        Customer(name=f"Customer {i}", email=f"customer{i}@example.com")
+        for i in range(count)
+    )
+    products = Product.objects.bulk_create(
+        Product(name=f"Product {i}", price=Decimal("9.99"), stock=100)
+        for i in range(3)
+    )
+    orders = Order.objects.bulk_create(
+        Order(customer=customer, total_amount=Decimal("29.97"))
+        for customer in customers
+    )
+    Order.products.through.objects.bulk_create(
+        Order.products.through(order_id=order.pk, product_id=product.pk, unit_price=product.price)
+        for order in orders
+        for product in products
+    )
+    return orders
+
+
+def create_orders_for(customers):
+    return Order.objects.bulk_create(
+        Order(customer=customer, total_amount=Decimal("9.99")) for customer in customers
+    )
+
+
+class OrderLoaderTests(TestCase):
+    """
+    Order.customer and Order.products are batched per request
+    """
+
+    def execute(self, first):
+        with CaptureQueriesContext(connection) as queries:
+            result = wide_schema.execute(
+                ORDERS_PAGE_QUERY,
+                variables={"first": first},
+                context_value=SimpleNamespace(),
+            )
+        self.assertIsNone(result.errors)
+        return result.data, len(queries)
+
+    def test_query_count_is_independent_of_page_size(self):
+        create_orders(500)
+        small_page, small_count = self.execute(5)
+        large_page, large_count = self.execute(500)
+
+        self.assertEqual(len(small_page["allOrders"]["edges"]), 5)
+        self.assertEqual(len(large_page["allOrders"]["edges"]), 500)
+        self.assertEqual(small_count, large_count)
+        # count, page joined to customer, prefetched products
+        self.assertEqual(large_count, 3)
+
+    def test_loaders_batch_without_the_optimizer(self):
+        create_orders(20)
+        orders = list(Order.objects.all())
+        info = SimpleNamespace(context=SimpleNamespace())
+        with CaptureQueriesContext(connection) as queries:
+            OrderType.enqueue_loaders(info, orders)
+            for order in orders:
+                OrderType.resolve_customer(order, info)
+                OrderType.resolve_products(order, info)
+        # customers, products
+        self.assertEqual(len(queries), 2)
+
+    def test_loaded_relations_match_the_database(self):
+        orders = create_orders(3)
+        data, _ = self.execute(3)
+        edges = data["allOrders"]["edges"]
+        emails = [edge["node"]["customer"]["email"] for edge in edges]
+        self.assertEqual(emails, [order.customer.email for order in orders])
+        for edge in edges:
+            names = [product["node"]["name"] for product in edge["node"]["products"]["edges"]]
+            self.assertEqual(names, ["Product 0", "Product 1", "Product 2"])
+
+
+class QueryOptimizerTests(TestCase):
+    """
+    Connection querysets only join and select what the client asked for
+    """
+
+    def test_page_selects_only_requested_columns(self):
+        create_orders(3)
+        with CaptureQueriesContext(connection) as queries:
+            result = wide_schema.execute(
+                "{ allOrders(first: 3) { edges { node { totalAmount customer { email } } } } }",
+                context_value=SimpleNamespace(),
+            )
+        self.assertIsNone(result.errors)
+        page_sql = queries.captured_queries[-1]["sql"]
+        self.assertIn("INNER JOIN \"crm_customer\"", page_sql)
+        self.assertIn("\"crm_customer\".\"email\"", page_sql)
+        self.assertNotIn("\"crm_customer\".\"phone\"", page_sql)
+        self.assertNotIn("\"crm_order\".\"created_at\"", page_sql)
+
+    def test_fragments_are_followed(self):
+        create_orders(3)
+        with CaptureQueriesContext(connection) as queries:
+            result = wide_schema.execute(
+                """
+                query { allOrders(first: 3) { edges { node { ...OrderFields } } } }
+                fragment OrderFields on OrderType { customer { name } }
+                """,
+                context_value=SimpleNamespace(),
+            )
+        self.assertIsNone(result.errors)
+        self.assertEqual(len(queries), 2)
+
+
+CREATE_ORDER_MUTATION = """
+    mutation ($customer: Int!, $products: [Int]!) {
+        createOrder(order: {customer: $customer, products: $products}) {
+            order { id totalAmount }
+            message
+        }
+    }
+"""
+
+
+CREATE_ORDER_ITEMS_MUTATION = """
+    mutation ($customer: Int!, $products: [Int], $items: [OrderItemInput!]) {
+        createOrder(order: {customer: $customer, products: $products, items: $items}) {
+            order { totalAmount items { product { name } quantity unitPrice } }
+        }
+    }
+"""
+
+
+class CreateOrderTests(TestCase):
+    """
+    Order placement is transactional and never oversells
+    """
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name="Ada", email="ada@example.com")
+        self.pen = Product.objects.create(name="Pen", price=Decimal("1.50"), stock=2)
+        self.pad = Product.objects.create(name="Pad", price=Decimal("3.25"), stock=1)
+
+    def place(self, products):
+        return wide_schema.execute(
+            CREATE_ORDER_MUTATION,
+            variables={"customer": self.customer.pk, "products": products},
+            context_value=SimpleNamespace(),
+        )
+
+    def test_total_and_stock_are_updated(self):
+        result = self.place([self.pen.pk, self.pad.pk])
+        self.assertIsNone(result.errors)
+        self.assertEqual(result.data["createOrder"]["order"]["totalAmount"], "4.75")
+        self.pen.refresh_from_db()
+        self.pad.refresh_from_db()
+        self.assertEqual((self.pen.stock, self.pad.stock), (1, 0))
+        order = Order.objects.get()
+        self.assertEqual(set(order.products.values_list("pk", flat=True)), {self.pen.pk, self.pad.pk})
+
+    def test_out_of_stock_rolls_back(self):
+        self.place([self.pad.pk])
+        result = self.place([self.pen.pk, self.pad.pk])
+        self.assertIn("out of stock", result.errors[0].message)
+        self.pen.refresh_from_db()
+        self.assertEqual(self.pen.stock, 2)
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_unknown_product_is_rejected(self):
+        result = self.place([self.pen.pk, 9999])
+        self.assertIn("Products not found", result.errors[0].message)
+        self.assertFalse(Order.objects.exists())
+
+    def place_items(self, items, products=()):
+        return wide_schema.execute(
+            CREATE_ORDER_ITEMS_MUTATION,
+            variables={"customer": self.customer.pk, "products": list(products), "items": items},
+            context_value=SimpleNamespace(),
+        )
+
+    def test_quantities(self):
+        with CaptureQueriesContext(connection) as queries:
+            result = self.place_items([{"product": self.pen.pk, "quantity": 2}], products=[self.pad.pk])
+        self.assertIsNone(result.errors)
+        # Both lines, with different quantities, in one stock UPDATE
+        stock_updates = [
+            query["sql"] for query in queries if query["sql"].startswith('UPDATE "crm_product"')
+        ]
+        self.assertEqual(len(stock_updates), 1)
+        order = result.data["createOrder"]["order"]
+        self.assertEqual(order["totalAmount"], "6.25")
+        self.assertEqual(
+            [(item["product"]["name"], item["quantity"], item["unitPrice"]) for item in order["items"]],
+            [("Pen", 2, "1.50"), ("Pad", 1, "3.25")],
+        )
+        self.pen.refresh_from_db()
+        self.assertEqual(self.pen.stock, 0)
+        self.assertEqual(DailyProductSales.objects.get(product=self.pen).units, 2)
+
+    def test_quantity_beyond_stock_rolls_back(self):
+        result = self.place_items([{"product": self.pen.pk, "quantity": 3}])
+        self.assertIn("out of stock", result.errors[0].message)
+        self.pen.refresh_from_db()
+        self.assertEqual(self.pen.stock, 2)
+
+    def test_one_short_line_rolls_back_the_others(self):
+        result = self.place_items(
+            [{"product": self.pen.pk, "quantity": 2}, {"product": self.pad.pk, "quantity": 2}]
+        )
+        self.assertIn("out of stock", result.errors[0].message)
+        self.pen.refresh_from_db()
+        self.pad.refresh_from_db()
+        self.assertEqual((self.pen.stock, self.pad.stock), (2, 1))
+        self.assertFalse(Order.objects.exists())
+
+    def test_quantity_must_be_positive(self):
+        result = self.place_items([{"product": self.pen.pk, "quantity": 0}])
+        self.assertIn("must be at least 1", result.errors[0].message)
+        self.assertFalse(Order.objects.exists())
+
+
+BULK_CREATE_ORDERS_MUTATION = """
+    mutation ($orders: [OrderInput!]!) {
+        bulkCreateOrders(orders: $orders) {
+            orders { totalAmount customer { email } }
+            errors
+        }
+    }
+"""
+
+
+class BulkCreateOrdersTests(TestCase):
+    """
+    Bulk order import is set-based and reports errors per item
+    """
+
+    def test_valid_orders_are_created_and_invalid_ones_reported(self):
+        customer = Customer.objects.create(name="Ada", email="ada@example.com")
+        pen = Product.objects.create(name="Pen", price=Decimal("1.50"), stock=1)
+        pad = Product.objects.create(name="Pad", price=Decimal("3.25"), stock=5)
+        orders = [
+            {"customer": customer.pk, "products": [pen.pk, pad.pk]},
+            {"customer": 9999, "products": [pad.pk]},
+            {"customer": customer.pk, "products": [pen.pk]},
+            {"customer": customer.pk, "products": [pad.pk, 9999]},
+            {"customer": customer.pk, "products": [pad.pk]},
+        ]
+        result = wide_schema.execute(
+            BULK_CREATE_ORDERS_MUTATION,
+            variables={"orders": orders},
+            context_value=SimpleNamespace(),
+        )
+        self.assertIsNone(result.errors)
+        data = result.data["bulkCreateOrders"]
+        self.assertEqual([o["totalAmount"] for o in data["orders"]], ["4.75", "3.25"])
+        self.assertEqual(len(data["errors"]), 3)
+        self.assertIn("order 1: Customer not found", data["errors"][0])
+        self.assertIn("order 2: One or more products are out of stock", data["errors"][1])
+        self.assertIn("order 3: Products not found", data["errors"][2])
+        pen.refresh_from_db()
+        pad.refresh_from_db()
+        self.assertEqual((pen.stock, pad.stock), (0, 3))
+        self.assertEqual(Order.products.through.objects.count(), 3)
+
+    def test_query_count_is_independent_of_batch_size(self):
+        customer = Customer.objects.create(name="Ada", email="ada@example.com")
+        pen = Product.objects.create(name="Pen", price=Decimal("1.50"), stock=10000)
+
+        def run(count):
+            orders = [{"customer": customer.pk, "products": [pen.pk]}] * count
+            with CaptureQueriesContext(connection) as queries:
+                result = wide_schema.execute(
+                    BULK_CREATE_ORDERS_MUTATION,
+                    variables={"orders": orders},
+                    context_value=SimpleNamespace(),
+                )
+            self.assertIsNone(result.errors)
+            return len(queries)
+
+        # SQLite caps bound parameters per statement, so Django splits very
+        # large inserts into batches; stay below that to compare like for like
+        self.assertEqual(run(2), run(150))
+
+    def test_items_with_quantities(self):
+        customer = Customer.objects.create(name="Ada", email="ada@example.com")
+        pen = Product.objects.create(name="Pen", price=Decimal("1.50"), stock=5)
+        orders = [
+            {"customer": customer.pk, "items": [{"product": pen.pk, "quantity": 4}]},
+            {"customer": customer.pk, "items": [{"product": pen.pk, "quantity": 0}]},
+            {"customer": customer.pk, "items": [{"product": pen.pk, "quantity": 2}]},
+            {"customer": customer.pk, "products": [pen.pk]},
+        ]
+        result = wide_schema.execute(
+            BULK_CREATE_ORDERS_MUTATION,
+            variables={"orders": orders},
+            context_value=SimpleNamespace(),
+        )
+        self.assertIsNone(result.errors)
+        data = result.data["bulkCreateOrders"]
+        self.assertEqual([o["totalAmount"] for o in data["orders"]], ["6.00", "1.50"])
+        self.assertIn("order 1: Quantity", data["errors"][0])
+        self.assertIn("order 2: One or more products are out of stock", data["errors"][1])
+        pen.refresh_from_db()
+        self.assertEqual(pen.stock, 0)
+        self.assertEqual(sorted(OrderItem.objects.values_list("quantity", flat=True)), [1, 4])
+
+
+BULK_CREATE_CUSTOMERS_MUTATION = """
+    mutation ($customers: [CustomerInput]!, $chunkSize: Int) {
+        bulkCreateCustomers(customers: $customers, chunkSize: $chunkSize) {
+            customers { id email }
+            errors
+        }
+    }
+"""
+
+
+class BulkCreateCustomersTests(TestCase):
+    """
+    Bulk customer creation is set-based and keeps per-row errors
+    """
+
+    def run_mutation(self, customers, chunk_size=None):
+        with CaptureQueriesContext(connection) as queries:
+            result = wide_schema.execute(
+                BULK_CREATE_CUSTOMERS_MUTATION,
+                variables={"customers": customers, "chunkSize": chunk_size},
+                context_value=SimpleNamespace(),
+            )
+        self.assertIsNone(result.errors)
+        return result.data["bulkCreateCustomers"], len(queries)
+
+    def test_errors_are_reported_per_row(self):
+        Customer.objects.create(name="Old", email="old@example.com")
+        data, _ = self.run_mutation([
+            {"name": "A", "email": "a@example.com", "phone": "+1234567890"},
+            {"name": "B", "email": "b@example.com", "phone": "not-a-phone"},
+            {"name": "Old", "email": "old@example.com", "phone": "+1234567890"},
+            {"name": "A again", "email": "a@example.com", "phone": "+1234567890"},
+            {"name": "C", "email": "c@example.com", "phone": "+1234567891"},
+        ])
+        self.assertEqual([c["email"] for c in data["customers"]], ["a@example.com", "c@example.com"])
+        self.assertTrue(all(c["id"] for c in data["customers"]))
+        self.assertEqual(len(data["errors"]), 3)
+        self.assertIn("Phone number must be entered", data["errors"][0])
+        self.assertEqual(
+            data["errors"][1],
+            "Error creating customer with email 'old@example.com': Email already exists.",
+        )
+        self.assertEqual(
+            data["errors"][2],
+            "Error creating customer with email 'a@example.com': Email already exists.",
+        )
+        self.assertEqual(Customer.objects.count(), 3)
+
+    def test_query_count_depends_on_chunks_not_rows(self):
+        def batch(prefix, count):
+            return [
+                {"name": prefix, "email": f"{prefix}{i}@example.com", "phone": "+1234567890"}
+                for i in range(count)
+            ]
+
+        _, small = self.run_mutation(batch("small", 5), chunk_size=100)
+        _, large = self.run_mutation(batch("large", 100), chunk_size=100)
+        self.assertEqual(small, large)
+        self.assertEqual(Customer.objects.count(), 105)
+
+
+class UpdateLowStockProductsTests(TestCase):
+    """
+    Restocking is a single UPDATE regardless of how many products match
+    """
+
+    def restock(self, arguments=""):
+        with CaptureQueriesContext(connection) as queries:
+            result = wide_schema.execute(
+                f"mutation {{ updateLowStockProducts{arguments} {{ updatedProducts {{ name stock price }} message }} }}",
+                context_value=SimpleNamespace(),
+            )
+        self.assertIsNone(result.errors)
+        writes = [q["sql"] for q in queries.captured_queries if q["sql"].startswith("UPDATE")]
+        return result.data["updateLowStockProducts"], writes
+
+    def test_defaults_restock_below_ten_by_ten(self):
+        Product.objects.bulk_create(
+            Product(name=f"Low {i}", price=Decimal("2.50"), stock=i) for i in range(12)
+        )
+        data, writes = self.restock()
+        self.assertEqual(len(writes), 1)
+        if update_returning_supported():
+            self.assertIn("RETURNING", writes[0])
+        self.assertEqual(data["message"], "Successfully updated stock for 10 products.")
+        self.assertEqual(
+            sorted(p["stock"] for p in data["updatedProducts"]), list(range(10, 20))
+        )
+        self.assertEqual(data["updatedProducts"][0]["price"], "2.50")
+        self.assertEqual(Product.objects.filter(stock__lt=10).count(), 0)
+
+    def test_threshold_and_increment_arguments(self):
+        low = Product.objects.create(name="Low", price=Decimal("1.00"), stock=3)
+        Product.objects.create(name="High", price=Decimal("1.00"), stock=30)
+        data, _ = self.restock("(threshold: 5, increment: 100)")
+        self.assertEqual(data["updatedProducts"], [{"name": "Low", "stock": 103, "price": "1.00"}])
+        low.refresh_from_db()
+        self.assertEqual(low.stock, 103)
+
+    def test_fallback_without_update_returning(self):
+        Product.objects.create(name="Low", price=Decimal("1.00"), stock=3)
+        with mock.patch("crm.services.update_returning_supported", return_value=False):
+            data, writes = self.restock()
+        self.assertEqual(len(writes), 1)
+        self.assertNotIn("RETURNING", writes[0])
+        self.assertEqual(data["updatedProducts"], [{"name": "Low", "stock": 13, "price": "1.00"}])
+
+
+class IndexedFilterTests(TestCase):
+    """
+    Filters rewritten to be index-friendly keep their semantics
+    """
+
+    def test_phone_pattern_matches_prefix_only(self):
+        Customer.objects.create(name="A", email="a@example.com", phone="+15551234")
+        Customer.objects.create(name="B", email="b@example.com", phone="+15561234")
+        Customer.objects.create(name="C", email="c@example.com", phone="15551234")
+        filterset = CustomerFilter(data={"phone_pattern": "+1555"}, queryset=Customer.objects.all())
+        self.assertEqual([c.name for c in filterset.qs], ["A"])
+
+    def test_low_stock_matches_any_threshold(self):
+        for stock in (0, 4, 9, 10, 25):
+            Product.objects.create(name=f"P{stock}", price=Decimal("1.00"), stock=stock)
+        for value, expected in ((5, 2), (10, 3), (30, 5)):
+            filterset = ProductFilter(data={"low_stock": value}, queryset=Product.objects.all())
+            self.assertEqual(filterset.qs.count(), expected)
+
+
+class KeysetPaginationTests(TestCase):
+    """
+    Keyset connections page by sort key and only count on demand
+    """
+
+    QUERY = """
+        query ($first: Int, $after: String, $last: Int, $before: String) {
+            allOrdersKeyset(first: $first, after: $after, last: $last, before: $before) {
+                edges { node { id } }
+                pageInfo { hasNextPage hasPreviousPage startCursor endCursor }
+            }
+        }
+    """
+
+    def setUp(self):
+        self.orders = create_orders(25)
+
+    def execute(self, query, **variables):
+        with CaptureQueriesContext(connection) as queries:
+            result = wide_schema.execute(query, variables=variables, context_value=SimpleNamespace())
+        self.assertIsNone(result.errors)
+        return result.data, [q["sql"] for q in queries.captured_queries]
+
+    def ids(self, data):
+        return [edge["node"]["id"] for edge in data["allOrdersKeyset"]["edges"]]
+
+    def test_forward_pages_cover_every_row_once(self):
+        seen = []
+        after = None
+        while True:
+            data, sql = self.execute(self.QUERY, first=10, after=after)
+            self.assertFalse(any("COUNT(" in statement for statement in sql))
+            self.assertFalse(any("OFFSET" in statement for statement in sql))
+            seen.extend(self.ids(data))
+            page_info = data["allOrdersKeyset"]["pageInfo"]
+            if not page_info["hasNextPage"]:
+                break
+            after = page_info["endCursor"]
+        expected = [graphene.relay.Node.to_global_id("OrderType", order.pk) for order in self.orders]
+        self.assertEqual(seen, expected)
+
+    def test_backward_page_mirrors_forward_page(self):
+        forward, _ = self.execute(self.QUERY, first=25)
+        cursor = forward["allOrdersKeyset"]["pageInfo"]["endCursor"]
+        backward, _ = self.execute(self.QUERY, last=5, before=cursor)
+        self.assertEqual(self.ids(backward), self.ids(forward)[19:24])
+        self.assertTrue(backward["allOrdersKeyset"]["pageInfo"]["hasPreviousPage"])
+
+    def test_negative_page_size_is_rejected(self):
+        for name in ("first", "last"):
+            keyset = wide_schema.execute(self.QUERY, variables={name: -1}, context_value=SimpleNamespace())
+            offset = wide_schema.execute(
+                f"{{ allOrders({name}: -1) {{ edges {{ node {{ id }} }} }} }}",
+                context_value=SimpleNamespace(),
+            )
+            self.assertEqual(keyset.errors[0].message, f"Argument '{name}' must be a non-negative integer.")
+            self.assertEqual(keyset.errors[0].message, offset.errors[0].message)
+
+    def test_ordering_is_fixed(self):
+        fields = wide_schema.graphql_schema.query_type.fields
+        self.assertIn("orderBy", fields["allCustomers"].args)
+        self.assertNotIn("orderBy", fields["allCustomersKeyset"].args)
+        self.assertIn("search", fields["allCustomersKeyset"].args)
+        self.assertIn("Ordered by created_at, id", fields["allCustomersKeyset"].description)
+        result = wide_schema.execute(
+            '{ allCustomersKeyset(first: 5, orderBy: "name") { edges { node { id } } } }',
+            context_value=SimpleNamespace(),
+        )
+        self.assertIn('Unknown argument \'orderBy\'', result.errors[0].message)
+
+    def test_total_count_is_lazy(self):
+        _, sql = self.execute("{ allOrdersKeyset(first: 5) { edges { node { id } } } }")
+        self.assertFalse(any("COUNT(" in statement for statement in sql))
+        data, sql = self.execute("{ allOrdersKeyset(first: 5) { totalCount } }")
+        self.assertEqual(data["allOrdersKeyset"]["totalCount"], 25)
+        self.assertTrue(any("COUNT(" in statement for statement in sql))
+
+
+class SearchFilterTests(TestCase):
+    """
+    icontains filters and search: go through the trigram index
+    """
+
+    def setUp(self):
+        self.alice = Customer.objects.create(name="Alice Smith", email="alice@example.com")
+        self.bob = Customer.objects.create(name="Bob Jones", email="bob@alicorp.io")
+        self.carol = Customer.objects.create(name="Carol", email="carol@example.com")
+
+    def names(self, filterset_class, data, queryset):
+        filterset = filterset_class(data=data, queryset=queryset)
+        self.assertTrue(filterset.is_valid())
+        return [obj.name for obj in filterset.qs]
+
+    def test_icontains_filters_use_the_index(self):
+        queryset = Customer.objects.all()
+        filterset = CustomerFilter(data={"name": "smi"}, queryset=queryset)
+        self.assertIn("MATCH", str(filterset.qs.query))
+        self.assertEqual(self.names(CustomerFilter, {"name": "SMI"}, queryset), ["Alice Smith"])
+        self.assertEqual(self.names(CustomerFilter, {"email": "alic"}, queryset), ["Alice Smith", "Bob Jones"])
+        # Too short for a trigram: falls back to LIKE
+        self.assertEqual(self.names(CustomerFilter, {"name": "ar"}, queryset), ["Carol"])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.carol.name = "Caroline Smithers"
+        self.carol.save()
+        self.alice.delete()
+        self.assertEqual(
+            self.names(CustomerFilter, {"name": "smith"}, Customer.objects.all()),
+            ["Caroline Smithers"],
+        )
+
+    def test_related_filters(self):
+        pen = Product.objects.create(name="Fountain pen", price=Decimal("5.00"), stock=5)
+        order = Order.objects.create(customer=self.bob, total_amount=Decimal("5.00"))
+        order.products.add(pen, through_defaults={"unit_price": pen.price})
+        Order.objects.create(customer=self.alice, total_amount=Decimal("1.00"))
+        for data in ({"customer_name": "jones"}, {"product_name": "ntain"}):
+            filterset = OrderFilter(data=data, queryset=Order.objects.all())
+            self.assertEqual(list(filterset.qs), [order])
+
+    def test_index_only_follows_the_indexed_columns(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name LIKE '%_search_au'"
+            )
+            triggers = sorted(sql for sql, in cursor.fetchall())
+        self.assertEqual(len(triggers), 2)
+        self.assertIn('AFTER UPDATE OF "name", "email" ON "crm_customer"', triggers[0])
+        self.assertIn('AFTER UPDATE OF "name" ON "crm_product"', triggers[1])
+
+    def test_falls_back_to_icontains_without_the_index(self):
+        # As on a database migrated by SQLite < 3.34, whatever runs it now
+        tables = [name for name in connection.introspection.table_names() if not name.endswith("_search")]
+        search.forget_search_tables(connection)
+        self.addCleanup(search.forget_search_tables, connection)
+        with mock.patch.object(connection.introspection, "table_names", return_value=tables):
+            filterset = CustomerFilter(data={"name": "smi"}, queryset=Customer.objects.all())
+            self.assertNotIn("MATCH", str(filterset.qs.query))
+            self.assertEqual([c.name for c in filterset.qs], ["Alice Smith"])
+            self.assertEqual(
+                self.names(CustomerFilter, {"search": "alice example"}, Customer.objects.all()),
+                ["Alice Smith"],
+            )
+
+    def test_index_lookup_once_per_connection(self):
+        search.forget_search_tables(connection)
+        with mock.patch.object(
+            connection.introspection, "table_names", wraps=connection.introspection.table_names
+        ) as table_names:
+            for data in ({"name": "smi"}, {"email": "alic"}, {"search": "alice"}):
+                self.names(CustomerFilter, data, Customer.objects.all())
+            self.assertEqual(table_names.call_count, 1)
+            connection_created.send(sender=connection.__class__, connection=connection)
+            self.names(CustomerFilter, {"name": "smi"}, Customer.objects.all())
+            self.assertEqual(table_names.call_count, 2)
+
+    def test_search_ranks_and_requires_every_word(self):
+        Customer.objects.create(name="Smith", email="smith@smith.com")
+        result = self.names(CustomerFilter, {"search": "smith"}, Customer.objects.all())
+        self.assertEqual(set(result), {"Smith", "Alice Smith"})
+        self.assertEqual(result[0], "Smith")
+        self.assertEqual(
+            self.names(CustomerFilter, {"search": "alice example"}, Customer.objects.all()),
+            ["Alice Smith"],
+        )
+
+
+class InstrumentationTests(TestCase):
+    """
+    Resolver/SQL instrumentation is reported in extensions and /metrics
+    """
+
+    def setUp(self):
+        METRICS.reset()
+        staff = User.objects.create_user("staff", is_staff=True)
+        self.client.force_login(staff)
+
+    def post(self, query, **headers):
+        response = self.client.post(
+            "/graphql/", {"query": query}, content_type="application/json", headers=headers
+        )
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_no_report_without_the_debug_header(self):
+        body = self.post("{ allCustomers { edges { node { name } } } }")
+        self.assertNotIn("instrumentation", body.get("extensions", {}))
+
+    def test_no_report_for_anonymous_users(self):
+        self.client.logout()
+        body = self.post("{ allCustomers { edges { node { name } } } }", **{"X-CRM-Debug": "1"})
+        self.assertNotIn("instrumentation", body.get("extensions", {}))
+        with override_settings(DEBUG=True):
+            body = self.post("{ allCustomers { edges { node { name } } } }", **{"X-CRM-Debug": "1"})
+        self.assertIn("instrumentation", body["extensions"])
+
+    def test_debug_header_reports_resolvers_and_sql(self):
+        create_orders(3)
+        body = self.post(
+            "query Orders { allOrders { edges { node { customer { email } } } } }",
+            **{"X-CRM-Debug": "1"},
+        )
+        report = body["extensions"]["instrumentation"]
+        self.assertEqual(report["operation"], "Orders")
+        self.assertEqual(report["sql"]["count"], 2)
+        self.assertEqual(report["resolvers"]["Query.allOrders"]["calls"], 1)
+        self.assertEqual(report["resolvers"]["OrderType.customer"]["calls"], 3)
+        self.assertEqual(report["nPlusOne"], [])
+
+    def test_repeated_sql_shapes_are_flagged(self):
+        customer = Customer.objects.create(name="Ada", email="ada@example.com")
+        aliases = " ".join(f'c{i}: customer(id: {customer.pk}) {{ name }}' for i in range(12))
+        body = self.post(f"{{ {aliases} }}", **{"X-CRM-Debug": "1"})
+        repeated = body["extensions"]["instrumentation"]["nPlusOne"]
+        self.assertEqual(len(repeated), 1)
+        self.assertEqual(repeated[0]["count"], 12)
+
+    def test_metrics_endpoint(self):
+        self.post("query Ping { allProducts { edges { node { name } } } }", **{"X-CRM-Debug": "1"})
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertIn('crm_graphql_operations_total{operation="Ping"}', text)
+        self.assertIn('crm_graphql_resolver_calls_total{field="Query.allProducts"}', text)
+
+    def test_metric_labels_are_bounded(self):
+        # Aliases do not make new series
+        self.post("{ a: allProducts { edges { node { name } } } }", **{"X-CRM-Debug": "1"})
+        self.post("{ b: allProducts { edges { node { name } } } }", **{"X-CRM-Debug": "1"})
+        text = self.client.get("/metrics").content.decode()
+        self.assertIn('crm_graphql_resolver_calls_total{field="Query.allProducts"} 2.0', text)
+        self.assertNotIn('path="', text)
+        with override_settings(CRM_METRICS_MAX_OPERATIONS=2):
+            for name in ("One", "Two", "Three"):
+                self.post(f"query {name} {{ allProducts {{ totalCount }} }}", **{"X-CRM-Debug": "1"})
+        text = self.client.get("/metrics").content.decode()
+        # "anonymous" and "One" took the two labels
+        self.assertIn('crm_graphql_operations_total{operation="One"} 1.0', text)
+        self.assertIn('crm_graphql_operations_total{operation="other"} 2.0', text)
+
+
+class PersistedQueryTests(TestCase):
+    """
+    Documents are cached by hash and the APQ register-on-miss protocol works
+    """
+
+    QUERY = "query Names { allCustomers { edges { node { name } } } }"
+
+    def setUp(self):
+        DOCUMENT_CACHE.clear()
+        Customer.objects.create(name="Ada", email="ada@example.com")
+
+    def post(self, body):
+        return self.client.post("/graphql/", body, content_type="application/json")
+
+    def persisted(self, sha256_hash, query=None):
+        body = {"extensions": {"persistedQuery": {"version": 1, "sha256Hash": sha256_hash}}}
+        if query is not None:
+            body["query"] = query
+        return self.post(body)
+
+    def test_hash_only_miss_then_register(self):
+        sha = query_hash(self.QUERY)
+        body = self.persisted(sha).json()
+        self.assertEqual(body["errors"][0]["message"], "PersistedQueryNotFound")
+        self.assertEqual(body["errors"][0]["extensions"]["code"], "PERSISTED_QUERY_NOT_FOUND")
+
+        registered = self.persisted(sha, self.QUERY).json()
+        self.assertEqual(registered["data"]["allCustomers"]["edges"][0]["node"]["name"], "Ada")
+
+        cached = self.persisted(sha).json()
+        self.assertEqual(cached, registered)
+        self.assertEqual((DOCUMENT_CACHE.hits, DOCUMENT_CACHE.misses), (1, 2))
+
+    def test_hash_mismatch_is_rejected(self):
+        body = self.persisted("0" * 64, self.QUERY).json()
+        self.assertEqual(body["errors"][0]["extensions"]["code"], "INVALID_SHA256_HASH")
+        self.assertEqual(len(DOCUMENT_CACHE), 0)
+
+    def test_get_request_with_hash(self):
+        self.persisted(query_hash(self.QUERY), self.QUERY)
+        extensions = '{"persistedQuery": {"version": 1, "sha256Hash": "%s"}}' % query_hash(self.QUERY)
+        response = self.client.get("/graphql/", {"extensions": extensions}, headers={"Accept": "application/json"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("allCustomers", response.json()["data"])
+
+    def test_plain_queries_skip_parse_and_validate_when_cached(self):
+        self.post({"query": self.QUERY})
+        with mock.patch("crm.views.validate") as validate, mock.patch("crm.views.parse") as parse:
+            body = self.post({"query": self.QUERY}).json()
+        validate.assert_not_called()
+        parse.assert_not_called()
+        self.assertIn("allCustomers", body["data"])
+
+    def test_invalid_documents_are_not_cached(self):
+        body = self.post({"query": "{ allCustomers { nope } }"}).json()
+        self.assertIn("errors", body)
+        self.assertEqual(len(DOCUMENT_CACHE), 0)
+
+    def test_lru_eviction(self):
+        cache = type(DOCUMENT_CACHE)(maxsize=2)
+        for key in ("a", "b"):
+            cache.put(key, key)
+        cache.get("a")
+        cache.put("c", "c")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "a")
+
+    def test_hit_miss_metrics(self):
+        self.post({"query": self.QUERY})
+        self.post({"query": self.QUERY})
+        text = self.client.get("/metrics").content.decode()
+        self.assertIn('crm_graphql_document_cache_total{result="hit"}', text)
+        self.assertIn('crm_graphql_document_cache_total{result="miss"}', text)
+
+
+@override_settings(CRM_RESPONSE_CACHE_ENABLED=True, DEBUG=True)
+class ResponseCacheTests(TestCase):
+    """
+    Query responses are cached and evicted by writes to the models they read
+    """
+
+    PRODUCTS = "query Products { allProducts { edges { node { name stock } } } }"
+    CUSTOMERS = "query Customers { allCustomers { edges { node { name } } } }"
+
+    def setUp(self):
+        cache.clear()
+        self.product = Product.objects.create(name="Laptop", price=Decimal("999.99"), stock=3)
+        Customer.objects.create(name="Ada", email="ada@example.com")
+
+    def post(self, query, variables=None):
+        body = {"query": query}
+        if variables is not None:
+            body["variables"] = variables
+        response = self.client.post(
+            "/graphql/", body, content_type="application/json", headers={"X-CRM-Debug": "1"}
+        )
+        return response.json()
+
+    def stocks(self, body):
+        return [edge["node"]["stock"] for edge in body["data"]["allProducts"]["edges"]]
+
+    def test_repeated_query_is_served_from_cache(self):
+        first = self.post(self.PRODUCTS)
+        self.assertEqual(first["extensions"]["responseCache"], "miss")
+        second = self.post(self.PRODUCTS)
+        self.assertEqual(second["extensions"]["responseCache"], "hit")
+        self.assertEqual(second["extensions"]["instrumentation"]["sql"]["count"], 0)
+        self.assertEqual(second["data"], first["data"])
+
+    def test_variables_are_part_of_the_key(self):
+        query = "query P($id: ID!) { product(id: $id) { name } }"
+        self.post(query, {"id": self.product.pk})
+        body = self.post(query, {"id": self.product.pk + 1})
+        self.assertEqual(body["extensions"]["responseCache"], "miss")
+
+    def test_save_evicts_entries_that_read_the_model(self):
+        self.post(self.PRODUCTS)
+        self.post(self.CUSTOMERS)
+        self.product.stock = 7
+        self.product.save()
+        products = self.post(self.PRODUCTS)
+        self.assertEqual(products["extensions"]["responseCache"], "miss")
+        self.assertEqual(self.stocks(products), [7])
+        self.assertEqual(self.post(self.CUSTOMERS)["extensions"]["responseCache"], "hit")
+
+    def test_update_low_stock_products_evicts_products(self):
+        self.post(self.PRODUCTS)
+        self.post("mutation { updateLowStockProducts { message } }")
+        self.assertEqual(self.stocks(self.post(self.PRODUCTS)), [13])
+
+    def test_create_order_evicts_products_and_orders(self):
+        customer = Customer.objects.get()
+        orders = "{ allOrders { edges { node { totalAmount } } } }"
+        self.post(orders)
+        self.post(self.PRODUCTS)
+        self.post(
+            "mutation ($c: Int!, $p: [Int]!) { createOrder(order: {customer: $c, products: $p}) { message } }",
+            {"c": customer.pk, "p": [self.product.pk]},
+        )
+        self.assertEqual(len(self.post(orders)["data"]["allOrders"]["edges"]), 1)
+        self.assertEqual(self.stocks(self.post(self.PRODUCTS)), [2])
+
+    def test_bulk_create_customers_evicts_customers(self):
+        self.post(self.CUSTOMERS)
+        Product.objects.create(name="Mouse", price=Decimal("9.99"), stock=1)
+        self.assertEqual(self.post(self.CUSTOMERS)["extensions"]["responseCache"], "hit")
+        self.post(
+            'mutation { bulkCreateCustomers(customers: [{name: "Bob", email: "bob@example.com", phone: "+12025550123"}]) { errors } }'
+        )
+        body = self.post(self.CUSTOMERS)
+        self.assertEqual(len(body["data"]["allCustomers"]["edges"]), 2)
+
+    def test_mutations_are_not_cached(self):
+        mutation = "mutation { updateLowStockProducts { message } }"
+        self.post(mutation)
+        self.assertNotIn("responseCache", self.post(mutation).get("extensions", {}))
+
+
+class QueryCostTests(TestCase):
+    """
+    Operations are costed before execution and rejected over the limits
+    """
+
+    def post(self, query, variables=None):
+        body = {"query": query}
+        if variables is not None:
+            body["variables"] = variables
+        return self.client.post("/graphql/", body, content_type="application/json").json()
+
+    def test_cost_is_reported(self):
+        body = self.post("{ allOrders(first: 20) { edges { node { customer { name } } } } }")
+        # allOrders + 20 x (edges + node + customer)
+        self.assertEqual(body["extensions"]["cost"]["requested"], 61)
+        self.assertEqual(body["extensions"]["cost"]["depth"], 5)
+
+    def test_nested_connections_multiply(self):
+        query = """
+            query ($n: Int) {
+                allOrders(first: $n) { edges { node { products { edges { node { name } } } } } }
+            }
+        """
+        small = self.post(query, {"n": 1})["extensions"]["cost"]["requested"]
+        large = self.post(query, {"n": 50})["extensions"]["cost"]["requested"]
+        # products is not paginated, so it is costed at the fan-out estimate
+        self.assertEqual(small, 1 + 1 * (1 + 1 + (1 + 10 * 2)))
+        self.assertEqual(large, 1 + 50 * (1 + 1 + (1 + 10 * 2)))
+
+    def test_first_above_the_cap_is_rejected_before_execution(self):
+        with CaptureQueriesContext(connection) as queries:
+            body = self.post("{ allOrders(first: 100000) { edges { node { id } } } }")
+        self.assertEqual(len(queries), 0)
+        self.assertIsNone(body.get("data"))
+        self.assertEqual(body["errors"][0]["extensions"]["code"], "CONNECTION_LIMIT_EXCEEDED")
+
+    def test_ill_typed_variable_is_a_normal_error(self):
+        response = self.client.post(
+            "/graphql/",
+            {"query": "query ($n: Int) { allOrders(first: $n) { edges { node { id } } } }",
+             "variables": {"n": "abc"}},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        body = response.json()
+        self.assertIsNone(body.get("data"))
+        self.assertIn("Variable '$n' got invalid value 'abc'", body["errors"][0]["message"])
+
+    @override_settings(CRM_MAX_QUERY_COST=500)
+    def test_over_budget_is_rejected(self):
+        query = """
+            { allOrders(first: 100) { edges { node {
+                customer { name } products(first: 50) { edges { node { name } } }
+            } } } }
+        """
+        body = self.post(query)
+        self.assertEqual(body["errors"][0]["extensions"]["code"], "QUERY_TOO_COMPLEX")
+        self.assertGreater(body["extensions"]["cost"]["requested"], 500)
+
+    @override_settings(CRM_MAX_QUERY_DEPTH=4)
+    def test_too_deep_is_rejected(self):
+        body = self.post("{ allOrders { edges { node { customer { name } } } } }")
+        self.assertEqual(body["errors"][0]["extensions"]["code"], "QUERY_TOO_DEEP")
+
+    def test_fragments_are_costed(self):
+        body = self.post("""
+            { allCustomers(first: 5) { ...Page } }
+            fragment Page on CustomerTypeConnection { edges { node { name } } }
+        """)
+        self.assertEqual(body["extensions"]["cost"]["requested"], 11)
+
+    def test_introspection_is_free(self):
+        body = self.post("{ __schema { types { name fields { name type { name } } } } }")
+        self.assertEqual(body["extensions"]["cost"]["requested"], 0)
+        self.assertIn("__schema", body["data"])
+
+
+class AsyncGraphQLViewTests(TransactionTestCase):
+    """
+    The async view serves the same schema with root fields on worker threads
+    """
+
+    def post(self, path, query, variables=None):
+        body = {"query": query}
+        if variables is not None:
+            body["variables"] = variables
+        return self.client.post(path, body, content_type="application/json").json()
+
+    def test_same_result_as_the_sync_view(self):
+        create_orders(3)
+        query = "{ allCustomers { totalCount } allOrders { totalCount edges { node { customer { name } } } } }"
+        async_body = self.post("/graphql/async/", query)
+        self.assertEqual(async_body["data"], self.post("/graphql/", query)["data"])
+        self.assertEqual(async_body["data"]["allOrders"]["totalCount"], 3)
+        self.assertIn("cost", async_body["extensions"])
+
+    @override_settings(CRM_RESTOCK_CACHE_ALIAS="default")
+    def test_mutation(self):
+        cache.clear()
+        customer = Customer.objects.create(name="Ada", email="ada@example.com")
+        product = Product.objects.create(name="Laptop", price=Decimal("999.99"), stock=2)
+        with mock.patch("crm.tasks.restock_product.apply_async") as apply_async:
+            body = self.post(
+                "/graphql/async/",
+                "mutation ($c: Int!, $p: [Int]!) { createOrder(order: {customer: $c, products: $p}) { message } }",
+                {"c": customer.pk, "p": [product.pk]},
+            )
+            restock.get_publisher().submit(lambda: None).result()
+        self.assertEqual(body["data"]["createOrder"]["message"], "Order created successfully")
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 1)
+        self.assertEqual(apply_async.call_args.args[0], (product.pk,))
+
+    def test_errors_are_reported(self):
+        body = self.post("/graphql/async/", "{ customer(id: 404) { name } }")
+        self.assertIsNone(body["data"]["customer"])
+        self.assertIn("Error getting customer", body["errors"][0]["message"])
+
+
+class ThreadedExecutionContextTests(TestCase):
+    def test_root_fields_resolve_concurrently(self):
+        # Each resolver waits for the other: only passes if both run at once
+        barrier = threading.Barrier(2, timeout=5)
+
+        class BarrierQuery(graphene.ObjectType):
+            first = graphene.String()
+            second = graphene.String()
+
+            def resolve_first(root, info):
+                barrier.wait()
+                return threading.current_thread().name
+
+            resolve_second = resolve_first
+
+        schema = graphene.Schema(query=BarrierQuery)
+        result = asyncio.run(schema.execute_async(
+            "{ first second }", execution_context_class=ThreadedExecutionContext
+        ))
+        self.assertIsNone(result.errors)
+        self.assertNotEqual(result.data["first"], result.data["second"])
+        self.assertTrue(result.data["first"].startswith("crm-graphql"))
+
+
+class ExportTests(TestCase):
+    """
+    Orders and customers stream out as NDJSON or CSV with the same filters
+    """
+
+    def setUp(self):
+        create_orders(5)
+
+    def get(self, path, **params):
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_orders_ndjson(self):
+        rows = [json.loads(line) for line in self.get("/export/orders").splitlines()]
+        self.assertEqual(len(rows), 5)
+        order = Order.objects.order_by("pk").first()
+        self.assertEqual(rows[0]["id"], order.pk)
+        self.assertEqual(rows[0]["customer_email"], "customer0@example.com")
+        self.assertEqual(rows[0]["product_ids"], sorted(order.products.values_list("pk", flat=True)))
+        self.assertEqual(rows[0]["quantities"], [1, 1, 1])
+
+    def test_orders_csv(self):
+        rows = list(csv.DictReader(io.StringIO(self.get("/export/orders", format="csv"))))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(len(rows[0]["product_ids"].split()), 3)
+        self.assertEqual(rows[0]["total_amount"], "29.97")
+
+    def test_filters_in_both_spellings(self):
+        lines = self.get("/export/orders", customer_name="omer 3").splitlines()
+        self.assertEqual(len(lines), 1)
+        lines = self.get("/export/customers", format="csv", email="customer1@").splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(
+            self.get("/export/orders", customerName="omer 3").splitlines(),
+            self.get("/export/orders", customer_name="omer 3").splitlines(),
+        )
+
+    def test_one_query_per_chunk(self):
+        with override_settings(CRM_EXPORT_CHUNK_SIZE=2):
+            with CaptureQueriesContext(connection) as queries:
+                lines = self.get("/export/orders").splitlines()
+        self.assertEqual(len(lines), 5)
+        # the order cursor plus one product-ID query for each of 3 chunks
+        self.assertEqual(len(queries), 4)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.get("/export/orders", {"format": "xml"}).status_code, 400)
+        response = self.client.get("/export/orders", {"total_amount_min": "lots"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("total_amount", response.json()["errors"])
+
+
+class CustomerStatsTests(TestCase):
+    """
+    Customer order statistics follow every order path and can be rebuilt
+    """
+
+    def setUp(self):
+        self.ada = Customer.objects.create(name="Ada", email="ada@example.com")
+        self.bob = Customer.objects.create(name="Bob", email="bob@example.com")
+        self.laptop = Product.objects.create(name="Laptop", price=Decimal("999.99"), stock=10)
+        self.mouse = Product.objects.create(name="Mouse", price=Decimal("25.50"), stock=10)
+
+    def stats(self, customer):
+        customer.refresh_from_db()
+        return customer.order_count, customer.lifetime_value, customer.last_order_date
+
+    def test_create_order(self):
+        order = place_order(self.ada.pk, [self.laptop.pk, self.mouse.pk])
+        self.assertEqual(self.stats(self.ada), (1, Decimal("1025.49"), order.order_date))
+        self.assertEqual(self.stats(self.bob), (0, Decimal("0"), None))
+
+    def test_bulk_orders(self):
+        orders = [
+            SimpleNamespace(customer=self.ada.pk, products=[self.laptop.pk]),
+            SimpleNamespace(customer=self.bob.pk, products=[self.mouse.pk]),
+            SimpleNamespace(customer=self.ada.pk, products=[self.mouse.pk]),
+            SimpleNamespace(customer=404, products=[self.mouse.pk]),
+        ]
+        created, errors = bulk_place_orders(orders)
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(self.stats(self.ada)[:2], (2, Decimal("1025.49")))
+        self.assertEqual(self.stats(self.bob)[:2], (1, Decimal("25.50")))
+
+    def test_rebuild_command(self):
+        place_order(self.ada.pk, [self.laptop.pk])
+        place_order(self.bob.pk, [self.mouse.pk])
+        Customer.objects.update(order_count=0, lifetime_value=0, last_order_date=None)
+        out = io.StringIO()
+        call_command("rebuild_customer_stats", batch_size=1, stdout=out)
+        self.assertIn("for 2 customers", out.getvalue())
+        self.assertEqual(self.stats(self.ada)[:2], (1, Decimal("999.99")))
+        self.assertEqual(self.stats(self.bob)[:2], (1, Decimal("25.50")))
+
+    def test_exposed_filterable_and_sortable(self):
+        place_order(self.ada.pk, [self.laptop.pk])
+        place_order(self.bob.pk, [self.mouse.pk])
+        place_order(self.bob.pk, [self.mouse.pk])
+        result = wide_schema.execute("""
+            {
+                top: allCustomers(orderBy: "-lifetime_value", first: 1) {
+                    edges { node { name orderCount lifetimeValue lastOrderDate } }
+                }
+                repeat: allCustomers(orderCountMin: 2) { edges { node { name } } }
+            }
+        """, context_value=SimpleNamespace())
+        self.assertIsNone(result.errors)
+        top = result.data["top"]["edges"][0]["node"]
+        self.assertEqual((top["name"], top["orderCount"], top["lifetimeValue"]), ("Ada", 1, "999.99"))
+        self.assertEqual(result.data["repeat"]["edges"], [{"node": {"name": "Bob"}}])
+
+
+class RevenueRollupTests(TestCase):
+    """
+    Daily rollups follow new orders and customers and feed the reports
+    """
+
+    REPORT_QUERY = """
+        query ($from: Date!, $to: Date!) {
+            revenueReport(from: $from, to: $to) {
+                orderCount revenue newCustomers
+                days { date orderCount revenue newCustomers }
+                products(first: 1) { product { name } units }
+            }
+        }
+    """
+
+    def setUp(self):
+        self.ada = Customer.objects.create(name="Ada", email="ada@example.com")
+        self.laptop = Product.objects.create(name="Laptop", price=Decimal("999.99"), stock=10)
+        self.mouse = Product.objects.create(name="Mouse", price=Decimal("25.50"), stock=10)
+        self.today = timezone.localdate()
+
+    def day(self, date):
+        return DailyRevenue.objects.values_list("order_count", "revenue", "new_customers").get(date=date)
+
+    def test_new_orders_and_customers_are_added(self):
+        place_order(self.ada.pk, [self.laptop.pk, self.mouse.pk])
+        bulk_place_orders([
+            SimpleNamespace(customer=self.ada.pk, products=[self.mouse.pk]),
+            SimpleNamespace(customer=self.ada.pk, products=[self.mouse.pk]),
+        ])
+        bulk_create_customers([SimpleNamespace(name="Bob", email="bob@example.com", phone="+1234567890")])
+        self.assertEqual(self.day(self.today), (3, Decimal("1076.49"), 2))
+        units = dict(DailyProductSales.objects.filter(date=self.today).values_list("product__name", "units"))
+        self.assertEqual(units, {"Laptop": 1, "Mouse": 3})
+
+    def test_close_day_recomputes_from_the_source_tables(self):
+        yesterday = self.today - datetime.timedelta(days=1)
+        create_orders(3)
+        Order.objects.update(order_date=yesterday)
+        Order.objects.filter(pk=Order.objects.order_by("pk").values("pk")[:1]).delete()
+        close_revenue_day(yesterday.isoformat())
+        row = DailyRevenue.objects.get(date=yesterday)
+        self.assertEqual((row.order_count, row.revenue, row.new_customers), (2, Decimal("59.94"), 0))
+        self.assertIsNotNone(row.closed_at)
+        self.assertEqual(
+            sorted(DailyProductSales.objects.filter(date=yesterday).values_list("units", flat=True)),
+            [2, 2, 2],
+        )
+
+    def test_revenue_report_reads_the_rollups(self):
+        place_order(self.ada.pk, [self.laptop.pk])
+        place_order(self.ada.pk, [self.mouse.pk])
+        place_order(self.ada.pk, [self.mouse.pk])
+        variables = {
+            "from": (self.today - datetime.timedelta(days=29)).isoformat(),
+            "to": self.today.isoformat(),
+        }
+        with CaptureQueriesContext(connection) as queries:
+            result = wide_schema.execute(
+                self.REPORT_QUERY, variables=variables, context_value=SimpleNamespace()
+            )
+        self.assertIsNone(result.errors)
+        report = result.data["revenueReport"]
+        self.assertEqual(
+            (report["orderCount"], report["revenue"], report["newCustomers"]), (3, "1050.99", 1)
+        )
+        self.assertEqual(len(report["days"]), 1)
+        self.assertEqual(report["products"], [{"product": {"name": "Mouse"}, "units": 2}])
+        self.assertFalse(any('"crm_order"' in query["sql"] for query in queries.captured_queries))
+
+    def test_revenue_report_range_is_checked(self):
+        result = wide_schema.execute(
+            self.REPORT_QUERY,
+            variables={"from": "2026-02-01", "to": "2026-01-01"},
+            context_value=SimpleNamespace(),
+        )
+        self.assertIn("must not be after", result.errors[0].message)
+
+    def test_crm_report_logs_revenue_without_http(self):
+        place_order(self.ada.pk, [self.laptop.pk])
+        with mock.patch("crm.tasks.open", mock.mock_open(), create=True) as log:
+            message = generate_crm_report()
+        self.assertIn("1 customers, 1 orders, 999.99 revenue.", message)
+        log().write.assert_called_once()
+
+
+class InProcessJobTests(TestCase):
+    """
+    Scheduled jobs run GraphQL operations and queries in-process
+    """
+
+    def setUp(self):
+        self.ada = Customer.objects.create(name="Ada", email="ada@example.com")
+        self.mouse = Product.objects.create(name="Mouse", price=Decimal("25.50"), stock=3)
+
+    def test_execute_graphql(self):
+        data = execute_graphql(
+            "query ($first: Int) { allCustomers(first: $first) { totalCount edges { node { email } } } }",
+            variables={"first": 1},
+        )
+        self.assertEqual(data["allCustomers"]["totalCount"], 1)
+        self.assertEqual(data["allCustomers"]["edges"][0]["node"]["email"], "ada@example.com")
+
+    def test_execute_graphql_errors(self):
+        with self.assertRaises(InProcessGraphQLError) as raised:
+            execute_graphql("{ hello }")
+        self.assertIn("hello", str(raised.exception))
+        with self.assertRaises(InProcessGraphQLError):
+            execute_graphql(
+                "mutation { createOrder(order: {customer: 404, products: [404]}) { message } }"
+            )
+
+    def test_update_low_stock(self):
+        with mock.patch("crm.cron.open", mock.mock_open(), create=True) as log, \
+                mock.patch("builtins.print"):
+            cron.update_low_stock()
+        self.mouse.refresh_from_db()
+        self.assertEqual(self.mouse.stock, 13)
+        written = "".join(call.args[0] for call in log().write.call_args_list)
+        self.assertIn("Updated product: Mouse, New stock: 13", written)
+
+    def test_heartbeat(self):
+        with mock.patch("crm.cron.open", mock.mock_open(), create=True) as log, \
+                mock.patch("builtins.print") as printed:
+            cron.log_crm_heartbeat()
+        self.assertRegex(log().write.call_args.args[0], r"^\[\d{4}-\d\d-\d\d .*\] CRM is alive")
+        printed.assert_called_once_with("GraphQL schema is reachable and healthy")
+
+
+class OrderReminderPipelineTests(TestCase):
+    """
+    Reminders are fanned out in chunks, deduped per email and resumable
+    """
+
+    def setUp(self):
+        # Two orders per customer, interleaved so each email spans chunks
+        self.orders = create_orders(3) + create_orders_for(Customer.objects.order_by("pk"))
+        self.log = mock.patch("crm.reminders.open", mock.mock_open(), create=True).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def written(self):
+        return "".join(call.args[0] for call in self.log().write.call_args_list)
+
+    def test_one_reminder_per_email(self):
+        chunks = []
+        run = reminders.dispatch_reminders(lambda *chunk: chunks.append(chunk), chunk_size=2)
+        self.assertEqual(len(chunks), 3)
+        sent = [reminders.send_reminder_chunk(*chunk) for chunk in chunks]
+        self.assertEqual(sum(sent), 3)
+        self.assertEqual(
+            sorted(OrderReminder.objects.filter(run=run).values_list("email", flat=True)),
+            ["customer0@example.com", "customer1@example.com", "customer2@example.com"],
+        )
+        self.assertEqual(self.written().count("Order ID: "), 3)
+        run.refresh_from_db()
+        self.assertIsNotNone(run.finished_at)
+
+    def test_resumes_from_the_checkpoint(self):
+        chunks = []
+
+        def crash_after_two(*chunk):
+            if len(chunks) == 2:
+                raise RuntimeError("producer died")
+            chunks.append(chunk)
+
+        with self.assertRaises(RuntimeError):
+            reminders.dispatch_reminders(crash_after_two, chunk_size=2)
+        run = ReminderRun.objects.get()
+        self.assertEqual((run.chunks_dispatched, run.last_order_id), (2, chunks[1][2]))
+
+        resumed = []
+        run = reminders.dispatch_reminders(lambda *chunk: resumed.append(chunk), chunk_size=2)
+        self.assertEqual(len(resumed), 1)
+        self.assertGreater(resumed[0][1], chunks[1][2])
+        for chunk in chunks + resumed + chunks[:1]:
+            reminders.send_reminder_chunk(*chunk)
+        self.assertEqual(OrderReminder.objects.count(), 3)
+        self.assertEqual(self.written().count("Order ID: "), 3)
+        # A finished run is not dispatched again the same day
+        again = []
+        reminders.dispatch_reminders(lambda *chunk: again.append(chunk))
+        self.assertEqual(again, [])
+
+    def test_redelivery_after_a_failed_log_write(self):
+        chunks = []
+        reminders.dispatch_reminders(lambda *chunk: chunks.append(chunk), chunk_size=2)
+        with mock.patch("crm.reminders.write_log", side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                reminders.send_reminder_chunk(*chunks[0])
+        # acks_late redelivers the chunk: its reminders are sent, and it
+        # counts once however often it completes
+        sent = [reminders.send_reminder_chunk(*chunk) for chunk in chunks + chunks[:1]]
+        self.assertEqual(sent, [2, 1, 0, 0])
+        self.assertEqual(self.written().count("Order ID: "), 3)
+        run = ReminderRun.objects.get()
+        self.assertEqual((run.chunks_dispatched, run.chunks_done), (3, 3))
+        self.assertIsNotNone(run.finished_at)
+
+    def test_run_not_finished_early(self):
+        chunks = []
+        reminders.dispatch_reminders(lambda *chunk: chunks.append(chunk), chunk_size=2)
+        for chunk in chunks[:2] + chunks[:2]:
+            reminders.send_reminder_chunk(*chunk)
+        run = ReminderRun.objects.get()
+        self.assertEqual(run.chunks_done, 2)
+        self.assertIsNone(run.finished_at)
+
+    def test_celery_task(self):
+        # Eager tasks still take a producer: the in-memory transport needs no broker
+        for name, value in (("task_always_eager", True), ("broker_write_url", "memory://")):
+            self.addCleanup(setattr, celery_app.conf, name, celery_app.conf[name])
+            celery_app.conf[name] = value
+        with override_settings(CRM_REMINDER_CHUNK_SIZE=4):
+            message = send_order_reminders()
+        self.assertIn("Dispatched 2 reminder chunks", message)
+        self.assertEqual(OrderReminder.objects.count(), 3)
+        self.assertIsNotNone(ReminderRun.objects.get().finished_at)
+
+
+class CleanInactiveCustomersTests(TestCase):
+    """
+    Inactive customers are deleted in batches, with their orders
+    """
+
+    def setUp(self):
+        long_ago = timezone.now() - datetime.timedelta(days=800)
+        self.mouse = Product.objects.create(name="Mouse", price=Decimal("25.50"), stock=10)
+        self.lapsed = Customer.objects.create(name="Lapsed", email="lapsed@example.com")
+        self.active = Customer.objects.create(name="Active", email="active@example.com")
+        self.never = Customer.objects.create(name="Never", email="never@example.com")
+        self.new = Customer.objects.create(name="New", email="new@example.com")
+        Customer.objects.exclude(pk=self.new.pk).update(created_at=long_ago)
+        old_order = place_order(self.lapsed.pk, [self.mouse.pk])
+        Order.objects.filter(pk=old_order.pk).update(order_date=long_ago.date())
+        place_order(self.active.pk, [self.mouse.pk])
+
+    def clean(self, *args):
+        out = io.StringIO()
+        call_command("clean_inactive_customers", *args, stdout=out)
+        return json.loads(out.getvalue())
+
+    def test_dry_run(self):
+        summary = self.clean("--dry-run")
+        self.assertEqual((summary["inactive_customers"], summary["orders"]), (2, 1))
+        self.assertEqual(Customer.objects.count(), 4)
+
+    def test_batched_delete(self):
+        with mock.patch("crm.services.time.sleep") as sleep:
+            summary = self.clean("--batch-size", "1", "--pause", "0.5")
+        self.assertEqual((summary["inactive_customers"], summary["batches"]), (2, 2))
+        self.assertEqual(summary["deleted"]["crm.Order"], 1)
+        self.assertEqual(summary["deleted"]["crm.OrderItem"], 1)
+        sleep.assert_called_once_with(0.5)
+        self.assertEqual(
+            sorted(Customer.objects.values_list("name", flat=True)), ["Active", "New"]
+        )
+
+
+@override_settings(CRM_RESTOCK_CACHE_ALIAS="default")
+class EventRestockTests(TestCase):
+    """
+    Low-stock crossings queue one coalesced restock task per product
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.ada = Customer.objects.create(name="Ada", email="ada@example.com")
+        self.laptop = Product.objects.create(name="Laptop", price=Decimal("999.99"), stock=11)
+        self.mouse = Product.objects.create(name="Mouse", price=Decimal("25.50"), stock=50)
+        patcher = mock.patch("crm.tasks.restock_product.apply_async")
+        self.apply_async = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def queued(self):
+        # Wait for the publisher thread to get through what is queued so far
+        restock.get_publisher().submit(lambda: None).result()
+        return [call.args[0][0] for call in self.apply_async.call_args_list]
+
+    def test_order_crossing_the_threshold(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(self.ada.pk, [self.laptop.pk, self.mouse.pk])
+        self.assertEqual(self.queued(), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(self.ada.pk, [self.laptop.pk, self.mouse.pk])
+        self.assertEqual(self.queued(), [self.laptop.pk])
+        self.assertEqual(self.apply_async.call_args.kwargs["countdown"], 60)
+
+    def test_crossings_are_coalesced(self):
+        Product.objects.filter(pk=self.laptop.pk).update(stock=5)
+        orders = [SimpleNamespace(customer=self.ada.pk, products=[self.laptop.pk])] * 2
+        for _ in range(2):
+            with self.captureOnCommitCallbacks(execute=True):
+                bulk_place_orders(orders)
+        self.assertEqual(self.queued(), [self.laptop.pk])
+
+    def test_product_saved_with_low_stock(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.create(name="Cable", price=Decimal("5.00"), stock=3)
+        self.assertEqual(len(self.queued()), 1)
+
+    def test_order_returns_while_the_broker_is_down(self):
+        broker_down = threading.Event()
+
+        def unreachable(*args, **kwargs):
+            broker_down.wait(5)
+            raise ConnectionRefusedError(111, "Connection refused")
+
+        self.apply_async.side_effect = unreachable
+        Product.objects.filter(pk=self.laptop.pk).update(stock=4)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/graphql/",
+                {"query": CREATE_ORDER_MUTATION,
+                 "variables": {"customer": self.ada.pk, "products": [self.laptop.pk]}},
+                content_type="application/json",
+            )
+        # Answered and committed while the publish is still stuck
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(response.json().get("errors"))
+        self.assertFalse(broker_down.is_set())
+        self.assertEqual(Order.objects.count(), 1)
+        with self.assertLogs("crm.restock", "WARNING") as logs:
+            broker_down.set()
+            self.queued()
+        self.assertIn("Could not queue a restock", logs.output[0])
+        # The claim is released, so the next crossing tries again
+        self.assertIsNone(cache.get(restock.PENDING_PREFIX + str(self.laptop.pk)))
+
+    def test_restock_task(self):
+        Product.objects.filter(pk=self.laptop.pk).update(stock=4)
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(self.ada.pk, [self.laptop.pk])
+        self.assertEqual(restock_product(self.laptop.pk), f"Restocked product {self.laptop.pk}")
+        self.laptop.refresh_from_db()
+        self.assertEqual(self.laptop.stock, 13)
+        # Restocked and released: a stocked-up product is left alone, and
+        # the next crossing queues a new task
+        self.assertIn("no longer needs", restock_product(self.laptop.pk))
+        Product.objects.filter(pk=self.laptop.pk).update(stock=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            place_order(self.ada.pk, [self.laptop.pk])
+        self.assertEqual(self.queued(), [self.laptop.pk, self.laptop.pk])
+
+
+class ProductPriceTests(TestCase):
+    """
+    Checkout prices come from the locked rows and are kept on the order
+    lines; ProductType.price is the row's price
+    """
+
+    def setUp(self):
+        self.ada = Customer.objects.create(name="Ada", email="ada@example.com")
+        self.pen = Product.objects.create(name="Pen", price=Decimal("0.10"), stock=50)
+        self.ink = Product.objects.create(name="Ink", price=Decimal("0.20"), stock=50)
+
+    def test_exact_total_and_snapshot(self):
+        order = place_order(self.ada.pk, [self.pen.pk, self.ink.pk])
+        self.assertEqual(order.total_amount, Decimal("0.30"))
+        self.assertEqual(
+            dict(OrderItem.objects.filter(order=order).values_list("product_id", "unit_price")),
+            {self.pen.pk: Decimal("0.10"), self.ink.pk: Decimal("0.20")},
+        )
+
+    def test_prices_read_with_the_lock(self):
+        with CaptureQueriesContext(connection) as queries:
+            place_order(self.ada.pk, [self.pen.pk, self.ink.pk])
+        price_reads = [
+            query["sql"] for query in queries
+            if query["sql"].startswith("SELECT") and '"crm_product"."price"' in query["sql"]
+        ]
+        self.assertEqual(len(price_reads), 1)
+
+    def test_price_change_keeps_history(self):
+        first = place_order(self.ada.pk, [self.pen.pk])
+        self.pen.price = Decimal("0.15")
+        self.pen.save()
+        second = place_order(self.ada.pk, [self.pen.pk])
+        self.assertEqual(second.total_amount, Decimal("0.15"))
+        self.assertEqual(OrderItem.objects.get(order=first).unit_price, Decimal("0.10"))
+
+    def test_product_type_price(self):
+        query = "{ allProducts(first: 5) { edges { node { name price } } } }"
+        data = execute_graphql(query)
+        prices = {edge["node"]["name"]: edge["node"]["price"] for edge in data["allProducts"]["edges"]}
+        self.assertEqual(prices, {"Pen": "0.10", "Ink": "0.20"})
+        # Sends no signals, as a change made by another process would
+        Product.objects.filter(pk=self.pen.pk).update(price=Decimal("0.15"))
+        data = execute_graphql(query)
+        prices = {edge["node"]["name"]: edge["node"]["price"] for edge in data["allProducts"]["edges"]}
+        self.assertEqual(prices["Pen"], "0.15")
+
+
+class SeedCrmTests(TestCase):
+    """
+    seed_crm generates consistent data with bulk inserts
+    """
+
+    def test_seed(self):
+        out = io.StringIO()
+        call_command(
+            "seed_crm", "--customers", "30", "--products", "5", "--orders", "200", "--days", "10",
+            stdout=out,
+        )
+        self.assertIn("30 customers, 5 products, 200 orders", out.getvalue())
+        self.assertEqual(Customer.objects.count(), 30)
+        # Totals add up from the lines, and the rollups and stats from the orders
+        totals = {
+            order.pk: sum(
+                (item.unit_price * item.quantity for item in order.items.all()), Decimal("0")
+            )
+            for order in Order.objects.prefetch_related("items")
+        }
+        self.assertEqual(totals, dict(Order.objects.values_list("pk", "total_amount")))
+        self.assertEqual(rollup_totals()["order_count"], 200)
+        self.assertEqual(
+            sum(DailyProductSales.objects.values_list("units", flat=True)),
+            sum(OrderItem.objects.values_list("quantity", flat=True)),
+        )
+        self.assertEqual(sum(Customer.objects.values_list("order_count", flat=True)), 200)
+        self.assertEqual(Order.objects.values("order_date").distinct().count(), 10)
+        self.assertFalse(
+            Order.objects.filter(customer__created_at__date__gt=F("order_date")).exists()
+        )
+
+    def test_reruns_add_rows(self):
+        seed_crm(customers=5, products=2, orders=10, days=3)
+        counts = seed_crm(customers=5, products=0, orders=10, days=3)
+        self.assertEqual(counts["products"], 0)
+        self.assertEqual(Customer.objects.count(), 10)
+        self.assertEqual(Order.objects.count(), 20)
+
+
+# Values for the required arguments of root fields, by field name. A new
+# field with required arguments fails QueryCountRegressionTests until it
+# is given an entry here; everything else is generated from the schema.
+PROBE_ARGUMENTS = {
+    "customer": lambda data: {"id": data["customer"]},
+    "product": lambda data: {"id": data["product"]},
+    "order": lambda data: {"id": data["order"]},
+    "revenueReport": lambda data: {"from": data["since"], "to": data["today"]},
+    "createCustomer": lambda data: {
+        "customer": {"name": "Probe", "email": "probe@example.com", "phone": "+12025550123"}
+    },
+    "bulkCreateCustomers": lambda data: {
+        "customers": [
+            {"name": f"Probe {i}", "email": f"probe{i}@example.com", "phone": "+12025550123"}
+            for i in range(5)
+        ]
+    },
+    "createProduct": lambda data: {"product": {"name": "Probe", "price": "9.99", "stock": 5}},
+    "createOrder": lambda data: {
+        "order": {
+            "customer": data["customer_pk"],
+            "items": [{"product": pk, "quantity": 2} for pk in data["stocked"]],
+        }
+    },
+    "bulkCreateOrders": lambda data: {
+        "orders": [{"customer": data["customer_pk"], "products": data["stocked"]}] * 5
+    },
+}
+
+# Most SQL statements any root field may run at either data size
+PROBE_QUERY_BUDGET = 8
+PROBE_QUERY_BUDGETS = {"createOrder": 20, "bulkCreateOrders": 18}
+
+PAGINATION_TYPES = ("Connection", "Edge")
+
+
+def probe_selection(type_, full, seen=()):
+    """
+    A selection set over every field of type_ that takes no required
+    arguments. full=False keeps to the type's own scalars, following only
+    connection edges and nodes, to catch columns deferred by the optimizer
+    """
+    type_ = get_named_type(type_)
+    if is_leaf_type(type_):
+        return ""
+    parts = []
+    for name, field in type_.fields.items():
+        if name.startswith("__") or any(is_required_argument(arg) for arg in field.args.values()):
+            continue
+        field_type = get_named_type(field.type)
+        if is_leaf_type(field_type):
+            parts.append(name)
+            continue
+        paging = field_type.name.endswith(PAGINATION_TYPES) or name == "node"
+        if field_type.name in seen or not (full or paging):
+            continue
+        nested = probe_selection(field_type, full, seen + (type_.name,))
+        if nested:
+            parts.append(f"{name} {nested}")
+    return "{ " + " ".join(parts) + " }" if parts else ""
+
+
+def probe_operation(kind, name, field, full):
+    """
+    An operation selecting the root field name, with its required
+    arguments as variables of the same names
+    """
+    required = {arg: field.args[arg] for arg in field.args if is_required_argument(field.args[arg])}
+    definitions = ", ".join(f"${arg}: {value.type}" for arg, value in required.items())
+    arguments = ", ".join(f"{arg}: ${arg}" for arg in required)
+    return (
+        f"{kind} Probe{f'({definitions})' if definitions else ''} "
+        f"{{ {name}{f'({arguments})' if arguments else ''} {probe_selection(field.type, full)} }}"
+    )
+
+
+def probe_data():
+    """
+    The argument sources for PROBE_ARGUMENTS: ids of seeded rows and the
+    seeded date range. A third of the products is left low on stock
+    """
+    product_ids = list(Product.objects.order_by("pk").values_list("pk", flat=True))
+    Product.objects.filter(pk__in=product_ids[::3]).update(stock=2)
+    Product.objects.exclude(pk__in=product_ids[::3]).update(stock=1_000_000)
+    customer = Customer.objects.order_by("pk").first()
+    order = Order.objects.order_by("pk").first()
+    product = Product.objects.order_by("pk").first()
+    today = timezone.localdate()
+    return {
+        "customer": str(customer.pk),
+        "customer_pk": customer.pk,
+        "product": str(product.pk),
+        "order": str(order.pk),
+        "stocked": [pk for pk in product_ids if pk not in product_ids[::3]][:3],
+        "since": (today - datetime.timedelta(days=29)).isoformat(),
+        "today": today.isoformat(),
+    }
+
+
+probe_schema = graphene.Schema(query=Query, mutation=Mutation)
+
+
+class QueryCountRegressionTests(TestCase):
+    """
+    Every root field of crm.schema runs within its query budget, and no
+    more SQL at 1000 rows than at 10. The operations are generated from
+    the schema, so new fields are covered without new tests.
+    """
+
+    def measure(self, data):
+        """
+        The SQL run by each (kind, field, full selection) probe
+        """
+        executed = {}
+        missing = []
+        roots = (
+            ("query", probe_schema.graphql_schema.query_type),
+            ("mutation", probe_schema.graphql_schema.mutation_type),
+        )
+        for kind, root in roots:
+            for name, field in root.fields.items():
+                if any(is_required_argument(arg) for arg in field.args.values()):
+                    if name not in PROBE_ARGUMENTS:
+                        missing.append(name)
+                        continue
+                    variables = PROBE_ARGUMENTS[name](data)
+                else:
+                    variables = {}
+                for full in (True, False):
+                    operation = probe_operation(kind, name, field, full)
+                    # Mutations are rolled back so both sizes see the same data
+                    with transaction.atomic():
+                        with CaptureQueriesContext(connection) as queries:
+                            result = probe_schema.execute(
+                                operation, variable_values=variables, context_value=InProcessContext()
+                            )
+                        transaction.set_rollback(True)
+                    self.assertIsNone(result.errors, f"{operation}\n{result.errors}")
+                    executed[kind, name, full] = [query["sql"] for query in queries]
+        self.assertFalse(missing, f"No PROBE_ARGUMENTS for fields with required arguments: {missing}")
+        return executed
+
+    def test_query_counts_do_not_grow_with_data(self):
+        seed_crm(customers=10, products=10, orders=10, days=30)
+        small = self.measure(probe_data())
+        seed_crm(customers=990, products=990, orders=990, days=30, seed=1)
+        large = self.measure(probe_data())
+
+        failures = []
+        for (kind, name, full), statements in large.items():
+            before = small[kind, name, full]
+            budget = PROBE_QUERY_BUDGETS.get(name, PROBE_QUERY_BUDGET)
+            if len(statements) <= len(before) and max(len(statements), len(before)) <= budget:
+                continue
+            grown = Counter(map(sql_shape, statements))
+            grown.subtract(Counter(map(sql_shape, before)))
+            shapes = [f"  {count:+d}x {shape}" for shape, count in grown.most_common() if count > 0]
+            failures.append(
+                f"{kind} {name} ({'full' if full else 'scalar'} selection): {len(before)} queries "
+                f"at 10 rows, {len(statements)} at 1000 rows, budget {budget}\n" + "\n".join(shapes)
+            )
+        self.assertFalse(failures, "\n\n".join(failures))
@@ -1,3 +1,382 @@
-from django.shortcuts import render
+import inspect
 
-# Create your views here.
+from django.db import connection, transaction
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.http.response import HttpResponseBadRequest
+from graphene_django.constants import MUTATION_ERRORS_FLAG
+from graphene_django.settings import graphene_settings
+from graphene_django.views import GraphQLView, HttpError
+from graphql import (
+    ExecutionResult,
+    OperationType,
+    execute,
+    get_operation_ast,
+    parse,
+    validate,
+    validate_schema,
+)
+from graphql.error import GraphQLError
+from graphql.execution.values import get_variable_values
+
+from .instrumentation import (
+    METRICS,
+    OperationRecorder,
+    debug_header_requested,
+    instrumentation_requested,
+)
+from . import response_cache
+from .cost import CostAnalysis
+from .execution import ThreadedExecutionContext
+from .exports import FORMATS, render_export
+from .persisted_queries import (
+    DOCUMENT_CACHE,
+    PersistedQueryError,
+    get_persisted_query,
+    persisted_query_not_found,
+    query_hash,
+)
+from .loaders import ThreadLocalLoaders
+
+
+class CRMGraphQLView(GraphQLView):
+    """
+    GraphQLView with persisted queries, resolver/SQL instrumentation and
+    response extensions.
+
+    Parsed and validated documents are cached by query hash, and the
+    Apollo APQ protocol is accepted (see ``crm.persisted_queries``). Every
+    operation is costed by ``crm.cost`` before it runs, and the cost is
+    reported under ``extensions.cost``. Query operations are served from
+    ``crm.response_cache`` when it is enabled.
+    Anything placed in ``request.graphql_extensions`` while the operation
+    runs is returned under the response's ``extensions`` key.
+    """
+
+    def get_middleware(self, request):
+        middleware = list(super().get_middleware(request) or [])
+        recorder = getattr(request, "graphql_recorder", None)
+        if recorder is not None:
+            middleware.append(recorder.middleware())
+        return middleware
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        if not instrumentation_requested(request):
+            return self.execute_document_request(
+                request, data, query, variables, operation_name, show_graphiql
+            )
+
+        with OperationRecorder(operation_name) as recorder:
+            request.graphql_recorder = recorder
+            try:
+                result = self.execute_document_request(
+                    request, data, query, variables, operation_name, show_graphiql
+                )
+            finally:
+                request.graphql_recorder = None
+        if debug_header_requested(request):
+            self.add_extensions(request, {"instrumentation": recorder.as_extensions()})
+        return result
+
+    def get_document(self, query, persisted=None):
+        """
+        The parsed and validated document for a request, from the cache when
+        possible; returns (document, errors)
+        """
+        if persisted is not None:
+            key = persisted["sha256Hash"]
+            if query and query_hash(query) != key:
+                return None, [
+                    PersistedQueryError("provided sha does not match query", "INVALID_SHA256_HASH")
+                ]
+        else:
+            key = query_hash(query)
+
+        document = DOCUMENT_CACHE.get(key)
+        if document is not None:
+            return document, None
+        if not query:
+            return None, [persisted_query_not_found()]
+
+        try:
+            document = parse(query)
+        except GraphQLError as e:
+            return None, [e]
+        validation_errors = validate(
+            self.schema.graphql_schema,
+            document,
+            self.validation_rules,
+            graphene_settings.MAX_VALIDATION_ERRORS,
+        )
+        if validation_errors:
+            return None, validation_errors
+        DOCUMENT_CACHE.put(key, document)
+        return document, None
+
+    def prepare_operation(self, request, data, query, variables, operation_name):
+        """
+        Everything GraphQLView.execute_graphql_request does before executing,
+        with parse and validate replaced by the document cache and the cost
+        analysis added. Returns (document, operation_ast, errors); malformed
+        requests raise HttpError
+        """
+        try:
+            persisted = get_persisted_query(request, data)
+        except PersistedQueryError as e:
+            return None, None, [e]
+
+        if not query and persisted is None:
+            raise HttpError(HttpResponseBadRequest("Must provide query string."))
+
+        schema = self.schema.graphql_schema
+
+        schema_validation_errors = validate_schema(schema)
+        if schema_validation_errors:
+            return None, None, schema_validation_errors
+
+        document, errors = self.get_document(query, persisted)
+        if errors:
+            return None, None, errors
+
+        operation_ast = get_operation_ast(document, operation_name)
+
+        if (
+            request.method.lower() == "get"
+            and operation_ast is not None
+            and operation_ast.operation != OperationType.QUERY
+        ):
+            raise HttpError(
+                HttpResponseNotAllowed(
+                    ["POST"],
+                    "Can only perform a {} operation from a POST request.".format(
+                        operation_ast.operation.value
+                    ),
+                )
+            )
+
+        # Costed with the coerced variables; the errors for ill-typed ones
+        # are the ones execute would report
+        if operation_ast is not None and isinstance(variables or {}, dict):
+            variables = get_variable_values(
+                schema, operation_ast.variable_definitions or (), variables or {}
+            )
+            if isinstance(variables, list):
+                return None, None, variables
+
+        analysis = CostAnalysis(schema, document, operation_name, variables)
+        self.add_extensions(request, {"cost": analysis.as_extensions()})
+        return document, operation_ast, analysis.validate() or None
+
+    def get_execute_options(self, request, variables, operation_name):
+        execute_options = {
+            "root_value": self.get_root_value(request),
+            "context_value": self.get_context(request),
+            "variable_values": variables,
+            "operation_name": operation_name,
+            "middleware": self.get_middleware(request),
+        }
+        if self.execution_context_class:
+            execute_options["execution_context_class"] = self.execution_context_class
+        return execute_options
+
+    def execute_document_request(
+        self, request, data, query, variables, operation_name, show_graphiql=False
+    ):
+        """
+        GraphQLView.execute_graphql_request on top of prepare_operation
+        """
+        try:
+            document, operation_ast, errors = self.prepare_operation(
+                request, data, query, variables, operation_name
+            )
+        except HttpError:
+            if show_graphiql:
+                return None
+            raise
+        if errors:
+            return ExecutionResult(data=None, errors=errors)
+
+        schema = self.schema.graphql_schema
+        try:
+            execute_options = self.get_execute_options(request, variables, operation_name)
+
+            if (
+                operation_ast is not None
+                and operation_ast.operation == OperationType.MUTATION
+                and (
+                    graphene_settings.ATOMIC_MUTATIONS is True
+                    or connection.settings_dict.get("ATOMIC_MUTATIONS", False) is True
+                )
+            ):
+                with transaction.atomic():
+                    result = execute(schema, document, **execute_options)
+                    if getattr(request, MUTATION_ERRORS_FLAG, False) is True:
+                        transaction.set_rollback(True)
+                return result
+
+            if (
+                operation_ast is not None
+                and operation_ast.operation == OperationType.QUERY
+                and response_cache.response_cache_enabled()
+            ):
+                return self.execute_cached(
+                    request,
+                    document,
+                    operation_name,
+                    variables,
+                    lambda: execute(schema, document, **execute_options),
+                )
+
+            return execute(schema, document, **execute_options)
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+    def execute_cached(self, request, document, operation_name, variables, run):
+        """
+        Serve a query from the response cache, or run it and cache the data
+        tagged with the models it read
+        """
+        key = response_cache.cache_key(request, document, operation_name, variables)
+        data = response_cache.get_cached(key)
+        if debug_header_requested(request):
+            self.add_extensions(request, {"responseCache": "miss" if data is None else "hit"})
+        if data is not None:
+            return ExecutionResult(data=data)
+
+        versions = response_cache.current_versions()
+        recorder = response_cache.TableRecorder()
+        with connection.execute_wrapper(recorder):
+            result = run()
+        if not result.errors and result.data is not None:
+            response_cache.set_cached(key, result.data, versions, recorder.tags)
+        return result
+
+    @staticmethod
+    def add_extensions(request, extensions):
+        if not hasattr(request, "graphql_extensions"):
+            request.graphql_extensions = {}
+        request.graphql_extensions.update(extensions)
+
+    def json_encode(self, request, d, pretty=False):
+        extensions = getattr(request, "graphql_extensions", None)
+        if extensions and isinstance(d, dict):
+            d = {**d, "extensions": extensions}
+        return super().json_encode(request, d, pretty)
+
+
+class AsyncCRMGraphQLView(CRMGraphQLView):
+    """
+    CRMGraphQLView for the ASGI app, executing operations asynchronously.
+
+    Documents, persisted queries and cost limits work as in the sync view.
+    Execution goes through ``ThreadedExecutionContext``, so independent
+    top-level fields resolve concurrently on the worker pool; each thread
+    gets its own loaders. The response cache and SQL instrumentation hook
+    the request thread's connection and are not applied here.
+    """
+
+    view_is_async = True
+    execution_context_class = ThreadedExecutionContext
+
+    def get_context(self, request):
+        request.loaders = ThreadLocalLoaders()
+        return request
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            if request.method.lower() not in ("get", "post"):
+                raise HttpError(
+                    HttpResponseNotAllowed(
+                        ["GET", "POST"], "GraphQL only supports GET and POST requests."
+                    )
+                )
+
+            data = self.parse_body(request)
+            if self.graphiql and self.can_display_graphiql(request, data):
+                # Rendering GraphiQL runs no queries
+                return super().dispatch(request, *args, **kwargs)
+
+            if self.batch:
+                responses = [await self.get_async_response(request, entry) for entry in data]
+                result = "[{}]".format(",".join(response[0] for response in responses))
+                status_code = max((response[1] for response in responses), default=200)
+            else:
+                result, status_code = await self.get_async_response(request, data)
+
+            return HttpResponse(status=status_code, content=result, content_type="application/json")
+
+        except HttpError as e:
+            response = e.response
+            response["Content-Type"] = "application/json"
+            response.content = self.json_encode(request, {"errors": [self.format_error(e)]})
+            return response
+
+    async def get_async_response(self, request, data):
+        query, variables, operation_name, id = self.get_graphql_params(request, data)
+        execution_result = await self.execute_graphql_request_async(
+            request, data, query, variables, operation_name
+        )
+
+        status_code = 200
+        response = {}
+        if execution_result.errors:
+            response["errors"] = [self.format_error(e) for e in execution_result.errors]
+        if execution_result.errors and any(
+            not getattr(e, "path", None) for e in execution_result.errors
+        ):
+            status_code = 400
+        else:
+            response["data"] = execution_result.data
+
+        if self.batch:
+            response["id"] = id
+            response["status"] = status_code
+
+        return self.json_encode(request, response), status_code
+
+    async def execute_graphql_request_async(self, request, data, query, variables, operation_name):
+        document, operation_ast, errors = self.prepare_operation(
+            request, data, query, variables, operation_name
+        )
+        if errors:
+            return ExecutionResult(data=None, errors=errors)
+
+        try:
+            result = execute(
+                self.schema.graphql_schema,
+                document,
+                **self.get_execute_options(request, variables, operation_name),
+            )
+            if inspect.isawaitable(result):
+                result = await result
+            return result
+        except Exception as e:
+            return ExecutionResult(errors=[e])
+
+
+def metrics(request):
+    """
+    Expose the GraphQL instrumentation counters in Prometheus text format
+    """
+    return HttpResponse(METRICS.render(), content_type="text/plain; version=0.0.4")
+
+
+def export(request, name):
+    """
+    Stream orders or customers as NDJSON (default) or CSV, filtered by the
+    same arguments as allOrders/allCustomers given in the query string
+    """
+    if request.method != "GET":
+        return HttpResponseNotAllowed(["GET"])
+    fmt = request.GET.get("format", "ndjson")
+    if fmt not in FORMATS:
+        return JsonResponse(
+            {"errors": {"format": [f"Choose one of: {', '.join(FORMATS)}."]}}, status=400
+        )
+    chunks, errors = render_export(name, fmt, request.GET)
+    if errors:
+        return JsonResponse({"errors": errors.get_json_data()}, status=400)
+    response = StreamingHttpResponse(chunks, content_type=FORMATS[fmt])
+    response["Content-Disposition"] = f'attachment; filename="{name}.{fmt}"'
+    return response